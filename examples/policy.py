@@ -53,16 +53,64 @@ policy/gmm_component_frac : float
     number of GMM components to use as a fraction of the sample size
 policy/gmm_reg_covat : float
     regularization constant to ensure GMM sample diversity
+policy/gmm_max_iter : int
+    maximum number of EM iterations for each GMM refit (smaller means faster refits)
+policy/gmm_warm_start : bool
+    True (1) if each GMM refit should be initialized from the components of the previous CEM iteration
+policy/gmm_backend : str
+    GMM implementation to use (numpy for the vectorized EM, sklearn for scikit-learn)
+policy/search_strategy : str, optional
+    optimizer for the CEM iterations: cem (default), cem_elite_carryover to reuse already-evaluated elites, or cmaes
+policy/search_params : dict, optional
+    additional parameters of the search strategy (e.g. sigma_scale for cmaes)
+policy/pipeline_chunk_size : int, optional
+    number of candidates per chunk when overlapping tensorization with GQ-CNN prediction (0 to disable)
+policy/sampling_chunk_size : int, optional
+    number of candidates per chunk when the antipodal policy predicts sampled candidates while sampling continues (0 to disable)
+policy/early_stop_q_value : float, optional
+    q-value at which the antipodal policy stops streaming candidates from the sampler
+policy/convergence_tol : float, optional
+    stop CEM early once the mean elite q-value improves by less than this amount between iterations
+policy/incremental_replanning : bool, optional
+    True (1) to reuse the candidates of the previous request whose crops are unaffected by depth changes
+policy/replan_depth_thresh : float, optional
+    minimum change in depth, in meters, for a pixel to count as changed
+policy/replan_max_changed_frac : float, optional
+    maximum fraction of the image affected by changes to replan incrementally
+policy/replan_max_age : int, optional
+    maximum number of requests a candidate is reused for before it is evaluated again
+policy/cascade/gqcnn_model : str, optional
+    path to a small GQ-CNN that scores every candidate before the full GQ-CNN (omit the cascade to disable)
+policy/cascade/keep_frac : float or list, optional
+    fraction of the candidates with the highest cheap scores passed on to the full GQ-CNN (a list gives one fraction per CEM iteration)
+policy/cascade/min_keep : int, optional
+    minimum number of candidates passed on to the full GQ-CNN per image
+policy/refinement : dict, optional
+    gradient ascent on the best candidates before selection (num_candidates, num_steps, depth_step, center_step, angle_step; omit to disable)
+policy/candidate_filter : dict, optional
+    rules for pruning invalid and duplicate candidates before GQ-CNN evaluation (see GraspCandidateFilter)
 policy/deterministic : bool
-    True (1) if execution should be deterministic (via setting a random seed) and False (0) otherwise
+    True (1) if execution should be deterministic (via reseeding the random stream of the policy on each request) and False (0) otherwise
+policy/seed : int, optional
+    seed of the random stream owned by the policy and its grasp sampler (unseeded by default)
 policy/gripper_width : float
     distance between the jaws, in meters
 policy/crop_height : int
     height of bounding box to use for cropping the image around a grasp candidate before passing it into the GQ-CNN
 policy/crop_width : int
     width of bounding box to use for cropping the image around a grasp candidate before passing it into the GQ-CNN
+policy/topk_min_dist : float, optional
+    minimum distance, in pixels plus weighted radians, between the ranked grasps returned by action_topk
+policy/topk_angle_weight : float, optional
+    weight of the axis angle difference in the action_topk distance
 policy/sampling/type : str
-    grasp sampling type (use antipodal_depth to sample antipodal pairs in image space)
+    grasp sampling type (use antipodal_depth to sample antipodal pairs in image space, or grid_depth to check a dense grid of candidates)
+policy/sampling/grid_stride : int, optional
+    distance in pixels between the grasp centers of the grid_depth sampler
+policy/sampling/num_angles : int, optional
+    number of grasp angles at each center of the grid_depth sampler
+policy/sampling/num_depths : int, optional
+    number of grasp depths for each center and angle of the grid_depth sampler
 policy/sampling/friction_coef : float
     friction coefficient to use in sampling
 policy/sampling/depth_grad_thresh : float
@@ -73,6 +121,16 @@ policy/sampling/downsample_rate : float
     factor by which to downsample the image when detecting edges (larger number means edges are smaller images, which speeds up performance)
 policy/sampling/max_rejection_samples : int
     maximum number of samples to take when sampling antipodal candidates (larger means potentially longer runtimes)
+policy/sampling/pair_search_method : str, optional
+    kdtree (default) to find candidate point pairs with a KD-tree radius query, or chunked to compare blocks of edge pixels
+policy/sampling/pair_chunk_size : int, optional
+    number of edge pixels per block for the chunked pair search
+policy/sampling/tile_size : int, optional
+    size in pixels of the image tiles sampled in parallel for large images (0 to sample the whole image at once)
+policy/sampling/num_tile_workers : int, optional
+    number of threads sampling tiles (defaults to the number of cores)
+policy/sampling/preprocessing_cache_mb : float, optional
+    memory budget, in megabytes, for caching the edges, normals and pairs of recently sampled images (0 to disable)
 policy/sampling/max_dist_from_center : int
     maximum distance, in pixels, from the image center allowed in grasp sampling
 policy/sampling/min_dist_from_boundary : int
@@ -108,6 +166,9 @@ policy/vis/final_grasp : bool
     True (1) if the final planned grasp should be displayed (for debugging)
 policy/vis/k : int
     number of grasps to display
+policy/vis/render : str
+    when to draw the captured figures: 'inline' after planning, 'async' in a background
+    process that saves them to the logging directory, or 'none' to only store the trace in the log
 
 inpaint_rescale_factor : float
     scale factor to resize the image by before inpainting (smaller means faster performance by less precise)
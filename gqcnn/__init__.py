@@ -28,10 +28,17 @@ from .neural_networks import GQCNN
 from .sgd_optimizer import SGDOptimizer
 from .gqcnn_analyzer import GQCNNAnalyzer
 
-from .grasp import Grasp2D
+from .grasp import Grasp2D, GraspBatch
 from .visualizer import Visualizer
+from .gaussian_mixture import WarmStartGaussianMixture
+from .search_strategies import SearchStrategy, CrossEntropySearchStrategy, EliteCarryoverSearchStrategy, CMAESSearchStrategy, SearchStrategyFactory
+from .planning_profiler import PlanningProfiler
+from .preprocessing_cache import PreprocessingCache
+from .grasp_filter import GraspCandidateFilter
 from .policy_exceptions import NoValidGraspsException, NoAntipodalPairsFoundException
-from .image_grasp_sampler import ImageGraspSampler, AntipodalDepthImageGraspSampler, ImageGraspSamplerFactory
+from .image_grasp_sampler import ImageGraspSampler, AntipodalDepthImageGraspSampler, DenseGridDepthImageGraspSampler, ImageGraspSamplerFactory
+from .policy_logger import PolicyLogWriter, BackpressurePolicy, load_record
+from .planning_trace import PlanningTrace, TracePlotType, TraceRenderer, RenderMode, render_trace, camera_intr_to_array, camera_intr_from_array
 from .policy import Policy, GraspingPolicy, AntipodalGraspingPolicy, CrossEntropyAntipodalGraspingPolicy, QFunctionAntipodalGraspingPolicy, EpsilonGreedyQFunctionAntipodalGraspingPolicy, RgbdImageState, ParallelJawGrasp
 from .gqcnn_prediction_visualizer import GQCNNPredictionVisualizer
 
@@ -41,10 +48,15 @@ __all__ = ['GQCNN',
            'ImageMode', 'TrainingMode', 'PreprocMode', 'InputDataMode',
            'TrainStatsLogger',
            'ClassificationResult', 'RegressionResult', 'ConfusionMatrix',
-           'Grasp2D',
-           'ImageGraspSampler', 'AntipodalDepthImageGraspSampler', 'ImageGraspSamplerFactory'
+           'Grasp2D', 'GraspBatch',
+           'ImageGraspSampler', 'AntipodalDepthImageGraspSampler', 'DenseGridDepthImageGraspSampler', 'ImageGraspSamplerFactory',
+           'WarmStartGaussianMixture',
+           'SearchStrategy', 'CrossEntropySearchStrategy', 'EliteCarryoverSearchStrategy', 'CMAESSearchStrategy', 'SearchStrategyFactory',
+           'PlanningProfiler', 'PreprocessingCache', 'GraspCandidateFilter',
            'Visualizer', 'RobotGripper',
            'ParallelJawGrasp', 'Policy', 'GraspingPolicy', 'AntipodalGraspingPolicy', 'CrossEntropyAntipodalGraspingPolicy',
            'RgbdImageState',
+           'PolicyLogWriter', 'BackpressurePolicy', 'load_record',
+           'PlanningTrace', 'TracePlotType', 'TraceRenderer', 'RenderMode', 'render_trace',
            'NoValidGraspsException', 'NoAntipodalPairsFoundException',
            'GQCNNPredictionVisualizer']
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Gaussian mixture models for refitting the sampling distribution in the cross entropy method
+Author: Jeff Mahler
+"""
+import logging
+import numpy as np
+from time import time
+
+from sklearn.mixture import GaussianMixture
+
+class WarmStartGaussianMixture(object):
+    """ Full-covariance Gaussian mixture model that warm-starts each fit from
+    the components of the previous fit. Data is normalized to zero mean and
+    unit variance before fitting and the stored components are mapped into
+    the normalized space of each new fit.
+
+    Attributes
+    ----------
+    reg_covar : float
+        regularization added to the diagonal of each covariance matrix
+    max_iter : int
+        ceiling on the number of EM iterations per fit
+    tol : float
+        convergence threshold on the change in mean log-likelihood
+    warm_start : bool
+        whether to initialize each fit from the previous components
+    backend : str
+        'numpy' for the vectorized EM implementation or 'sklearn' to use sklearn.mixture.GaussianMixture
+    random_state : :obj:`numpy.random.RandomState`
+        random number generator used for initialization and sampling (global numpy state if None)
+    """
+    def __init__(self, reg_covar=1e-6, max_iter=10, tol=1e-3, warm_start=True,
+                 backend='numpy', random_state=None):
+        if backend not in ['numpy', 'sklearn']:
+            raise ValueError('GMM backend %s not supported!' %(backend))
+        self._reg_covar = reg_covar
+        self._max_iter = max(int(max_iter), 1)
+        self._tol = tol
+        self._warm_start = warm_start
+        self._backend = backend
+        self._rng = random_state
+        if self._rng is None:
+            self._rng = np.random
+        self.reset()
+
+    def reset(self):
+        """ Clears the stored components so that the next fit starts cold. """
+        self._weights = None
+        self._means = None
+        self._covariances = None
+        self._data_mean = None
+        self._data_std = None
+        self._fit_time = 0.0
+        self._sample_time = 0.0
+        self._num_iters = 0
+        self._converged = False
+
+    @property
+    def weights(self):
+        return self._weights
+
+    @property
+    def means(self):
+        """ Component means in the original (unnormalized) data space. """
+        if self._means is None:
+            return None
+        return self._means * self._data_std + self._data_mean
+
+    @property
+    def covariances(self):
+        """ Component covariances in the original (unnormalized) data space. """
+        if self._covariances is None:
+            return None
+        return self._covariances * np.outer(self._data_std, self._data_std)
+
+    @property
+    def num_components(self):
+        if self._weights is None:
+            return 0
+        return self._weights.shape[0]
+
+    @property
+    def fit_time(self):
+        """ Duration of the last fit in seconds. """
+        return self._fit_time
+
+    @property
+    def sample_time(self):
+        """ Duration of the last sampling in seconds. """
+        return self._sample_time
+
+    @property
+    def num_iters(self):
+        """ Number of EM iterations used in the last fit. """
+        return self._num_iters
+
+    @property
+    def converged(self):
+        return self._converged
+
+    def fit(self, X, num_components):
+        """ Fits the mixture to a set of samples.
+
+        Parameters
+        ----------
+        X : :obj:`numpy.ndarray`
+            NxD array of samples
+        num_components : int
+            number of mixture components
+
+        Returns
+        -------
+        :obj:`WarmStartGaussianMixture`
+            the fitted model
+        """
+        fit_start = time()
+        X = np.asarray(X, dtype=np.float64)
+        num_samples = X.shape[0]
+        num_components = max(min(int(num_components), num_samples), 1)
+
+        # normalize data
+        data_mean = np.mean(X, axis=0)
+        data_std = np.std(X, axis=0)
+        data_std[data_std == 0] = 1.0
+        X_norm = (X - data_mean) / data_std
+
+        # initialize components
+        weights, means, covariances = self._init_components(X_norm, data_mean, data_std,
+                                                            num_components)
+        self._data_mean = data_mean
+        self._data_std = data_std
+
+        # run EM
+        if self._backend == 'sklearn':
+            precisions = np.linalg.inv(covariances)
+            gmm = GaussianMixture(n_components=num_components,
+                                  weights_init=weights,
+                                  means_init=means,
+                                  precisions_init=precisions,
+                                  reg_covar=self._reg_covar,
+                                  max_iter=self._max_iter,
+                                  tol=self._tol)
+            gmm.fit(X_norm)
+            weights = gmm.weights_
+            means = gmm.means_
+            covariances = gmm.covariances_
+            self._num_iters = gmm.n_iter_
+            self._converged = gmm.converged_
+        else:
+            weights, means, covariances = self._em(X_norm, weights, means, covariances)
+        self._weights = weights
+        self._means = means
+        self._covariances = covariances
+
+        self._fit_time = time() - fit_start
+        logging.debug('GMM fit %d components in %d iters' %(num_components, self._num_iters))
+        return self
+
+    def sample(self, num_samples):
+        """ Draws samples from the fitted mixture.
+
+        Parameters
+        ----------
+        num_samples : int
+            number of samples to draw
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            num_samples x D array of samples in the original data space
+        """
+        if self._weights is None:
+            raise ValueError('Mixture must be fit before sampling')
+        sample_start = time()
+        num_dims = self._means.shape[1]
+        weights = self._weights / np.sum(self._weights)
+        components = self._rng.choice(self.num_components, size=num_samples, p=weights)
+        chol = np.linalg.cholesky(self._covariances)
+        z = self._rng.randn(num_samples, num_dims)
+        X_norm = self._means[components] + np.einsum('nij,nj->ni', chol[components], z)
+        X = X_norm * self._data_std + self._data_mean
+        self._sample_time = time() - sample_start
+        return X
+
+    def fit_sample(self, X, num_components, num_samples):
+        """ Fits the mixture to X and draws num_samples samples from the result. """
+        self.fit(X, num_components)
+        return self.sample(num_samples)
+
+    def _init_components(self, X_norm, data_mean, data_std, num_components):
+        """ Returns the initial weights, means and covariances in the normalized space of X_norm. """
+        num_samples, num_dims = X_norm.shape
+        weights = np.zeros(0)
+        means = np.zeros([0, num_dims])
+        covariances = np.zeros([0, num_dims, num_dims])
+
+        # map previous components into the new normalized space, keeping the heaviest
+        if self._warm_start and self._weights is not None:
+            order = np.argsort(-self._weights)[:num_components]
+            scale = self._data_std / data_std
+            weights = self._weights[order]
+            means = ((self._means[order] * self._data_std + self._data_mean) - data_mean) / data_std
+            covariances = self._covariances[order] * np.outer(scale, scale)
+
+        # seed any remaining components at random samples
+        num_new = num_components - weights.shape[0]
+        if num_new > 0:
+            indices = self._rng.choice(num_samples, size=num_new, replace=False)
+            data_cov = np.eye(num_dims)
+            if num_samples > 1:
+                data_cov = np.cov(X_norm, rowvar=False).reshape(num_dims, num_dims)
+            data_cov = data_cov + self._reg_covar * np.eye(num_dims)
+            new_weight = 1.0 / num_components
+            if weights.shape[0] > 0:
+                weights = weights * (1.0 - num_new * new_weight) / np.sum(weights)
+            weights = np.r_[weights, new_weight * np.ones(num_new)]
+            means = np.r_[means, X_norm[indices]]
+            covariances = np.concatenate([covariances,
+                                          np.tile(data_cov, [num_new, 1, 1])], axis=0)
+        weights = weights / np.sum(weights)
+        return weights, means, covariances
+
+    def _log_resp(self, X, weights, means, covariances):
+        """ Returns the log responsibilities and the mean log-likelihood of X. """
+        num_dims = X.shape[1]
+        chol = np.linalg.cholesky(covariances)
+        diffs = X[np.newaxis,:,:] - means[:,np.newaxis,:]
+        sol = np.linalg.solve(chol, np.transpose(diffs, [0, 2, 1]))
+        mahal = np.sum(sol**2, axis=1)
+        log_det = 2 * np.sum(np.log(np.diagonal(chol, axis1=1, axis2=2)), axis=1)
+        log_prob = -0.5 * (num_dims * np.log(2 * np.pi) + log_det[:,np.newaxis] + mahal)
+        weighted_log_prob = log_prob.T + np.log(weights)
+        max_log_prob = np.max(weighted_log_prob, axis=1, keepdims=True)
+        log_norm = max_log_prob[:,0] + np.log(np.sum(np.exp(weighted_log_prob - max_log_prob), axis=1))
+        return weighted_log_prob - log_norm[:,np.newaxis], np.mean(log_norm)
+
+    def _em(self, X, weights, means, covariances):
+        """ Runs vectorized EM from the given initial components. """
+        num_samples, num_dims = X.shape
+        reg = self._reg_covar * np.eye(num_dims)
+        prev_ll = -np.inf
+        self._converged = False
+        self._num_iters = 0
+        for i in range(self._max_iter):
+            # E-step
+            log_resp, ll = self._log_resp(X, weights, means, covariances)
+            resp = np.exp(log_resp)
+
+            # M-step
+            nk = np.sum(resp, axis=0) + 10 * np.finfo(resp.dtype).eps
+            weights = nk / num_samples
+            means = resp.T.dot(X) / nk[:,np.newaxis]
+            diffs = X[np.newaxis,:,:] - means[:,np.newaxis,:]
+            covariances = np.einsum('kn,kni,knj->kij', resp.T, diffs, diffs) / nk[:,np.newaxis,np.newaxis] + reg
+            self._num_iters = i + 1
+
+            if np.abs(ll - prev_ll) < self._tol:
+                self._converged = True
+                break
+            prev_ll = ll
+        return weights, means, covariances
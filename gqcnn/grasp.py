@@ -160,7 +160,6 @@ class Grasp2D(object):
         grasp_axis_camera = grasp_axis_camera / np.linalg.norm(grasp_axis_camera)
         
         # convert to 3D pose
-        grasp_rot_camera, _, _ = np.linalg.svd(grasp_axis_camera.reshape(3,1))
         grasp_x_camera = grasp_approach_dir
         if grasp_approach_dir is None:
             grasp_x_camera = np.array([0,0,1]) # aligned with camera Z axis
@@ -202,3 +201,241 @@ class Grasp2D(object):
         axis_dist = np.arccos(np.abs(g1.axis.dot(g2.axis)))
 
         return point_dist + alpha * axis_dist
+
+class GraspBatch(object):
+    """
+    Batch of parallel-jaw grasps in image space stored as a struct of arrays.
+    Indexing with an integer returns a :obj:`Grasp2D`, while indexing with a
+    slice, boolean mask or index array returns a new :obj:`GraspBatch`.
+
+    Attributes
+    ----------
+    centers : :obj:`numpy.ndarray`
+        Nx2 array of grasp centers in image space, in (x, y) order
+    angles : :obj:`numpy.ndarray`
+        N array of grasp axis angles with the camera x-axis
+    depths : :obj:`numpy.ndarray`
+        N array of depths of the grasp centers in 3D space
+    widths : :obj:`numpy.ndarray`
+        N array of distances between the jaws in meters
+    camera_intr : :obj:`perception.CameraIntrinsics`
+        frame of reference for camera that the grasps correspond to
+    """
+    def __init__(self, centers, angles, depths, widths=0.0, camera_intr=None):
+        self.centers = np.array(centers, dtype=np.float64).reshape(-1, 2)
+        num_grasps = self.centers.shape[0]
+        self.angles = GraspBatch._as_vector(angles, num_grasps)
+        self.depths = GraspBatch._as_vector(depths, num_grasps)
+        self.widths = GraspBatch._as_vector(widths, num_grasps)
+        # if camera_intr is none use default primesense camera intrinsics
+        if not camera_intr:
+            self.camera_intr = CameraIntrinsics('primesense_overhead', fx=525, fy=525, cx=319.5, cy=239.5, width=640, height=480)
+        else:
+            self.camera_intr = camera_intr
+
+    @staticmethod
+    def _as_vector(v, num_grasps):
+        """ Broadcasts a scalar or array to a float vector of length num_grasps. """
+        return np.array(np.broadcast_to(np.asarray(v, dtype=np.float64), (num_grasps,)))
+
+    def __len__(self):
+        return self.centers.shape[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            center = Point(self.centers[key].copy(), frame=self.frame)
+            return Grasp2D(center, float(self.angles[key]), float(self.depths[key]),
+                           width=float(self.widths[key]), camera_intr=self.camera_intr)
+        return GraspBatch(self.centers[key], self.angles[key], self.depths[key],
+                          widths=self.widths[key], camera_intr=self.camera_intr)
+
+    @property
+    def num_grasps(self):
+        """ Returns the number of grasps in the batch. """
+        return len(self)
+
+    @property
+    def axes(self):
+        """ Returns an Nx2 array of grasp axes. """
+        return np.c_[np.cos(self.angles), np.sin(self.angles)]
+
+    @property
+    def frame(self):
+        """ The name of the frame of reference for the grasps. """
+        if self.camera_intr is None:
+            raise ValueError('Must specify camera intrinsics')
+        return self.camera_intr.frame
+
+    @property
+    def width_px(self):
+        """ Returns an N array of the grasp widths in pixels. """
+        if self.camera_intr is None:
+            raise ValueError('Must specify camera intrinsics to compute gripper width in 3D space')
+        # project jaws at (0, 0, d) and (w, 0, d), rounding to pixels like CameraIntrinsics.project
+        fx = self.camera_intr.fx
+        cx = self.camera_intr.cx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u2 = np.round(fx * self.widths / self.depths + cx)
+        return np.abs(u2 - np.round(cx))
+
+    @property
+    def endpoints(self):
+        """ Returns the Nx2 arrays of grasp endpoints """
+        offsets = (self.width_px / 2)[:,np.newaxis] * self.axes
+        p1 = self.centers - offsets
+        p2 = self.centers + offsets
+        return p1, p2
+
+    @property
+    def feature_vecs(self):
+        """ Returns the Nx5 array of feature vectors for the grasps.
+        v = [p1, p2, depth]
+        where p1 and p2 are the jaw locations in image space
+        """
+        p1, p2 = self.endpoints
+        return np.c_[p1, p2, self.depths]
+
+    def poses(self, grasp_approach_dir=None):
+        """ Computes the 3D poses of all grasps relative to the camera at once,
+        with the semantics of Grasp2D.pose. If an approach direction is not
+        specified then the camera optical axis is used.
+
+        Parameters
+        ----------
+        grasp_approach_dir : :obj:`numpy.ndarray`
+            approach direction for the grasps in camera basis (e.g. opposite to table normal)
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            Nx4x4 array of the homogeneous transformations from each grasp to the
+            camera frame of reference
+        """
+        # check intrinsics
+        if self.camera_intr is None:
+            raise ValueError('Must specify camera intrinsics to compute 3D grasp pose')
+        num_grasps = len(self)
+
+        # deproject the grasp centers into the camera basis
+        centers_h = np.c_[self.centers, np.ones(num_grasps)]
+        grasp_centers_camera = self.depths[:,np.newaxis] * centers_h.dot(np.linalg.inv(self.camera_intr.K).T)
+
+        # form the rotations from the approach direction and the grasp axes
+        grasp_x_camera = np.array([0,0,1]) # aligned with camera Z axis
+        if grasp_approach_dir is not None:
+            grasp_x_camera = np.asarray(grasp_approach_dir)
+        grasp_x_camera = np.broadcast_to(grasp_x_camera, (num_grasps, 3))
+        grasp_y_camera = np.c_[self.axes, np.zeros(num_grasps)]
+        grasp_z_camera = np.cross(grasp_x_camera, grasp_y_camera)
+        grasp_x_camera = np.cross(grasp_z_camera, grasp_y_camera)
+        grasp_rots_camera = np.stack([grasp_x_camera, grasp_y_camera, grasp_z_camera], axis=2)
+        reflected = np.linalg.det(grasp_rots_camera) < 0 # fix possible reflections
+        grasp_rots_camera[reflected,:,0] = -grasp_rots_camera[reflected,:,0]
+
+        T_grasps_camera = np.zeros([num_grasps, 4, 4])
+        T_grasps_camera[:,:3,:3] = grasp_rots_camera
+        T_grasps_camera[:,:3,3] = grasp_centers_camera
+        T_grasps_camera[:,3,3] = 1.0
+        return T_grasps_camera
+
+    @staticmethod
+    def pairwise_image_dist(batch_a, batch_b=None, alpha=1.0):
+        """ Computes the distances between all pairs of grasps in two batches,
+        with the semantics of Grasp2D.image_dist.
+
+        Parameters
+        ----------
+        batch_a : :obj:`GraspBatch`
+            first batch of N grasps
+        batch_b : :obj:`GraspBatch`
+            second batch of M grasps, or None to compare batch_a with itself
+        alpha : float
+            weight of angle distance (rad to meters)
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            NxM array of distances between grasps
+        """
+        if batch_b is None:
+            batch_b = batch_a
+
+        # point to point distances
+        diffs = batch_a.centers[:,np.newaxis,:] - batch_b.centers[np.newaxis,:,:]
+        point_dists = np.linalg.norm(diffs, axis=2)
+
+        # axis distances
+        axis_ip = np.abs(batch_a.axes.dot(batch_b.axes.T))
+        axis_dists = np.arccos(np.clip(axis_ip, 0.0, 1.0))
+
+        return point_dists + alpha * axis_dists
+
+    @staticmethod
+    def from_feature_vecs(vs, width=0.0, camera_intr=None):
+        """ Creates a GraspBatch from an array of feature vectors and additional parameters.
+
+        Parameters
+        ----------
+        vs : :obj:`numpy.ndarray`
+            Nx5 array of feature vectors, see GraspBatch.feature_vecs
+        width : float
+            grasp opening width, in meters
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            frame of reference for camera that the grasps correspond to
+        """
+        # read feature vecs
+        vs = np.asarray(vs, dtype=np.float64).reshape(-1, 5)
+        p1 = vs[:,:2]
+        p2 = vs[:,2:4]
+        depths = vs[:,4]
+
+        # compute centers and angles
+        centers = (p1 + p2) / 2
+        axes = p2 - p1
+        norms = np.linalg.norm(axes, axis=1)
+        nonzero = norms > 0
+        axes[nonzero] = axes[nonzero] / norms[nonzero,np.newaxis]
+        angles = np.arccos(np.clip(axes[:,0], -1.0, 1.0))
+        angles[axes[:,1] <= 0] *= -1
+        return GraspBatch(centers, angles, depths, widths=width, camera_intr=camera_intr)
+
+    @staticmethod
+    def from_grasps(grasps, camera_intr=None):
+        """ Creates a GraspBatch from a list of Grasp2D objects.
+
+        Parameters
+        ----------
+        grasps : :obj:`list` of :obj:`Grasp2D`
+            grasps to store in the batch
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            frame of reference for the grasps, taken from the first grasp if None
+        """
+        if isinstance(grasps, GraspBatch):
+            return grasps
+        if camera_intr is None and len(grasps) > 0:
+            camera_intr = grasps[0].camera_intr
+        centers = np.array([g.center.data for g in grasps]).reshape(-1, 2)
+        return GraspBatch(centers,
+                          [g.angle for g in grasps],
+                          [g.depth for g in grasps],
+                          widths=[g.width for g in grasps],
+                          camera_intr=camera_intr)
+
+    @staticmethod
+    def concatenate(batches, camera_intr=None):
+        """ Concatenates a list of GraspBatch objects into a single batch.
+        The camera intrinsics of the first batch are used if none are given.
+        """
+        if camera_intr is None and len(batches) > 0:
+            camera_intr = batches[0].camera_intr
+        if len(batches) == 0:
+            return GraspBatch(np.zeros([0,2]), [], [], camera_intr=camera_intr)
+        return GraspBatch(np.concatenate([b.centers for b in batches], axis=0),
+                          np.concatenate([b.angles for b in batches]),
+                          np.concatenate([b.depths for b in batches]),
+                          widths=np.concatenate([b.widths for b in batches]),
+                          camera_intr=camera_intr)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Vectorized pre-filtering of grasp candidates before GQ-CNN evaluation
+Author: Jeff Mahler
+"""
+import numpy as np
+
+class GraspCandidateFilter(object):
+    """ Rejects grasp candidates that cannot be executed or that duplicate
+    a candidate already evaluated in the same planning request.
+
+    Attributes
+    ----------
+    config : dict
+        dictionary of parameters for the filter
+
+    Other Parameters
+    ----------------
+    bounds_margin : float, optional
+        minimum distance in pixels from the grasp center and jaws to the image border
+    valid_depth : bool, optional
+        whether to reject candidates with zero or NaN depth under the center or either jaw
+    max_width_px : float, optional
+        maximum distance between the jaws in pixels
+    dedup : bool, optional
+        whether to reject candidates that quantize to the same center, angle and depth
+        as another candidate
+    dedup_center_res : float, optional
+        quantization of the center in pixels for deduplication
+    dedup_angle_res : float, optional
+        quantization of the angle in radians for deduplication
+    dedup_depth_res : float, optional
+        quantization of the depth in meters for deduplication
+    max_refill_rounds : int, optional
+        number of times to resample to replace rejected candidates
+    """
+    def __init__(self, config):
+        self._config = config
+        self._parse_config()
+        self.reset()
+
+    def _parse_config(self):
+        """ Parses the parameters of the filter. """
+        self._bounds_margin = 0.0
+        if 'bounds_margin' in self._config.keys():
+            self._bounds_margin = self._config['bounds_margin']
+        self._valid_depth = True
+        if 'valid_depth' in self._config.keys():
+            self._valid_depth = self._config['valid_depth']
+        self._max_width_px = np.inf
+        if 'max_width_px' in self._config.keys():
+            self._max_width_px = self._config['max_width_px']
+        self._dedup = True
+        if 'dedup' in self._config.keys():
+            self._dedup = self._config['dedup']
+        self._dedup_center_res = 1.0
+        if 'dedup_center_res' in self._config.keys():
+            self._dedup_center_res = self._config['dedup_center_res']
+        self._dedup_angle_res = 0.05
+        if 'dedup_angle_res' in self._config.keys():
+            self._dedup_angle_res = self._config['dedup_angle_res']
+        self._dedup_depth_res = 0.0025
+        if 'dedup_depth_res' in self._config.keys():
+            self._dedup_depth_res = self._config['dedup_depth_res']
+        self._max_refill_rounds = 3
+        if 'max_refill_rounds' in self._config.keys():
+            self._max_refill_rounds = self._config['max_refill_rounds']
+
+    @property
+    def max_refill_rounds(self):
+        return self._max_refill_rounds
+
+    def reset(self):
+        """ Forgets the registered candidates, e.g. at the start of a planning request. """
+        self._seen_keys = np.zeros(0, dtype=np.int64)
+
+    def _keys(self, grasps):
+        """ Hashes the quantized center, angle and depth of each grasp. """
+        # grasps with angles that differ by pi are identical
+        angles = np.mod(grasps.angles, np.pi)
+        q = np.c_[np.floor(grasps.centers / self._dedup_center_res),
+                  np.floor(angles / self._dedup_angle_res),
+                  np.floor(grasps.depths / self._dedup_depth_res)].astype(np.int64)
+        primes = np.array([73856093, 19349663, 83492791, 50331653], dtype=np.int64)
+        return np.bitwise_xor.reduce(q * primes, axis=1)
+
+    def mask(self, grasps, depth_im):
+        """ Returns a boolean mask of the candidates that pass the filter.
+        Candidates are not registered, see GraspCandidateFilter.register.
+
+        Parameters
+        ----------
+        grasps : :obj:`GraspBatch`
+            candidates to filter
+        depth_im : :obj:`perception.DepthImage`
+            depth image the candidates were planned on
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            N boolean array, True for the candidates to keep
+        """
+        num_grasps = len(grasps)
+        valid = np.ones(num_grasps, dtype=bool)
+        if num_grasps == 0:
+            return valid
+        height, width = depth_im.height, depth_im.width
+        p1, p2 = grasps.endpoints
+        points = [grasps.centers, p1, p2]
+
+        # bounds
+        margin = self._bounds_margin
+        for p in points:
+            with np.errstate(invalid='ignore'):
+                valid &= (p[:,0] >= margin) & (p[:,0] <= width - 1 - margin) & \
+                         (p[:,1] >= margin) & (p[:,1] <= height - 1 - margin)
+
+        # depth under the center and jaws
+        if self._valid_depth:
+            for p in points:
+                cols = np.clip(np.nan_to_num(np.round(p[:,0])), 0, width - 1).astype(np.int32)
+                rows = np.clip(np.nan_to_num(np.round(p[:,1])), 0, height - 1).astype(np.int32)
+                depths = depth_im.data[rows, cols]
+                with np.errstate(invalid='ignore'):
+                    valid &= np.isfinite(depths) & (depths > 0)
+            with np.errstate(invalid='ignore'):
+                valid &= np.isfinite(grasps.depths) & (grasps.depths > 0)
+
+        # jaw opening
+        if np.isfinite(self._max_width_px):
+            with np.errstate(invalid='ignore'):
+                valid &= np.linalg.norm(p2 - p1, axis=1) <= self._max_width_px
+
+        # duplicates within the batch and of registered candidates
+        if self._dedup:
+            keys = self._keys(grasps)
+            first = np.zeros(num_grasps, dtype=bool)
+            _, first_indices = np.unique(keys, return_index=True)
+            first[first_indices] = True
+            valid &= first & ~np.in1d(keys, self._seen_keys)
+        return valid
+
+    def register(self, grasps):
+        """ Registers candidates so that later duplicates are rejected. """
+        if self._dedup and len(grasps) > 0:
+            self._seen_keys = np.union1d(self._seen_keys, self._keys(grasps))
+
+    def apply(self, grasps, depth_im, max_grasps=None):
+        """ Returns the candidates that pass the filter, up to max_grasps, and registers them.
+
+        Parameters
+        ----------
+        grasps : :obj:`GraspBatch`
+            candidates to filter
+        depth_im : :obj:`perception.DepthImage`
+            depth image the candidates were planned on
+        max_grasps : int
+            maximum number of candidates to keep, None for no limit
+
+        Returns
+        -------
+        :obj:`GraspBatch`
+            the kept candidates
+        """
+        kept = grasps[np.where(self.mask(grasps, depth_im))[0][:max_grasps]]
+        self.register(kept)
+        return kept
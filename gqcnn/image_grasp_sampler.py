@@ -29,14 +29,16 @@ import copy
 import cv2
 import logging
 import matplotlib.pyplot as plt
+import multiprocessing as mp
+from multiprocessing.pool import ThreadPool
 import numpy as np
 from PIL import Image
 import os
-import random
 import sys
 from time import sleep, time
 
 import scipy.spatial.distance as ssd
+from scipy.spatial import cKDTree
 import scipy.ndimage.filters as snf
 import scipy.stats as ss
 import sklearn.mixture
@@ -44,10 +46,12 @@ import sklearn.mixture
 from autolab_core import Point, RigidTransform
 from perception import BinaryImage, ColorImage, DepthImage, RgbdImage
 
-from . import Grasp2D
+from . import Grasp2D, GraspBatch
 from . import Visualizer as vis
 
 from . import NoAntipodalPairsFoundException
+from . import PlanningProfiler
+from . import PreprocessingCache
 
 def force_closure(p1, p2, n1, n2, mu):
     """ Computes whether or not the point and normal pairs are in force closure. """
@@ -61,6 +65,65 @@ def force_closure(p1, p2, n1, n2, mu):
     in_cone_2 = (np.arccos(n2.dot(v)) < alpha)
     return (in_cone_1 and in_cone_2)
 
+def force_closure_batch(p1, p2, n1, n2, mu):
+    """ Computes whether or not each of a set of point and normal pairs is in force closure.
+
+    Parameters
+    ----------
+    p1 : :obj:`numpy.ndarray`
+        Nx2 array of first contact points
+    p2 : :obj:`numpy.ndarray`
+        Nx2 array of second contact points
+    n1 : :obj:`numpy.ndarray`
+        Nx2 array of unit surface normals at the first contacts
+    n2 : :obj:`numpy.ndarray`
+        Nx2 array of unit surface normals at the second contacts
+    mu : float
+        friction coefficient
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        N boolean array, True for the pairs in force closure
+    """
+    # lines between the contacts
+    v = p2 - p1
+    v = v / np.linalg.norm(v, axis=1)[:,np.newaxis]
+
+    # compute cone membership
+    alpha = np.arctan(mu)
+    with np.errstate(invalid='ignore'):
+        in_cone_1 = (np.arccos(np.sum(n1 * -v, axis=1)) < alpha)
+        in_cone_2 = (np.arccos(np.sum(n2 * v, axis=1)) < alpha)
+    return in_cone_1 & in_cone_2
+
+def window_min_depths(depth_im, win_height, win_width):
+    """ Returns the minimum depth over the window around every pixel of a depth image,
+    with the window spanning rows [i - win_height, i + win_height) and columns
+    [j - win_width, j + win_width). Windows that contain a NaN are NaN.
+
+    Parameters
+    ----------
+    depth_im : :obj:`perception.DepthImage`
+        depth image to filter
+    win_height : int
+        half height of the window in pixels
+    win_width : int
+        half width of the window in pixels
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        HxW array of window minimum depths
+    """
+    size = (max(2 * win_height, 1), max(2 * win_width, 1))
+    depth_data = depth_im.data.reshape(depth_im.height, depth_im.width)
+    nan_pixels = np.isnan(depth_data)
+    min_depths = snf.minimum_filter(np.where(nan_pixels, np.inf, depth_data), size=size)
+    if np.any(nan_pixels):
+        min_depths[snf.maximum_filter(nan_pixels, size=size)] = np.nan
+    return min_depths
+
 class ImageGraspSampler(object):
     """
     Wraps image to crane grasp candidate generation for easy deployment of GQ-CNN.
@@ -71,13 +134,94 @@ class ImageGraspSampler(object):
         a dictionary-like object containing the parameters of the sampler
     gripper_width : float
         width of the gripper in 3D space
+    profiler : :obj:`PlanningProfiler`
+        profiler to record the wall time of the sampling stages to
+    preprocessing_cache : :obj:`PreprocessingCache`
+        cache of the per-image preprocessing, sized by the preprocessing_cache_mb
+        parameter (0 by default to disable caching)
+    random_state : :obj:`numpy.random.RandomState`
+        random number stream that all sampling draws from, a new unseeded stream by default
     """
     __metaclass__ = ABCMeta
 
-    def __init__(self, config, gripper_width=np.inf):
+    def __init__(self, config, gripper_width=np.inf, random_state=None):
         # set params
         self._config = config
         self._gripper_width = gripper_width
+        self._rng = random_state
+        if self._rng is None:
+            self._rng = np.random.RandomState()
+        self._profiler = PlanningProfiler()
+        preprocessing_cache_mb = 0
+        if 'preprocessing_cache_mb' in self._config.keys():
+            preprocessing_cache_mb = self._config['preprocessing_cache_mb']
+        self._preprocessing_cache = PreprocessingCache(int(preprocessing_cache_mb * 1024 * 1024))
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        self._profiler = profiler
+
+    @property
+    def preprocessing_cache(self):
+        return self._preprocessing_cache
+
+    @property
+    def random_state(self):
+        return self._rng
+
+    @random_state.setter
+    def random_state(self, random_state):
+        self._rng = random_state
+
+    def close(self):
+        """ Releases the resources held by the sampler. """
+        pass
+
+    def _cached_preprocessing(self, rgbd_im, camera_intr, segmask=None):
+        """ Returns the preprocessing of an image from the cache, or preprocesses the
+        image and caches the result on a miss. The key covers the depth image, the
+        segmask and the camera intrinsics.
+        """
+        if not self._preprocessing_cache.enabled:
+            return self._preprocess(rgbd_im, camera_intr, segmask=segmask)
+        with self._profiler.stage('preprocessing_cache'):
+            segmask_data = None
+            if segmask is not None:
+                segmask_data = segmask.data
+            key = PreprocessingCache.key(rgbd_im.depth.data, segmask_data, camera_intr.K)
+            preproc = self._preprocessing_cache.get(key)
+        if preproc is None:
+            preproc = self._preprocess(rgbd_im, camera_intr, segmask=segmask)
+            self._preprocessing_cache.put(key, preproc)
+        else:
+            logging.debug('Reusing cached preprocessing of the image')
+        return preproc
+
+    @abstractmethod
+    def _preprocess(self, rgbd_im, camera_intr, segmask=None):
+        """
+        Computes the deterministic per-image quantities of sampling that can be cached.
+        Subclasses must override.
+
+        Parameters
+        ----------
+        rgbd_im : :obj:`perception.RgbdImage`
+            RGB-D image to preprocess
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            intrinsics of the camera that captured the images
+        segmask : :obj:`perception.BinaryImage`
+            binary image segmenting out the object of interest
+
+        Returns
+        -------
+        :obj:`dict`
+            numpy arrays and images computed from the image, keyed by name
+        """
+        pass
 
     def sample(self, rgbd_im, camera_intr, num_samples,
                segmask=None, seed=None, visualize=False):
@@ -95,30 +239,93 @@ class ImageGraspSampler(object):
         segmask : :obj:`perception.BinaryImage`
             binary image segmenting out the object of interest
         seed : int
-            number to use in random seed (None if no seed)
+            number to reseed the random stream of the sampler with (None if no seed)
         visualize : bool
             whether or not to show intermediate samples (for debugging)
 
         Returns
         -------
-        :obj:`list` of :obj:`Grasp2D`
-            the list of grasps in image space
+        :obj:`GraspBatch`
+            the batch of grasps in image space
         """
         # set random seed for determinism
         if seed is not None:
-            random.seed(seed)
-            np.random.seed(seed)
+            self._rng.seed(seed)
 
         # sample an initial set of grasps (without depth)
         logging.debug('Sampling 2d candidates')
-        sampling_start = time()
-        grasps = self._sample(rgbd_im, camera_intr, num_samples,
-                              segmask=segmask, visualize=visualize)
-        sampling_stop = time()
+        with self._profiler.stage('sampling'):
+            grasps = self._sample(rgbd_im, camera_intr, num_samples,
+                                  segmask=segmask, visualize=visualize)
         logging.debug('Sampled %d grasps from image' %(len(grasps)))
-        logging.debug('Sampling grasps took %.3f sec' %(sampling_stop - sampling_start))
         return grasps
 
+    def sample_iter(self, rgbd_im, camera_intr, num_samples, chunk_size=64,
+                    segmask=None, seed=None, visualize=False):
+        """
+        Samples a set of 2D grasps from a given RGB-D image incrementally,
+        yielding the grasps in chunks as they are accepted so that they can be
+        evaluated while sampling continues. Closing the generator (e.g. breaking
+        out of a loop over it) stops sampling early.
+
+        Parameters
+        ----------
+        rgbd_im : :obj:`perception.RgbdImage`
+            RGB-D image to sample from
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            intrinsics of the camera that captured the images
+        num_samples : int
+            number of grasps to sample
+        chunk_size : int
+            number of grasps per chunk (the last chunk may be smaller)
+        segmask : :obj:`perception.BinaryImage`
+            binary image segmenting out the object of interest
+        seed : int
+            number to reseed the random stream of the sampler with (None if no seed)
+        visualize : bool
+            whether or not to show intermediate samples (for debugging)
+
+        Yields
+        ------
+        :obj:`GraspBatch`
+            the next chunk of grasps in image space
+        """
+        # set random seed for determinism
+        if seed is not None:
+            self._rng.seed(seed)
+
+        # time only the sampler, not the consumer of the chunks
+        logging.debug('Sampling 2d candidates in chunks of %d' %(chunk_size))
+        chunks = self._sample_iter(rgbd_im, camera_intr, num_samples, chunk_size,
+                                   segmask=segmask, visualize=visualize)
+        sampling_time = 0.0
+        num_grasps = 0
+        try:
+            while True:
+                chunk_start = time()
+                try:
+                    grasps = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    sampling_time += time() - chunk_start
+                num_grasps += len(grasps)
+                yield grasps
+        finally:
+            chunks.close()
+            self._profiler.add('sampling', sampling_time)
+            logging.debug('Sampled %d grasps from image' %(num_grasps))
+
+    def _sample_iter(self, rgbd_im, camera_intr, num_samples, chunk_size,
+                     segmask=None, visualize=False):
+        """
+        Yields 2D grasp candidates from a depth image in chunks. Samplers that
+        accept candidates incrementally should override, by default all of the
+        candidates are yielded as a single chunk once sampling finishes.
+        """
+        yield self._sample(rgbd_im, camera_intr, num_samples, segmask=segmask,
+                           visualize=visualize)
+
     @abstractmethod
     def _sample(self, rgbd_im, camera_intr, num_samples, segmask=None,
                 visualize=False):
@@ -141,8 +348,8 @@ class ImageGraspSampler(object):
  
         Returns
         -------
-        :obj:`list` of :obj:`Grasp2D`
-            list of 2D grasp candidates
+        :obj:`GraspBatch`
+            batch of 2D grasp candidates
         """
         pass
         
@@ -165,6 +372,21 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
         factor to downsample the depth image by before sampling grasps
     max_rejection_samples : int
         ceiling on the number of grasps to check in antipodal grasp rejection sampling
+    pair_search_method : str, optional
+        'kdtree' (default) to find the edge pixel pairs within the gripper width with a
+        radius query on a KD-tree, or 'chunked' to compare blocks of edge pixels
+        against all others, with memory bounded by pair_chunk_size times the number of edge pixels
+    pair_chunk_size : int, optional
+        number of edge pixels per block for the chunked pair search
+    tile_size : int, optional
+        size in pixels of the tiles to find and sample the candidate pairs of in parallel
+        (at least the maximum grasp width), 0 by default to sample the whole image at once
+    num_tile_workers : int, optional
+        number of threads sampling tiles, defaults to the number of cores
+    preprocessing_cache_mb : float, optional
+        memory budget in megabytes of the cache of the edges, normals and candidate pairs
+        of recently sampled images, so that resampling an image skips the preprocessing
+        (0 by default to disable caching)
     max_dist_from_center : int
         maximum allowable distance of a grasp from the image center
     min_grasp_dist : float
@@ -182,9 +404,9 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
     depth_sample_win_height : float
         width of a window around the grasp center pixel used to determine min depth
     """
-    def __init__(self, config, gripper_width=np.inf):
+    def __init__(self, config, gripper_width=np.inf, random_state=None):
         # init superclass
-        ImageGraspSampler.__init__(self, config, gripper_width)
+        ImageGraspSampler.__init__(self, config, gripper_width, random_state=random_state)
 
         # antipodality params
         self._friction_coef = self._config['friction_coef']
@@ -193,6 +415,23 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
         self._downsample_rate = self._config['downsample_rate']
         self._rescale_factor = 1.0 / self._downsample_rate
         self._max_rejection_samples = self._config['max_rejection_samples']
+        self._pair_search_method = 'kdtree'
+        if 'pair_search_method' in self._config.keys():
+            self._pair_search_method = self._config['pair_search_method']
+        if self._pair_search_method not in ['kdtree', 'chunked']:
+            raise ValueError('Pair search method %s not supported!' %(self._pair_search_method))
+        self._pair_chunk_size = 1024
+        if 'pair_chunk_size' in self._config.keys():
+            self._pair_chunk_size = self._config['pair_chunk_size']
+
+        # tiling params
+        self._tile_size = 0
+        if 'tile_size' in self._config.keys():
+            self._tile_size = self._config['tile_size']
+        self._num_tile_workers = mp.cpu_count()
+        if 'num_tile_workers' in self._config.keys():
+            self._num_tile_workers = self._config['num_tile_workers']
+        self._pool = None
 
         # distance thresholds for rejection sampling
         self._max_dist_from_center = self._config['max_dist_from_center']
@@ -212,18 +451,17 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
         # compute the gradients
         grad = np.gradient(depth_im.data.astype(np.float32))
 
-        # compute surface normals
-        normals = np.zeros([edge_pixels.shape[0], 2])
-        for i, pix in enumerate(edge_pixels):
-            dx = grad[1][pix[0], pix[1]]
-            dy = grad[0][pix[0], pix[1]]
-            normal_vec = np.array([dy, dx])
-            if np.linalg.norm(normal_vec) == 0:
-                normal_vec = np.array([1,0])
-            normal_vec = normal_vec / np.linalg.norm(normal_vec)
-            normals[i,:] = normal_vec
-
-        return normals
+        # gather the gradients at all edge pixels at once
+        rows = edge_pixels[:,0]
+        cols = edge_pixels[:,1]
+        normals = np.c_[grad[0][rows, cols], grad[1][rows, cols]]
+
+        # normalize, using the image row axis where the depth is flat
+        norms = np.linalg.norm(normals, axis=1)
+        flat = (norms == 0)
+        normals[flat,:] = [1, 0]
+        norms[flat] = 1
+        return (normals / norms[:,np.newaxis]).astype(np.float64)
 
     def _sample(self, rgbd_im, camera_intr, num_samples, segmask=None,
                 visualize=False):
@@ -245,14 +483,148 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
  
         Returns
         -------
-        :obj:`list` of :obj:`Grasp2D`
-            list of 2D grasp candidates
+        :obj:`GraspBatch`
+            batch of 2D grasp candidates
         """
         # sample antipodal pairs in image space
         grasps = self._sample_antipodal_grasps(rgbd_im, camera_intr, num_samples,
                                                segmask=segmask, visualize=visualize)
         return grasps
 
+    def _window_min_depths(self, depth_im):
+        """ Returns the minimum depth over the depth_sample_win_height x depth_sample_win_width
+        window around every pixel, see window_min_depths.
+        """
+        return window_min_depths(depth_im, self._h, self._w)
+
+    def _antipodal_pairs(self, edge_pixels, edge_normals, max_grasp_width_px):
+        """ Returns the ordered pairs of edge pixels closer than the maximum grasp
+        width whose normals point against each other within the friction cone,
+        in the row-major order of the pairwise matrix.
+
+        Parameters
+        ----------
+        edge_pixels : :obj:`numpy.ndarray`
+            Nx2 array of edge pixels
+        edge_normals : :obj:`numpy.ndarray`
+            Nx2 array of unit surface normals at the edge pixels
+        max_grasp_width_px : float
+            maximum distance between the pixels of a pair
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            Mx2 array of indices into the edge pixels
+        """
+        max_normal_ip = -np.cos(np.arctan(self._friction_coef))
+        if self._pair_search_method == 'kdtree':
+            # radius query for the unordered pairs within the gripper width
+            tree = cKDTree(edge_pixels)
+            try:
+                pairs = tree.query_pairs(max_grasp_width_px, output_type='ndarray')
+            except TypeError:
+                pairs = np.array(list(tree.query_pairs(max_grasp_width_px)), dtype=np.intp)
+            pairs = pairs.reshape(-1, 2)
+
+            # keep pairs strictly within the width with opposing normals
+            dists = np.linalg.norm(edge_pixels[pairs[:,0]] - edge_pixels[pairs[:,1]], axis=1)
+            normal_ip = np.sum(edge_normals[pairs[:,0]] * edge_normals[pairs[:,1]], axis=1)
+            pairs = pairs[(normal_ip < max_normal_ip) & (dists < max_grasp_width_px) & (dists > 0.0)]
+
+            # both orderings of each pair, sorted like the pairwise matrix
+            pairs = np.r_[pairs, pairs[:,::-1]]
+            order = np.lexsort((pairs[:,1], pairs[:,0]))
+            return pairs[order]
+
+        # compare blocks of pixels against all pixels
+        num_pixels = edge_pixels.shape[0]
+        pairs = []
+        for start in range(0, num_pixels, self._pair_chunk_size):
+            end = min(start + self._pair_chunk_size, num_pixels)
+            dists = ssd.cdist(edge_pixels[start:end], edge_pixels)
+            normal_ip = edge_normals[start:end].dot(edge_normals.T)
+            rows, cols = np.where((normal_ip < max_normal_ip) & (dists < max_grasp_width_px) & (dists > 0.0))
+            pairs.append(np.c_[rows + start, cols])
+        return np.concatenate(pairs, axis=0)
+
+    def _preprocess(self, rgbd_im, camera_intr, segmask=None):
+        """
+        Finds the depth edges of an image, the surface normals at the edges and
+        the antipodal pairs of edge pixels that fit in the gripper.
+
+        Parameters
+        ----------
+        rgbd_im : :obj:`perception.RgbdImage`
+            RGB-D image to sample from
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            intrinsics of the camera that captured the images
+        segmask : :obj:`perception.BinaryImage`
+            binary image segmenting out the object of interest
+
+        Returns
+        -------
+        :obj:`dict`
+            the smoothed depth image (depth_im), the edge map (depth_im_threshed),
+            the Nx2 edge_pixels and edge_normals, the Mx2 candidate pairs of edge
+            pixel indices, the tile_pair_counts of the pairs grouped by tile (None
+            without tiling) and the window_min_depths map (None when there are no pairs)
+        """
+        # compute edge pixels
+        with self._profiler.stage('edge_detection'):
+            depth_im = rgbd_im.depth
+            depth_im = depth_im.apply(snf.gaussian_filter,
+                                      sigma=self._depth_grad_gaussian_sigma)
+            depth_im_downsampled = depth_im.resize(self._rescale_factor)
+            depth_im_threshed = depth_im_downsampled.threshold_gradients(self._depth_grad_thresh)
+            edge_pixels = self._downsample_rate * depth_im_threshed.zero_pixels()
+            if segmask is not None:
+                segmask_vals = segmask.data[edge_pixels[:,0], edge_pixels[:,1]]
+                in_segmask = np.any(segmask_vals.reshape(edge_pixels.shape[0], -1) > 0, axis=1)
+                edge_pixels = edge_pixels[in_segmask]
+            num_pixels = edge_pixels.shape[0]
+        preproc = {
+            'depth_im': depth_im,
+            'depth_im_threshed': depth_im_threshed,
+            'edge_pixels': edge_pixels,
+            'edge_normals': np.zeros([0, 2]),
+            'pairs': np.zeros([0, 2], dtype=np.intp),
+            'tile_pair_counts': None,
+            'window_min_depths': None
+        }
+        if num_pixels == 0:
+            return preproc
+
+        # compute_max_depth
+        min_depth = np.min(depth_im.data) + self._min_depth_offset
+
+        # compute surface normals
+        with self._profiler.stage('normals'):
+            edge_normals = self._surface_normals(depth_im, edge_pixels)
+        preproc['edge_normals'] = edge_normals
+
+        # form set of valid candidate point pairs
+        with self._profiler.stage('pair_pruning'):
+            max_grasp_width_px = Grasp2D(Point(np.zeros(2)), 0.0, min_depth,
+                                         width = self._gripper_width,
+                                         camera_intr=camera_intr).width_px
+            if self._tile_size > 0:
+                preproc['pairs'], preproc['tile_pair_counts'] = self._tiled_antipodal_pairs(depth_im, edge_pixels, edge_normals,
+                                                                                            max_grasp_width_px)
+            else:
+                preproc['pairs'] = self._antipodal_pairs(edge_pixels, edge_normals, max_grasp_width_px)
+
+        # min depth in the window around every pixel for depth sampling
+        if preproc['pairs'].shape[0] > 0:
+            preproc['window_min_depths'] = self._window_min_depths(depth_im)
+        return preproc
+
+    def _sample_iter(self, rgbd_im, camera_intr, num_samples, chunk_size,
+                     segmask=None, visualize=False):
+        """ Yields antipodal grasp candidates in chunks as rejection sampling accepts them. """
+        return self._iter_antipodal_grasps(rgbd_im, camera_intr, num_samples,
+                                           chunk_size=chunk_size, segmask=segmask,
+                                           visualize=visualize)
+
     def _sample_antipodal_grasps(self, rgbd_im, camera_intr, num_samples,
                                  segmask=None, visualize=False):
         """
@@ -275,35 +647,56 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
  
         Returns
         -------
-        :obj:`list` of :obj:`Grasp2D`
-            list of 2D grasp candidates
+        :obj:`GraspBatch`
+            batch of 2D grasp candidates
         """
-        # compute edge pixels
-        edge_start = time()
-        depth_im = rgbd_im.depth
-        depth_im = depth_im.apply(snf.gaussian_filter,
-                                  sigma=self._depth_grad_gaussian_sigma)
-        depth_im_downsampled = depth_im.resize(self._rescale_factor)
-        depth_im_threshed = depth_im_downsampled.threshold_gradients(self._depth_grad_thresh)
-        edge_pixels = self._downsample_rate * depth_im_threshed.zero_pixels()
-        if segmask is not None:
-            edge_pixels = np.array([p for p in edge_pixels if np.any(segmask[p[0], p[1]] > 0)])
+        return GraspBatch.concatenate(list(self._iter_antipodal_grasps(rgbd_im, camera_intr, num_samples,
+                                                                       segmask=segmask,
+                                                                       visualize=visualize)),
+                                      camera_intr=camera_intr)
+
+    def _iter_antipodal_grasps(self, rgbd_im, camera_intr, num_samples, chunk_size=None,
+                               segmask=None, visualize=False):
+        """
+        Sample 2D grasp candidates from a depth image by finding depth edges,
+        then uniformly sampling point pairs and keeping only antipodal grasps
+        with width less than the maximum allowable, yielding the kept grasps
+        in chunks.
+
+        Parameters
+        ----------
+        rgbd_im : :obj:`perception.RgbdImage`
+            RGB-D image to sample from
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            intrinsics of the camera that captured the images
+        num_samples : int
+            number of grasps to sample
+        chunk_size : int
+            number of grasps per chunk, None to yield all grasps in a single chunk
+        segmask : :obj:`perception.BinaryImage`
+            binary image segmenting out the object of interest
+        visualize : bool
+            whether or not to show intermediate samples (for debugging)
+ 
+        Yields
+        ------
+        :obj:`GraspBatch`
+            the next chunk of 2D grasp candidates
+        """
+        # find the edges, normals and candidate pairs, reusing those of a recently sampled image
+        preproc = self._cached_preprocessing(rgbd_im, camera_intr, segmask=segmask)
+        depth_im = preproc['depth_im']
+        depth_im_threshed = preproc['depth_im_threshed']
+        edge_pixels = preproc['edge_pixels']
+        edge_normals = preproc['edge_normals']
+        valid_indices = preproc['pairs']
         num_pixels = edge_pixels.shape[0]
-        logging.debug('Depth edge detection took %.3f sec' %(time() - edge_start))
+        num_pairs = valid_indices.shape[0]
         logging.debug('Found %d edge pixels' %(num_pixels))
 
         # exit if no edge pixels
         if num_pixels == 0:
-            return []
-
-        # compute_max_depth
-        min_depth = np.min(depth_im.data) + self._min_depth_offset
-        max_depth = np.max(depth_im.data) + self._max_depth_offset
-
-        # compute surface normals
-        normal_start = time()
-        edge_normals = self._surface_normals(depth_im, edge_pixels)
-        logging.debug('Normal computation took %.3f sec' %(time() - normal_start))
+            return
 
         if visualize:
             vis.figure()
@@ -324,100 +717,450 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
             vis.title('Edge map')
             vis.show()
 
-        # form set of valid candidate point pairs
-        sample_start = time()
-        max_grasp_width_px = Grasp2D(Point(np.zeros(2)), 0.0, min_depth,
-                                     width = self._gripper_width,
-                                     camera_intr=camera_intr).width_px
-        normal_ip = edge_normals.dot(edge_normals.T)
-        dists = ssd.squareform(ssd.pdist(edge_pixels))
-        valid_indices = np.where((normal_ip < -np.cos(np.arctan(self._friction_coef))) & (dists < max_grasp_width_px) & (dists > 0.0))
-        valid_indices = np.c_[valid_indices[0], valid_indices[1]]
-        num_pairs = valid_indices.shape[0]
-        logging.debug('Normal pruning %.3f sec' %(time() - sample_start))
-
         # raise exception if no antipodal pairs
         if num_pairs == 0:
-            return []
-
-        # iteratively sample grasps
-        k = 0
-        grasps = []
-        sample_size = min(self._max_rejection_samples, num_pairs)
-        candidate_pair_indices = np.random.choice(num_pairs, size=sample_size,
-                                                  replace=False)
-        while k < sample_size and len(grasps) < num_samples:
-            # sample a random pair without replacement
-            j = candidate_pair_indices[k]
-            pair_ind = valid_indices[j,:]
-            p1 = edge_pixels[pair_ind[0],:]
-            p2 = edge_pixels[pair_ind[1],:]
-            n1 = edge_normals[pair_ind[0],:]
-            n2 = edge_normals[pair_ind[1],:]
-            width = np.linalg.norm(p1 - p2)
-            k += 1
-
-            # check force closure
-            if force_closure(p1, p2, n1, n2, self._friction_coef):
-                # compute grasp parameters
-                grasp_center = (p1 + p2) / 2
-                grasp_axis = p2 - p1
-                grasp_axis = grasp_axis / np.linalg.norm(grasp_axis)
-                grasp_theta = 0
-                if grasp_axis[1] != 0:
-                    grasp_theta = np.arctan(grasp_axis[0] / grasp_axis[1])
-                    
-                # compute distance from image center
-                dist_from_center = np.linalg.norm(grasp_center - depth_im.center)
-                dist_from_boundary = min(np.abs(depth_im.height - grasp_center[0]),
-                                         np.abs(depth_im.width - grasp_center[1]),
-                                         grasp_center[0],
-                                         grasp_center[1])
-                if dist_from_center < self._max_dist_from_center and \
-                   dist_from_boundary > self._min_dist_from_boundary:
-                    # form grasp object
-                    grasp_center_pt = Point(np.array([grasp_center[1], grasp_center[0]]))
-                    grasp = Grasp2D(grasp_center_pt, grasp_theta, 0.0)
-                    
-                    # check grasp dists
-                    grasp_dists = [Grasp2D.image_dist(grasp, candidate, alpha=self._angle_dist_weight) for candidate in grasps]
-                    if len(grasps) == 0 or np.min(grasp_dists) > self._min_grasp_dist:
-
-                        if visualize:
-                            vis.figure()
-                            vis.imshow(depth_im)
-                            vis.scatter(p1[1],p1[0])
-                            vis.scatter(p2[1],p2[0])
-                            vis.title('Grasp candidate %d' %(len(grasps)))
-                            vis.show()
-
-                        # sample depths
-                        for i in range(self._depth_samples_per_grasp):
-                            # get depth in the neighborhood of the center pixel
-                            depth_win = depth_im.data[grasp_center[0]-self._h:grasp_center[0]+self._h, grasp_center[1]-self._w:grasp_center[1]+self._w]
-                            center_depth = np.min(depth_win)
-                            if center_depth == 0 or np.isnan(center_depth):
-                                continue
-
-                            # sample depth between the min and max
-                            min_depth = np.min(center_depth) + self._min_depth_offset
-                            max_depth = np.max(center_depth) + self._max_depth_offset
-                            sample_depth = min_depth + (max_depth - min_depth) * np.random.rand()
-                            candidate_grasp = Grasp2D(grasp_center_pt,
-                                                      grasp_theta,
-                                                      sample_depth,
-                                                      width=self._gripper_width,
-                                                      camera_intr=camera_intr)
-                            grasps.append(candidate_grasp)
-
-        # return sampled grasps
+            return
+
+        # sample random pairs without replacement
+        rejection_start = time()
+        rejection_time = 0.0
+        if preproc['tile_pair_counts'] is not None:
+            # sample the tiles in parallel and thin the merged candidates
+            candidates = self._sample_tiles(preproc)
+        else:
+            sample_size = min(self._max_rejection_samples, num_pairs)
+            candidate_pair_indices = self._rng.choice(num_pairs, size=sample_size,
+                                                      replace=False)
+            candidates = self._pair_candidates(preproc, valid_indices[candidate_pair_indices,:])
+        p1 = candidates['p1']
+        p2 = candidates['p2']
+        grasp_centers_px = candidates['centers_px']
+        grasp_axes_px = candidates['axes_px']
+        grasp_thetas = candidates['thetas']
+        center_depths = candidates['center_depths']
+
+        # greedily keep feasible grasps in sampling order that are far from the grasps already kept
+        pending = []
+        num_accepted = 0
+        try:
+            for k in self._iter_thinned(np.where(candidates['feasible'])[0], grasp_centers_px, grasp_axes_px):
+                if num_accepted >= num_samples:
+                    break
+
+                if visualize:
+                    vis.figure()
+                    vis.imshow(depth_im)
+                    vis.scatter(p1[k,1],p1[k,0])
+                    vis.scatter(p2[k,1],p2[k,0])
+                    vis.title('Grasp candidate %d' %(num_accepted))
+                    vis.show()
+
+                pending.append(k)
+                num_accepted += self._depth_samples_per_grasp
+
+                # hand off a full chunk, pausing the clock while the consumer runs
+                if chunk_size is not None and len(pending) * self._depth_samples_per_grasp >= chunk_size:
+                    grasps = self._depth_sampled_grasps(pending, grasp_centers_px, grasp_thetas,
+                                                        center_depths, camera_intr)
+                    pending = []
+                    rejection_time += time() - rejection_start
+                    rejection_start = None
+                    yield grasps
+                    rejection_start = time()
+
+            # hand off the remaining grasps
+            if len(pending) > 0 or chunk_size is None:
+                grasps = self._depth_sampled_grasps(pending, grasp_centers_px, grasp_thetas,
+                                                    center_depths, camera_intr)
+                rejection_time += time() - rejection_start
+                rejection_start = None
+                yield grasps
+        finally:
+            if rejection_start is not None:
+                rejection_time += time() - rejection_start
+            self._profiler.add('rejection_sampling', rejection_time)
+
+    def _pair_candidates(self, preproc, pair_inds):
+        """ Computes the grasp parameters of a set of edge pixel pairs and checks their
+        feasibility (force closure, distance from the image center and boundary, and a
+        valid depth around the center) all at once.
+
+        Parameters
+        ----------
+        preproc : :obj:`dict`
+            preprocessing of the image, see _preprocess
+        pair_inds : :obj:`numpy.ndarray`
+            Nx2 array of indices into the edge pixels
+
+        Returns
+        -------
+        :obj:`dict`
+            the Nx2 contacts p1 and p2 and centers in (row, col) order, the Nx2
+            centers_px and axes_px in (x, y) order, the N thetas, the N center_depths
+            and the N boolean feasible flags of the grasps
+        """
+        depth_im = preproc['depth_im']
+        edge_pixels = preproc['edge_pixels']
+        edge_normals = preproc['edge_normals']
+        sample_size = pair_inds.shape[0]
+        p1 = edge_pixels[pair_inds[:,0],:]
+        p2 = edge_pixels[pair_inds[:,1],:]
+        n1 = edge_normals[pair_inds[:,0],:]
+        n2 = edge_normals[pair_inds[:,1],:]
+
+        # check force closure and compute the grasp parameters of all pairs at once
+        in_force_closure = force_closure_batch(p1, p2, n1, n2, self._friction_coef)
+        grasp_centers = (p1 + p2) // 2
+        grasp_axes = p2 - p1
+        grasp_axes = grasp_axes / np.linalg.norm(grasp_axes, axis=1)[:,np.newaxis]
+        grasp_thetas = np.zeros(sample_size)
+        nonvertical = (grasp_axes[:,1] != 0)
+        grasp_thetas[nonvertical] = np.arctan(grasp_axes[nonvertical,0] / grasp_axes[nonvertical,1])
+
+        # check distance from the image center and boundary
+        dists_from_center = np.linalg.norm(grasp_centers - depth_im.center, axis=1)
+        dists_from_boundary = np.min(np.c_[np.abs(depth_im.height - grasp_centers[:,0]),
+                                           np.abs(depth_im.width - grasp_centers[:,1]),
+                                           grasp_centers[:,0],
+                                           grasp_centers[:,1]], axis=1)
+        feasible = in_force_closure & \
+                   (dists_from_center < self._max_dist_from_center) & \
+                   (dists_from_boundary > self._min_dist_from_boundary)
+
+        # look up the min depth in the window around each grasp center
+        center_depths = preproc['window_min_depths'][grasp_centers[:,0], grasp_centers[:,1]]
+        feasible &= (center_depths != 0) & ~np.isnan(center_depths)
+
+        return {
+            'p1': p1,
+            'p2': p2,
+            'centers': grasp_centers,
+            'centers_px': np.c_[grasp_centers[:,1], grasp_centers[:,0]],
+            'axes_px': np.c_[np.cos(grasp_thetas), np.sin(grasp_thetas)],
+            'thetas': grasp_thetas,
+            'center_depths': center_depths,
+            'feasible': feasible
+        }
+
+    def _iter_thinned(self, indices, grasp_centers_px, grasp_axes_px):
+        """ Greedily keeps the grasps in the given order that are farther than
+        min_grasp_dist from all of the grasps kept before them, yielding the index
+        of each kept grasp. The kept centers are hashed into cells at least
+        min_grasp_dist wide so that only the neighboring cells can contain a grasp
+        within min_grasp_dist.
+        """
+        cell_size = max(self._min_grasp_dist, 1.0)
+        cells = {}
+        for k in indices:
+            grasp_center_px = grasp_centers_px[k]
+            cell = np.floor(grasp_center_px / cell_size).astype(np.int64)
+            neighbors = []
+            for dx in [-1, 0, 1]:
+                for dy in [-1, 0, 1]:
+                    neighbors.extend(cells.get((cell[0] + dx, cell[1] + dy), []))
+            if len(neighbors) > 0:
+                point_dists = np.linalg.norm(grasp_centers_px[neighbors] - grasp_center_px, axis=1)
+                axis_dists = np.arccos(np.clip(np.abs(grasp_axes_px[neighbors].dot(grasp_axes_px[k])), 0.0, 1.0))
+                grasp_dists = point_dists + self._angle_dist_weight * axis_dists
+                if np.min(grasp_dists) <= self._min_grasp_dist:
+                    continue
+            cells.setdefault((cell[0], cell[1]), []).append(k)
+            yield k
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """ Terminates the worker pool for tiled sampling, if one was created. """
+        if getattr(self, '_pool', None) is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def _tile_pool(self):
+        """ Returns the worker pool for tiled sampling, creating it on first use. """
+        if self._pool is None:
+            self._pool = ThreadPool(self._num_tile_workers)
+        return self._pool
+
+    def _tiles(self, height, width, max_grasp_width_px):
+        """ Returns the (row_start, row_end, col_start, col_end) bounds of the tiles
+        covering an image, each at least as wide as the maximum grasp width.
+        """
+        tile_size = int(max(self._tile_size, np.ceil(max_grasp_width_px)))
+        return [(r, min(r + tile_size, height), c, min(c + tile_size, width))
+                for r in range(0, height, tile_size)
+                for c in range(0, width, tile_size)]
+
+    def _tiled_antipodal_pairs(self, depth_im, edge_pixels, edge_normals, max_grasp_width_px):
+        """ Finds the antipodal pairs of each tile of an image in parallel.
+        Each tile is padded by half of the maximum grasp width so that it contains
+        both pixels of every pair centered in the tile, and keeps only those pairs,
+        so the tiles partition the pairs of the whole image.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            Mx2 array of indices into the edge pixels, grouped by tile
+        :obj:`list` of int
+            number of pairs of each tile
+        """
+        margin = int(np.ceil(max_grasp_width_px / 2.0)) + 1
+        def tile_pairs(tile):
+            r0, r1, c0, c1 = tile
+            in_tile = np.where((edge_pixels[:,0] >= r0 - margin) & (edge_pixels[:,0] < r1 + margin) & \
+                               (edge_pixels[:,1] >= c0 - margin) & (edge_pixels[:,1] < c1 + margin))[0]
+            if in_tile.shape[0] == 0:
+                return np.zeros([0, 2], dtype=np.intp)
+            pairs = in_tile[self._antipodal_pairs(edge_pixels[in_tile], edge_normals[in_tile], max_grasp_width_px)]
+            centers = (edge_pixels[pairs[:,0]] + edge_pixels[pairs[:,1]]) // 2
+            in_core = (centers[:,0] >= r0) & (centers[:,0] < r1) & \
+                      (centers[:,1] >= c0) & (centers[:,1] < c1)
+            return pairs[in_core]
+        tiles = self._tiles(depth_im.height, depth_im.width, max_grasp_width_px)
+        pairs = self._tile_pool().map(tile_pairs, tiles)
+        logging.debug('Found pairs in %d tiles' %(len(tiles)))
+        return np.concatenate(pairs, axis=0).reshape(-1, 2), [p.shape[0] for p in pairs]
+
+    def _sample_tiles(self, preproc):
+        """ Samples the pairs of each tile in parallel, splitting max_rejection_samples
+        between the tiles by their number of pairs, and keeps the feasible samples.
+        The tiles are seeded from the random stream of the sampler.
+
+        Returns
+        -------
+        :obj:`dict`
+            the merged feasible candidates of the tiles in random order, see _pair_candidates
+        """
+        counts = preproc['tile_pair_counts']
+        offsets = np.r_[0, np.cumsum(counts)]
+        num_pairs = offsets[-1]
+        seeds = self._rng.randint(np.iinfo(np.int32).max, size=len(counts))
+        def sample_tile(i):
+            num_tile_pairs = counts[i]
+            if num_tile_pairs == 0:
+                return None
+            rng = np.random.RandomState(seeds[i])
+            sample_size = min(num_tile_pairs, int(np.ceil(float(self._max_rejection_samples) * num_tile_pairs / num_pairs)))
+            pair_inds = preproc['pairs'][offsets[i] + rng.choice(num_tile_pairs, size=sample_size, replace=False)]
+            candidates = self._pair_candidates(preproc, pair_inds)
+            feasible = candidates['feasible']
+            return dict([(name, value[feasible]) for name, value in candidates.items()])
+        tile_candidates = [c for c in self._tile_pool().map(sample_tile, range(len(counts))) if c is not None]
+
+        # shuffle so that the thinning does not favor the first tiles
+        names = tile_candidates[0].keys()
+        candidates = dict([(name, np.concatenate([c[name] for c in tile_candidates], axis=0)) for name in names])
+        order = self._rng.permutation(candidates['feasible'].shape[0])
+        return dict([(name, value[order]) for name, value in candidates.items()])
+
+    def _depth_sampled_grasps(self, indices, grasp_centers_px, grasp_thetas, center_depths, camera_intr):
+        """ Samples depths between the min and max for each kept grasp and returns the resulting batch. """
+        indices = np.repeat(np.array(indices, dtype=np.intp), self._depth_samples_per_grasp)
+        min_depths = center_depths[indices] + self._min_depth_offset
+        max_depths = center_depths[indices] + self._max_depth_offset
+        grasp_depths = min_depths + (max_depths - min_depths) * self._rng.rand(indices.shape[0])
+        return GraspBatch(grasp_centers_px[indices],
+                          grasp_thetas[indices],
+                          grasp_depths,
+                          widths=self._gripper_width,
+                          camera_intr=camera_intr)
+
+class DenseGridDepthImageGraspSampler(ImageGraspSampler):
+    """ Grasp sampler that enumerates a regular grid of grasp centers, angles and
+    depths over the object and keeps the candidates whose jaws clear the surface.
+    Unlike rejection sampling, the whole grid is checked at once, so the cost only
+    depends on the size of the grid.
+
+    The candidates are ordered by center (row-major), then angle, then depth, so
+    candidates that differ only in depth are adjacent and share an image crop
+    when they are converted to GQ-CNN inputs. The jaws are placed at the gripper
+    width, so the sampler requires a finite gripper width.
+
+    Notes
+    -----
+    Required configuration parameters are specified in Other Parameters
+
+    Other Parameters
+    ----------------
+    grid_stride : int, optional
+        distance in pixels between neighboring grasp centers
+    num_angles : int, optional
+        number of grasp axis angles, evenly spaced over [-pi/2, pi/2)
+    num_depths : int, optional
+        number of grasp depths, evenly spaced from the min to the max depth offset
+    max_dist_from_center : int
+        maximum allowable distance of a grasp from the image center
+    min_dist_from_boundary : int
+        minimum distance of the grasp center and jaws from the image boundary
+    min_depth_offset : float
+        offset from the minimum depth around the grasp center of the first grasp depth
+    max_depth_offset : float
+        offset from the minimum depth around the grasp center of the last grasp depth
+    depth_sample_win_height : int
+        half height of a window around the grasp center and jaws used to determine min depth
+    depth_sample_win_width : int
+        half width of a window around the grasp center and jaws used to determine min depth
+    """
+    def __init__(self, config, gripper_width=np.inf, random_state=None):
+        # init superclass
+        ImageGraspSampler.__init__(self, config, gripper_width, random_state=random_state)
+        if not np.isfinite(self._gripper_width):
+            raise ValueError('Dense grid sampling requires a finite gripper width')
+
+        # grid params
+        self._grid_stride = 8
+        if 'grid_stride' in self._config.keys():
+            self._grid_stride = self._config['grid_stride']
+        self._num_angles = 8
+        if 'num_angles' in self._config.keys():
+            self._num_angles = self._config['num_angles']
+        self._num_depths = 1
+        if 'num_depths' in self._config.keys():
+            self._num_depths = self._config['num_depths']
+
+        # distance thresholds
+        self._max_dist_from_center = self._config['max_dist_from_center']
+        self._min_dist_from_boundary = self._config['min_dist_from_boundary']
+
+        # depth params
+        self._min_depth_offset = self._config['min_depth_offset']
+        self._max_depth_offset = self._config['max_depth_offset']
+        self._h = self._config['depth_sample_win_height']
+        self._w = self._config['depth_sample_win_width']
+
+    def _sample(self, rgbd_im, camera_intr, num_samples, segmask=None,
+                visualize=False):
+        """
+        Sample a set of 2D grasp candidates from the valid candidates on a grid.
+        If there are more than num_samples valid candidates, a random subset of
+        the grasp centers and angles is kept.
+
+        Parameters
+        ----------
+        rgbd_im : :obj:`perception.RgbdImage`
+            RGB-D image to sample from
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            intrinsics of the camera that captured the images
+        num_samples : int
+            number of grasps to sample
+        segmask : :obj:`perception.BinaryImage`
+            binary image segmenting out the object of interest
+        visualize : bool
+            whether or not to show intermediate samples (for debugging)
+ 
+        Returns
+        -------
+        :obj:`GraspBatch`
+            batch of 2D grasp candidates
+        """
+        preproc = self._cached_preprocessing(rgbd_im, camera_intr, segmask=segmask)
+        grasps = GraspBatch(preproc['centers'], preproc['angles'], preproc['depths'],
+                            widths=self._gripper_width, camera_intr=camera_intr)
+        logging.debug('Found %d valid grid grasps' %(len(grasps)))
+
+        # keep a random subset of the (center, angle) pairs with all of their depths
+        if len(grasps) > num_samples:
+            pose_ids = preproc['pose_ids']
+            poses = np.unique(pose_ids)
+            num_keep = min(max(num_samples // self._num_depths, 1), poses.shape[0])
+            kept_poses = self._rng.choice(poses, size=num_keep, replace=False)
+            grasps = grasps[np.where(np.in1d(pose_ids, kept_poses))[0][:num_samples]]
+
+        if visualize:
+            vis.figure()
+            vis.imshow(rgbd_im.depth)
+            vis.scatter(grasps.centers[:,0], grasps.centers[:,1], s=10, c='b')
+            vis.title('Grid grasp centers')
+            vis.show()
         return grasps
 
+    def _preprocess(self, rgbd_im, camera_intr, segmask=None):
+        """
+        Enumerates the grid of candidates on an image and checks the validity of
+        every candidate at once: the center must be on the object (in the segmask,
+        if given) with a valid depth, within the distance limits of the image
+        center and boundary, and both jaws must be in the image with the surface
+        around them farther away than the grasp depth.
+
+        Parameters
+        ----------
+        rgbd_im : :obj:`perception.RgbdImage`
+            RGB-D image to sample from
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            intrinsics of the camera that captured the images
+        segmask : :obj:`perception.BinaryImage`
+            binary image segmenting out the object of interest
+
+        Returns
+        -------
+        :obj:`dict`
+            the Nx2 centers in (x, y) order, N angles and N depths of the valid candidates,
+            and the N pose_ids of the (center, angle) pair of each candidate on the grid
+        """
+        with self._profiler.stage('grid_validity'):
+            depth_im = rgbd_im.depth
+            height, width = depth_im.height, depth_im.width
+            min_depths = window_min_depths(depth_im, self._h, self._w)
+
+            # grid of centers on the object
+            rows, cols = np.meshgrid(np.arange(0, height, self._grid_stride),
+                                     np.arange(0, width, self._grid_stride),
+                                     indexing='ij')
+            rows = rows.ravel()
+            cols = cols.ravel()
+            center_depths = min_depths[rows, cols]
+            with np.errstate(invalid='ignore'):
+                on_object = (center_depths > 0) & ~np.isnan(center_depths)
+            if segmask is not None:
+                segmask_vals = segmask.data[rows, cols]
+                on_object &= np.any(segmask_vals.reshape(rows.shape[0], -1) > 0, axis=1)
+            dists_from_center = np.linalg.norm(np.c_[rows, cols] - depth_im.center, axis=1)
+            on_object &= (dists_from_center < self._max_dist_from_center)
+            rows = rows[on_object]
+            cols = cols[on_object]
+            center_depths = center_depths[on_object]
+
+            # every angle and depth at each center
+            num_centers = rows.shape[0]
+            angles = np.linspace(-np.pi / 2, np.pi / 2, self._num_angles, endpoint=False)
+            depth_offsets = np.linspace(self._min_depth_offset, self._max_depth_offset, self._num_depths)
+            num_per_center = self._num_angles * self._num_depths
+            center_inds = np.repeat(np.arange(num_centers), num_per_center)
+            grasps = GraspBatch(np.c_[cols, rows][center_inds],
+                                np.tile(np.repeat(angles, self._num_depths), num_centers),
+                                center_depths[center_inds] + np.tile(depth_offsets, num_centers * self._num_angles),
+                                widths=self._gripper_width,
+                                camera_intr=camera_intr)
+
+            # jaws in the image and clear of the surface
+            margin = self._min_dist_from_boundary
+            valid = np.ones(len(grasps), dtype=bool)
+            for p in [grasps.centers] + list(grasps.endpoints):
+                with np.errstate(invalid='ignore'):
+                    valid &= (p[:,0] > margin) & (p[:,0] < width - 1 - margin) & \
+                             (p[:,1] > margin) & (p[:,1] < height - 1 - margin)
+            for p in grasps.endpoints:
+                jaw_cols = np.clip(np.nan_to_num(np.round(p[:,0])), 0, width - 1).astype(np.int32)
+                jaw_rows = np.clip(np.nan_to_num(np.round(p[:,1])), 0, height - 1).astype(np.int32)
+                with np.errstate(invalid='ignore'):
+                    valid &= (min_depths[jaw_rows, jaw_cols] > grasps.depths)
+
+            grasps = grasps[valid]
+            pose_ids = np.where(valid)[0] // self._num_depths
+        return {
+            'centers': grasps.centers,
+            'angles': grasps.angles,
+            'depths': grasps.depths,
+            'pose_ids': pose_ids
+        }
+
 class ImageGraspSamplerFactory(object):
     """ Factory for image grasp samplers. """
     @staticmethod
-    def sampler(sampler_type, config, gripper_width):
+    def sampler(sampler_type, config, gripper_width, random_state=None):
         if sampler_type == 'antipodal_depth':
-            return AntipodalDepthImageGraspSampler(config, gripper_width)
+            return AntipodalDepthImageGraspSampler(config, gripper_width, random_state=random_state)
+        elif sampler_type == 'grid_depth':
+            return DenseGridDepthImageGraspSampler(config, gripper_width, random_state=random_state)
         else:
             raise ValueError('Image grasp sampler type %s not supported!' %(sampler_type))
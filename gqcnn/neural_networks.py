@@ -71,6 +71,7 @@ class GQCNN(object):
         """
         self._sess = None
         self._graph = tf.Graph()
+        self._q_grad_nodes = None
         self._parse_config(config)
 
     @staticmethod
@@ -526,6 +527,7 @@ class GQCNN(object):
 
             # build network
             self._output_tensor = self._build_network(self._input_im_node, self._input_pose_node)
+            self._q_grad_nodes = None
             if add_softmax:
                 self.add_softmax_to_predict()
 
@@ -690,6 +692,7 @@ class GQCNN(object):
     def add_softmax_to_predict(self):
         """ Adds softmax to output tensor of prediction network """
         self._output_tensor = tf.nn.softmax(self._output_tensor)
+        self._q_grad_nodes = None
 
     def update_batch_size(self, batch_size):
         """ Updates the prediction batch size 
@@ -745,6 +748,70 @@ class GQCNN(object):
             if close_sess:
                 self.close_session()
         return output_arr
+
+    def predict_with_gradients(self, image_arr, pose_arr):
+        """ Predict a set of images in batches along with the gradients of the
+        last network output (the probability of success) with respect to the
+        input images and poses
+
+        Parameters
+        ----------
+        image_arr : :obj:`numpy.ndarray`
+            4D Tensor of images to be predicted
+        pose_arr : :obj:`numpy.ndarray`
+            2D Tensor of poses to be predicted
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            network output for each image
+        :obj:`numpy.ndarray`
+            gradient of the last output with respect to each (unnormalized) image
+        :obj:`numpy.ndarray`
+            gradient of the last output with respect to each (unnormalized) pose
+        """
+        # setup prediction
+        num_images = image_arr.shape[0]
+        num_poses = pose_arr.shape[0]
+        output_arr = np.zeros([num_images, self.fc5_out_size])
+        image_grad_arr = np.zeros(image_arr.shape)
+        pose_grad_arr = np.zeros(pose_arr.shape)
+        if num_images != num_poses:
+            raise ValueError('Must provide same number of images and poses')
+
+        # predict and differentiate by filling in image array in batches
+        close_sess = False
+        with self._graph.as_default():
+            if self._q_grad_nodes is None:
+                # the samples of a batch are independent, so the gradient of the sum is per-sample
+                self._q_grad_nodes = tf.gradients(self._output_tensor[:,-1],
+                                                  [self._input_im_node, self._input_pose_node])
+            if self._sess is None:
+                close_sess = True
+                self.open_session()
+            i = 0
+            while i < num_images:
+                dim = min(self._batch_size, num_images - i)
+                cur_ind = i
+                end_ind = cur_ind + dim
+                self._input_im_arr[:dim, :, :, :] = (
+                    image_arr[cur_ind:end_ind, :, :, :] - self._im_mean) / self._im_std
+                self._input_pose_arr[:dim, :] = (
+                    pose_arr[cur_ind:end_ind, :] - self._pose_mean) / self._pose_std
+
+                gqcnn_output, im_grad, pose_grad = self._sess.run([self._output_tensor] + self._q_grad_nodes,
+                                                                  feed_dict={self._input_im_node: self._input_im_arr,
+                                                                             self._input_pose_node: self._input_pose_arr})
+                output_arr[cur_ind:end_ind, :] = gqcnn_output[:dim, :]
+
+                # chain rule through the input normalization
+                image_grad_arr[cur_ind:end_ind, ...] = im_grad[:dim, ...] / self._im_std
+                pose_grad_arr[cur_ind:end_ind, :] = pose_grad[:dim, :] / self._pose_std
+
+                i = end_ind
+            if close_sess:
+                self.close_session()
+        return output_arr, image_grad_arr, pose_grad_arr
 		
     @property
     def filters(self):
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Per-stage wall time profiling of grasp planning requests.
+Author: Jeff Mahler
+"""
+from collections import deque
+from contextlib import contextmanager
+import json
+import logging
+import numpy as np
+from time import time
+
+REQUEST_STAGE = 'request'
+
+class PlanningProfiler(object):
+    """ Records the wall time of each stage of a planning request and keeps
+    rolling statistics of the stage times over the most recent requests.
+
+    Stage times within a request are summed by stage name, so a stage that runs
+    once per CEM iteration contributes its total time to the rolling statistics.
+    Stages recorded outside of a request are treated as single-stage requests.
+
+    Attributes
+    ----------
+    window_size : int
+        number of recent requests to compute statistics over
+    percentiles : :obj:`list` of float
+        percentiles to report for each stage
+    histogram_bins : :obj:`numpy.ndarray`
+        edges of the histogram bins in seconds
+    """
+    def __init__(self, window_size=1000, percentiles=[50, 90, 99],
+                 histogram_bins=None):
+        self._window_size = window_size
+        self._percentiles = list(percentiles)
+        self._histogram_bins = histogram_bins
+        if self._histogram_bins is None:
+            self._histogram_bins = np.logspace(-5, 2, 36)
+        self.reset()
+
+    def reset(self):
+        """ Clears the current request and all rolling statistics. """
+        self._record = None
+        self._request_start = None
+        self._last_record = None
+        self._num_requests = 0
+        self._stage_times = {}
+
+    @property
+    def num_requests(self):
+        return self._num_requests
+
+    @property
+    def last_record(self):
+        """ Per-stage record of the last finished request, see finish_request. """
+        return self._last_record
+
+    @property
+    def stage_names(self):
+        return sorted(self._stage_times.keys())
+
+    def start_request(self):
+        """ Starts the record of a new planning request. """
+        self._record = []
+        self._request_start = time()
+
+    def finish_request(self):
+        """ Finishes the current request and adds its stage times to the rolling statistics.
+
+        Returns
+        -------
+        :obj:`dict`
+            record of the request with the ordered list of (stage, duration) pairs
+            under 'stages', the summed duration per stage under 'totals' and the
+            wall time of the whole request under 'total'
+        """
+        if self._record is None:
+            return None
+        totals = {}
+        for name, duration in self._record:
+            totals[name] = totals.get(name, 0.0) + duration
+        record = {
+            'stages': self._record,
+            'totals': totals,
+            'total': time() - self._request_start
+        }
+        for name, duration in totals.items():
+            self._add_stage_time(name, duration)
+        self._add_stage_time(REQUEST_STAGE, record['total'])
+        self._num_requests += 1
+        self._last_record = record
+        self._record = None
+        self._request_start = None
+        return record
+
+    @contextmanager
+    def stage(self, name):
+        """ Context manager that records the wall time of the enclosed block as a stage.
+
+        Parameters
+        ----------
+        name : str
+            name of the stage
+        """
+        stage_start = time()
+        try:
+            yield
+        finally:
+            self.add(name, time() - stage_start)
+
+    def add(self, name, duration):
+        """ Records a stage duration in seconds. """
+        logging.debug('%s took %.3f sec' %(name, duration))
+        if self._record is not None:
+            self._record.append((name, duration))
+        else:
+            self._add_stage_time(name, duration)
+
+    def _add_stage_time(self, name, duration):
+        if name not in self._stage_times.keys():
+            self._stage_times[name] = deque(maxlen=self._window_size)
+        self._stage_times[name].append(duration)
+
+    def stage_stats(self, name):
+        """ Returns the rolling statistics of a stage.
+
+        Parameters
+        ----------
+        name : str
+            name of the stage, or 'request' for the total request time
+
+        Returns
+        -------
+        :obj:`dict`
+            count, mean, max, the configured percentiles (as 'p50', ...) and a
+            histogram with the counts and bin edges in seconds
+        """
+        times = np.array(self._stage_times[name])
+        stats = {
+            'count': int(times.shape[0]),
+            'mean': float(np.mean(times)),
+            'max': float(np.max(times))
+        }
+        for p, value in zip(self._percentiles, np.percentile(times, self._percentiles)):
+            stats['p%g' %(p)] = float(value)
+        counts, _ = np.histogram(np.clip(times, self._histogram_bins[0], self._histogram_bins[-1]),
+                                 bins=self._histogram_bins)
+        stats['histogram'] = {
+            'counts': counts.tolist(),
+            'bin_edges': self._histogram_bins.tolist()
+        }
+        return stats
+
+    def to_dict(self):
+        """ Returns the rolling statistics of every stage and the last request record. """
+        return {
+            'num_requests': self._num_requests,
+            'window_size': self._window_size,
+            'stages': dict([(name, self.stage_stats(name)) for name in self.stage_names]),
+            'last_record': self._last_record
+        }
+
+    def to_json(self, filename=None):
+        """ Exports the statistics to a JSON string, or to a file if filename is given. """
+        if filename is not None:
+            with open(filename, 'w') as f:
+                json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+            return None
+        return json.dumps(self.to_dict(), sort_keys=True)
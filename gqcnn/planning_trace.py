@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Lightweight traces of the data behind the policy visualizations, and renderers
+that turn them into figures outside of the planning path.
+Author: Jeff Mahler
+"""
+import cPickle as pkl
+import json
+import logging
+import matplotlib.pyplot as plt
+import multiprocessing as mp
+import numpy as np
+import os
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import autolab_core.utils as utils
+from autolab_core import Point
+from perception import CameraIntrinsics, DepthImage
+
+from . import Grasp2D, GraspBatch
+from . import Visualizer as vis
+from . import BackpressurePolicy
+
+FIGSIZE = 16
+
+class TracePlotType:
+    """ Types of plots that can be stored in a planning trace. """
+    TF_IMAGES = 'tf_images'
+    GRASP_CANDIDATES = 'grasp_candidates'
+    GRASP_RANKING = 'grasp_ranking'
+    GRASP_PLAN = 'grasp_plan'
+
+class RenderMode:
+    """ When the figures of a planning trace are drawn. """
+    INLINE = 'inline'
+    ASYNC = 'async'
+    NONE = 'none'
+
+def camera_intr_to_array(camera_intr):
+    """ Packs camera intrinsics into an array of [fx, fy, cx, cy, skew, height, width]. """
+    return np.array([camera_intr.fx, camera_intr.fy,
+                     camera_intr.cx, camera_intr.cy,
+                     camera_intr.skew,
+                     camera_intr.height, camera_intr.width])
+
+def camera_intr_from_array(frame, arr):
+    """ Unpacks camera intrinsics packed by camera_intr_to_array. """
+    fx, fy, cx, cy, skew, height, width = arr
+    return CameraIntrinsics(frame, fx, fy=fy, cx=cx, cy=cy, skew=skew,
+                            height=int(height), width=int(width))
+
+class PlanningTrace(object):
+    """ Raw data needed to draw the policy visualizations of a planning request.
+    Each entry stores the plot type, the figure filename, the index of the
+    state it belongs to, json-serializable parameters and numpy arrays.
+    Full depth images are stored once and referenced by key.
+    """
+    def __init__(self):
+        self._entries = []
+        self._images = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def entries(self):
+        return self._entries
+
+    @property
+    def images(self):
+        return self._images
+
+    def add_image(self, key, data):
+        """ Stores a full image that entries can reference by key. """
+        self._images[key] = data
+
+    def add(self, plot_type, filename, state_ind=0, params=None, **arrays):
+        """ Adds a plot to the trace.
+
+        Parameters
+        ----------
+        plot_type : str
+            type of plot, see TracePlotType
+        filename : str
+            filename of the figure
+        state_ind : int
+            index of the state in the planning request
+        params : :obj:`dict`
+            json-serializable plot parameters
+        **arrays : :obj:`numpy.ndarray`
+            arrays needed to draw the plot
+        """
+        if params is None:
+            params = {}
+        self._entries.append({
+            'type': plot_type,
+            'filename': filename,
+            'state_ind': state_ind,
+            'params': params,
+            'arrays': arrays
+        })
+
+    def for_state(self, state_ind):
+        """ Returns the sub-trace for a single state of the request. """
+        trace = PlanningTrace()
+        for entry in self._entries:
+            if entry['state_ind'] != state_ind:
+                continue
+            trace._entries.append(dict(entry, state_ind=0))
+            image_key = entry['params'].get('image_key', None)
+            if image_key is not None:
+                trace._images[image_key] = self._images[image_key]
+        return trace
+
+    def extend(self, trace, state_ind=0):
+        """ Appends the entries of a single-state trace under the given state index. """
+        for key, data in trace._images.items():
+            self._images['%s_%d' %(key, state_ind)] = data
+        for entry in trace._entries:
+            params = dict(entry['params'])
+            if 'image_key' in params.keys():
+                params['image_key'] = '%s_%d' %(params['image_key'], state_ind)
+            self._entries.append(dict(entry, state_ind=state_ind, params=params))
+
+    def to_record(self, prefix='trace'):
+        """ Returns a dictionary of numpy arrays that stores the trace in a policy log record. """
+        record = {}
+        meta = []
+        for i, entry in enumerate(self._entries):
+            meta.append({
+                'type': entry['type'],
+                'filename': entry['filename'],
+                'state_ind': entry['state_ind'],
+                'params': entry['params'],
+                'keys': list(entry['arrays'].keys())
+            })
+            for key, arr in entry['arrays'].items():
+                record['%s_%d_%s' %(prefix, i, key)] = arr
+        for key, data in self._images.items():
+            record['%s_image_%s' %(prefix, key)] = data
+        record['%s_meta' %(prefix)] = np.array(json.dumps({'entries': meta,
+                                                           'images': list(self._images.keys())}))
+        return record
+
+    @staticmethod
+    def from_record(record, prefix='trace'):
+        """ Loads a trace stored by PlanningTrace.to_record, returning None if the record has no trace. """
+        meta_key = '%s_meta' %(prefix)
+        if meta_key not in record.keys():
+            return None
+        meta = json.loads(str(record[meta_key]))
+        trace = PlanningTrace()
+        for key in meta['images']:
+            trace._images[key] = record['%s_image_%s' %(prefix, key)]
+        for i, entry in enumerate(meta['entries']):
+            arrays = dict([(key, record['%s_%d_%s' %(prefix, i, key)]) for key in entry['keys']])
+            trace.add(entry['type'], entry['filename'], state_ind=entry['state_ind'],
+                      params=entry['params'], **arrays)
+        return trace
+
+def _trace_grasps(arrays, params):
+    """ Forms the grasps stored in a trace entry. """
+    camera_intr = camera_intr_from_array(params['camera_frame'], arrays['camera_intr'])
+    return GraspBatch(arrays['grasp_centers'], arrays['grasp_angles'],
+                      arrays['grasp_depths'], widths=arrays['grasp_widths'],
+                      camera_intr=camera_intr)
+
+def _render_tf_images(trace, arrays, params):
+    d = params['grid_size']
+    images = arrays['images']
+    depths = arrays['depths']
+    vis.figure(size=(FIGSIZE,FIGSIZE))
+    for i in range(images.shape[0]):
+        vis.subplot(d,d,i+1)
+        vis.imshow(DepthImage(images[i]))
+        vis.title('Image %d: d=%.3f' %(i, depths[i]))
+
+    if 'grasp_centers' in arrays.keys():
+        # display grasps next to their transformed images
+        grasps = _trace_grasps(arrays, params)
+        depth_im = DepthImage(trace.images[params['image_key']])
+        vis.figure(size=(FIGSIZE,FIGSIZE))
+        for i in range(len(grasps)):
+            vis.subplot(d,2,2*i+1)
+            vis.imshow(depth_im)
+            vis.grasp(grasps[i], scale=1.5, show_center=False, show_axis=True)
+            vis.title('Grasp %d: d=%.3f' %(i, depths[i]))
+
+            vis.subplot(d,2,2*i+2)
+            vis.imshow(DepthImage(images[i]))
+            vis.title('TF image %d: d=%.3f' %(i, depths[i]))
+
+def _render_grasp_candidates(trace, arrays, params):
+    grasps = _trace_grasps(arrays, params)
+    vis.figure(size=(FIGSIZE,FIGSIZE))
+    vis.imshow(DepthImage(trace.images[params['image_key']]))
+    for grasp, q in zip(grasps, arrays['q_values']):
+        vis.grasp(grasp, scale=1.5, show_center=False, show_axis=True,
+                  color=plt.cm.RdYlBu(q))
+    vis.title(params['title'])
+
+def _render_grasp_ranking(trace, arrays, params):
+    d = params['grid_size']
+    camera_intr = camera_intr_from_array(params['camera_frame'], arrays['thumbnail_camera_intr'])
+    vis.figure(size=(FIGSIZE,FIGSIZE))
+    for i in range(arrays['images'].shape[0]):
+        depth = arrays['depths'][i]
+        image = DepthImage(arrays['images'][i])
+        grasp = Grasp2D(Point(image.center), 0.0, depth,
+                        width=params['gripper_width'],
+                        camera_intr=camera_intr)
+        vis.subplot(d,d,i+1)
+        vis.imshow(image)
+        vis.grasp(grasp, scale=1.5)
+        vis.title('K=%d: d=%.3f, q=%.3f' %(i, depth, arrays['q_values'][i]))
+
+def _render_grasp_plan(trace, arrays, params):
+    camera_intr = camera_intr_from_array(params['camera_frame'], arrays['thumbnail_camera_intr'])
+    image = DepthImage(arrays['image'])
+    depth = params['depth']
+    grasp = Grasp2D(Point(image.center), 0.0, depth,
+                    width=params['gripper_width'],
+                    camera_intr=camera_intr)
+    vis.figure()
+    vis.imshow(image)
+    vis.grasp(grasp, scale=1.5, show_center=False, show_axis=True)
+    vis.title('Best Grasp: d=%.3f, q=%.3f' %(depth, params['q_value']))
+
+RENDER_FNS = {
+    TracePlotType.TF_IMAGES: _render_tf_images,
+    TracePlotType.GRASP_CANDIDATES: _render_grasp_candidates,
+    TracePlotType.GRASP_RANKING: _render_grasp_ranking,
+    TracePlotType.GRASP_PLAN: _render_grasp_plan
+}
+
+def render_trace(trace, output_dir=None, dpi=100):
+    """ Draws the figures of a planning trace.
+
+    Parameters
+    ----------
+    trace : :obj:`PlanningTrace`
+        trace to render
+    output_dir : str
+        directory to save the figures to, or None to show them interactively
+    dpi : int
+        resolution of the saved figures
+    """
+    if output_dir is not None and not os.path.exists(output_dir):
+        os.mkdir(output_dir)
+    num_states = len(set([entry['state_ind'] for entry in trace.entries]))
+    for entry in trace.entries:
+        RENDER_FNS[entry['type']](trace, entry['arrays'], entry['params'])
+        if output_dir is None:
+            vis.show()
+            continue
+        filename = entry['filename']
+        if num_states > 1:
+            filename = 'state_%d_%s' %(entry['state_ind'], filename)
+        vis.savefig(os.path.join(output_dir, filename), dpi=dpi)
+        plt.close('all')
+
+def _render_traces(trace_queue):
+    """ Renders traces from the queue until a None sentinel is received. """
+    plt.switch_backend('Agg')
+    while True:
+        item = trace_queue.get()
+        if item is None:
+            break
+        trace, output_dir = pkl.loads(item)
+        try:
+            render_trace(trace, output_dir=output_dir)
+        except Exception as e:
+            logging.error('Failed to render planning trace to %s: %s' %(output_dir, str(e)))
+
+class TraceRenderer(object):
+    """ Renders planning traces to image files in a background process fed by a bounded queue.
+
+    Attributes
+    ----------
+    queue_size : int
+        maximum number of traces waiting to be rendered
+    backpressure : str
+        'block' to wait for space when the queue is full, 'drop' to discard the trace
+    """
+    def __init__(self, queue_size=4, backpressure=BackpressurePolicy.DROP):
+        if backpressure not in [BackpressurePolicy.DROP, BackpressurePolicy.BLOCK]:
+            raise ValueError('Backpressure policy %s not supported!' %(backpressure))
+        self._backpressure = backpressure
+        self._num_dropped = 0
+        self._queue = mp.Queue(maxsize=queue_size)
+        self._process = mp.Process(target=_render_traces, args=(self._queue,))
+        self._process.daemon = True
+        self._process.start()
+
+    @property
+    def num_dropped(self):
+        """ Number of traces discarded because the queue was full. """
+        return self._num_dropped
+
+    def render(self, trace, output_dir):
+        """ Queues a trace to be rendered into output_dir. Returns whether the trace was queued. """
+        if self._process is None:
+            raise ValueError('Cannot render with a closed renderer')
+
+        # serialize now, since the queue pickles in a background thread after the caller may have reused its buffers
+        item = pkl.dumps((trace, output_dir), pkl.HIGHEST_PROTOCOL)
+        if self._backpressure == BackpressurePolicy.BLOCK:
+            self._queue.put(item)
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._num_dropped += 1
+            logging.warning('Trace render queue full, dropped trace for %s (%d dropped)' %(output_dir, self._num_dropped))
+            return False
+        return True
+
+    def close(self, timeout=None):
+        """ Renders the queued traces and stops the renderer process. """
+        if self._process is None:
+            return
+        self._queue.put(None)
+        self._process.join(timeout)
+        self._process = None
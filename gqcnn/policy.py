@@ -26,25 +26,34 @@ Author: Jeff Mahler
 from abc import ABCMeta, abstractmethod
 
 import cPickle as pkl
+import json
 import logging
-import matplotlib.pyplot as plt
 import numpy as np
 import os
 import sys
+import threading
 from time import time
 
-from sklearn.mixture import GaussianMixture
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import scipy.ndimage.filters as snf
 
 import autolab_core.utils as utils
 from autolab_core import Point
 from perception import CameraIntrinsics
 from perception import BinaryImage, ColorImage, DepthImage, RgbdImage
 
-from . import Grasp2D, ImageGraspSamplerFactory, GQCNN, InputDataMode
+from . import Grasp2D, GraspBatch, ImageGraspSamplerFactory, GQCNN, InputDataMode
+from . import SearchStrategyFactory, GraspCandidateFilter
 from . import Visualizer as vis
 from . import NoValidGraspsException
+from . import PolicyLogWriter, BackpressurePolicy
+from . import PlanningProfiler
+from . import PlanningTrace, TracePlotType, TraceRenderer, RenderMode, render_trace, camera_intr_to_array
 
-FIGSIZE = 16
 SEED = 5234709
 
 class RgbdImageState(object):
@@ -106,6 +115,44 @@ class RgbdImageState(object):
                               camera_intr,
                               segmask=segmask,
                               fully_observed=fully_observed)
+
+    def to_record(self):
+        """ Returns a dictionary of numpy arrays describing the state, for a policy log record. """
+        camera_intr = self.camera_intr
+        record = {
+            'color': self.rgbd_im.color.data,
+            'depth': self.rgbd_im.depth.data,
+            'camera_frame': np.array(camera_intr.frame),
+            'camera_intr': np.array([camera_intr.fx, camera_intr.fy,
+                                     camera_intr.cx, camera_intr.cy,
+                                     camera_intr.skew,
+                                     camera_intr.height, camera_intr.width])
+        }
+        if self.segmask is not None:
+            record['segmask'] = self.segmask.data
+        if self.fully_observed is not None:
+            record['fully_observed'] = np.frombuffer(pkl.dumps(self.fully_observed, pkl.HIGHEST_PROTOCOL),
+                                                     dtype=np.uint8)
+        return record
+
+    @staticmethod
+    def from_record(record):
+        """ Creates a state from a policy log record, see RgbdImageState.to_record. """
+        fx, fy, cx, cy, skew, height, width = record['camera_intr']
+        camera_intr = CameraIntrinsics(str(record['camera_frame']), fx, fy=fy, cx=cx, cy=cy,
+                                       skew=skew, height=int(height), width=int(width))
+        color = ColorImage(record['color'], frame=camera_intr.frame)
+        depth = DepthImage(record['depth'], frame=camera_intr.frame)
+        segmask = None
+        if 'segmask' in record.keys():
+            segmask = BinaryImage(record['segmask'], frame=camera_intr.frame)
+        fully_observed = None
+        if 'fully_observed' in record.keys():
+            fully_observed = pkl.loads(record['fully_observed'].tobytes())
+        return RgbdImageState(RgbdImage.from_color_and_depth(color, depth),
+                              camera_intr,
+                              segmask=segmask,
+                              fully_observed=fully_observed)
             
 class ParallelJawGrasp(object):
     """ Action to encapsulate parallel jaw grasps.
@@ -136,6 +183,31 @@ class ParallelJawGrasp(object):
         q_value = pkl.load(open(q_value_filename, 'rb'))
         image = DepthImage.open(image_filename)
         return ParallelJawGrasp(grasp, q_value, image)
+
+    def to_record(self):
+        """ Returns a dictionary of numpy arrays describing the action, for a policy log record. """
+        return {
+            'grasp': np.array([self.grasp.center.x, self.grasp.center.y,
+                               self.grasp.angle, self.grasp.depth, self.grasp.width]),
+            'q_value': np.array(self.q_value),
+            'tf_image': self.image.data
+        }
+
+    @staticmethod
+    def from_record(record, camera_intr):
+        """ Creates an action from a policy log record, see ParallelJawGrasp.to_record.
+
+        Parameters
+        ----------
+        record : :obj:`dict`
+            policy log record
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            intrinsics of the camera the grasp was planned with
+        """
+        center_x, center_y, angle, depth, width = record['grasp']
+        grasp = Grasp2D(Point(np.array([center_x, center_y]), frame=camera_intr.frame),
+                        angle, depth, width=width, camera_intr=camera_intr)
+        return ParallelJawGrasp(grasp, float(record['q_value']), DepthImage(record['tf_image']))
         
 class Policy(object):
     """ Abstract policy class. """
@@ -168,6 +240,46 @@ class GraspingPolicy(Policy):
         dictionary of parameters for grasp sampling, see gqcnn/image_grasp_sampler.py
     gqcnn_model : str
         string path to a trained GQ-CNN model see gqcnn/neural_networks.py
+    logging_dir : str, optional
+        directory to write a .npz record of the state and action of each planning request to
+    logging_queue_size : int, optional
+        maximum number of records waiting to be written by the background log writer
+    logging_backpressure : str, optional
+        'block' to wait when the log queue is full or 'drop' to discard the record
+    vis : dict
+        flags for the figures to capture in the planning trace of each request,
+        plus an optional render mode: 'inline' to draw the figures after planning,
+        'async' to draw them in a background process into the logging directory,
+        or 'none' to only capture the trace (and the log record) for rendering later.
+        Defaults to 'async' when logging_dir is set and 'inline' otherwise
+    profiler_window_size : int, optional
+        number of recent requests to keep the rolling per-stage timing statistics over
+    topk_min_dist : float, optional
+        minimum distance between the grasps returned by action_topk, see Grasp2D.image_dist
+    topk_angle_weight : float, optional
+        weight of the axis angle in the distance between the grasps returned by action_topk
+    pipeline_chunk_size : int, optional
+        number of candidates per chunk when overlapping the tensorization of one chunk
+        on a worker thread with the GQ-CNN prediction of the previous chunk, 0 to disable
+    cascade : dict, optional
+        parameters of a two-stage scoring cascade: gqcnn_model is the path to a small
+        GQ-CNN (e.g. one trained on downsampled crops) that scores every candidate,
+        keep_frac is the fraction of the candidates with the highest cheap scores that
+        are passed on to the full GQ-CNN (a list gives the fraction for each CEM
+        iteration, with the last entry used for the remaining iterations), and
+        min_keep is the minimum number of candidates to keep per image
+    refinement : dict, optional
+        parameters of the gradient ascent that polishes the best candidates before
+        selection: num_candidates to refine, num_steps of ascent, and the initial
+        depth_step in meters, center_step in pixels and angle_step in radians
+        (a step of 0 keeps that parameter fixed, only the depth is refined by default)
+    warmup_im_height : int, optional
+        height of the synthetic image planned on by warmup()
+    warmup_im_width : int, optional
+        width of the synthetic image planned on by warmup()
+    seed : int, optional
+        seed of the random stream that the policy and its grasp sampler draw from,
+        so that policies running concurrently in one process are each reproducible
     """
     def __init__(self, config):
         # store parameters
@@ -177,18 +289,86 @@ class GraspingPolicy(Policy):
         self._crop_width = config['crop_width']
         self._sampling_config = config['sampling']
         self._gqcnn_model_dir = config['gqcnn_model']
+        self._topk_min_dist = 10.0
+        if 'topk_min_dist' in config.keys():
+            self._topk_min_dist = config['topk_min_dist']
+        self._topk_angle_weight = 5.0
+        if 'topk_angle_weight' in config.keys():
+            self._topk_angle_weight = config['topk_angle_weight']
+        self._pipeline_chunk_size = 0
+        if 'pipeline_chunk_size' in config.keys():
+            self._pipeline_chunk_size = config['pipeline_chunk_size']
+        self._refine_num_candidates = 0
+        self._refine_num_steps = 3
+        self._refine_depth_step = 0.0025
+        self._refine_center_step = 0.0
+        self._refine_angle_step = 0.0
+        if 'refinement' in config.keys():
+            refinement_config = config['refinement']
+            self._refine_num_candidates = 5
+            if 'num_candidates' in refinement_config.keys():
+                self._refine_num_candidates = refinement_config['num_candidates']
+            if 'num_steps' in refinement_config.keys():
+                self._refine_num_steps = refinement_config['num_steps']
+            if 'depth_step' in refinement_config.keys():
+                self._refine_depth_step = refinement_config['depth_step']
+            if 'center_step' in refinement_config.keys():
+                self._refine_center_step = refinement_config['center_step']
+            if 'angle_step' in refinement_config.keys():
+                self._refine_angle_step = refinement_config['angle_step']
         self._logging_dir = None
+        self._log_writer = None
         if 'logging_dir' in config.keys():
             self._logging_dir = config['logging_dir']
             self._policy_dir = self._logging_dir
             if not os.path.exists(self._logging_dir):
                 os.mkdir(self._logging_dir)
+            logging_queue_size = 16
+            if 'logging_queue_size' in config.keys():
+                logging_queue_size = config['logging_queue_size']
+            logging_backpressure = BackpressurePolicy.BLOCK
+            if 'logging_backpressure' in config.keys():
+                logging_backpressure = config['logging_backpressure']
+
+            # start the writer before the GQ-CNN session is opened so that the process is forked
+            # before tensorflow starts its threads (the tensorflow module itself is already imported)
+            self._log_writer = PolicyLogWriter(queue_size=logging_queue_size,
+                                               backpressure=logging_backpressure)
+
+        # setup rendering of the planning traces
+        self._trace = PlanningTrace()
+        self._trace_renderer = None
+        self._render_mode = RenderMode.INLINE
+        if self._logging_dir is not None:
+            self._render_mode = RenderMode.ASYNC
+        if 'vis' in config.keys() and 'render' in config['vis'].keys():
+            self._render_mode = config['vis']['render']
+        if self._render_mode not in [RenderMode.INLINE, RenderMode.ASYNC, RenderMode.NONE]:
+            raise ValueError('Render mode %s not supported!' %(self._render_mode))
+        if self._render_mode == RenderMode.ASYNC:
+            if self._logging_dir is None:
+                raise ValueError('Asynchronous rendering requires a logging_dir')
+            self._trace_renderer = TraceRenderer()
         sampler_type = self._sampling_config['type']
+
+        # init profiler
+        profiler_window_size = 1000
+        if 'profiler_window_size' in config.keys():
+            profiler_window_size = config['profiler_window_size']
+        self._profiler = PlanningProfiler(window_size=profiler_window_size)
+
+        # init the random stream shared by the policy and its grasp sampler
+        seed = None
+        if 'seed' in config.keys():
+            seed = config['seed']
+        self._rng = np.random.RandomState(seed)
         
         # init grasp sampler
         self._grasp_sampler = ImageGraspSamplerFactory.sampler(sampler_type,
                                                                self._sampling_config,
-                                                               self._gripper_width)
+                                                               self._gripper_width,
+                                                               random_state=self._rng)
+        self._grasp_sampler.profiler = self._profiler
         
         # init GQ-CNN
         self._gqcnn = GQCNN.load(self._gqcnn_model_dir)
@@ -196,11 +376,40 @@ class GraspingPolicy(Policy):
         # open tensorflow session for gqcnn
         self._gqcnn.open_session()
 
+        # init the cheap GQ-CNN of the scoring cascade
+        self._cascade_gqcnn = None
+        self._cascade_keep_frac = 1.0
+        self._cascade_min_keep = 1
+        if 'cascade' in config.keys():
+            cascade_config = config['cascade']
+            self._cascade_keep_frac = cascade_config['keep_frac']
+            if 'min_keep' in cascade_config.keys():
+                self._cascade_min_keep = cascade_config['min_keep']
+            self._cascade_gqcnn = GQCNN.load(cascade_config['gqcnn_model'])
+            self._cascade_gqcnn.open_session()
+        self._ready = False
+
     def __del__(self):
         try:
             self._gqcnn.close_session()
         except:
             pass
+        try:
+            self._grasp_sampler.close()
+        except:
+            pass
+        try:
+            self._cascade_gqcnn.close_session()
+        except:
+            pass
+        try:
+            self._log_writer.close()
+        except:
+            pass
+        try:
+            self._trace_renderer.close()
+        except:
+            pass
         del self
 
     @property
@@ -218,53 +427,854 @@ class GraspingPolicy(Policy):
         """ Returns the GQ-CNN. """
         return self._gqcnn
 
-    def action(self, state):
+    @property
+    def cascade_gqcnn(self):
+        """ Returns the cheap GQ-CNN of the scoring cascade, or None if the cascade is disabled. """
+        return self._cascade_gqcnn
+
+    @property
+    def ready(self):
+        """ Returns whether warmup() has completed and run the GQ-CNN, so that planning runs at steady-state latency. """
+        return self._ready
+
+    @property
+    def profiler(self):
+        """ Returns the profiler with the per-stage timing of the planning requests. """
+        return self._profiler
+
+    @property
+    def random_state(self):
+        """ Returns the random stream that the policy and its grasp sampler draw from. """
+        return self._rng
+
+    @property
+    def last_trace(self):
+        """ Returns the planning trace of the last request, see PlanningTrace. """
+        return self._trace
+
+    def action(self, state, deadline=None):
         """ Returns an action for a given state.
         Public handle to function.
-        """
-        # save state
-        if self._logging_dir is not None:
-            policy_id = utils.gen_experiment_id()
-            self._policy_dir = os.path.join(self._logging_dir, 'policy_output_%s' %(policy_id))
-            while os.path.exists(self._policy_dir):
-                policy_id = utils.gen_experiment_id()
-            self._policy_dir = os.path.join(self._logging_dir, 'policy_output_%s' %(policy_id))
-            os.mkdir(self._policy_dir)
-            state_dir = os.path.join(self._policy_dir, 'state')
-            state.save(state_dir)
 
-        # plan action
-        action = self._action(state)
+        Parameters
+        ----------
+        state : :obj:`RgbdImageState`
+            image to plan grasps on
+        deadline : float
+            wall-clock time (as returned by time.time()) by which planning should return, None for no limit
+        """
+        # record state
+        self._trace = PlanningTrace()
+        log_entry = self._start_record(state)
 
-        # save action
-        if self._logging_dir is not None:
-            action_dir = os.path.join(self._policy_dir, 'action')
-            action.save(action_dir)
+        # plan action, logging the state even if planning fails
+        action = None
+        self._profiler.start_request()
+        try:
+            action = self._action(state, deadline=deadline)
+        finally:
+            profile = self._profiler.finish_request()
+            self._finish_record(log_entry, action, self._trace, profile)
+        self._render_trace([log_entry])
         return action
+
+    def action_batch(self, states, deadline=None):
+        """ Returns an action for each state in a batch.
+        Public handle to function.
+
+        Parameters
+        ----------
+        states : :obj:`list` of :obj:`RgbdImageState`
+            images to plan grasps on
+        deadline : float
+            wall-clock time (as returned by time.time()) by which planning should return, None for no limit
+
+        Returns
+        -------
+        :obj:`list` of :obj:`ParallelJawGrasp`
+            one grasp per state, or None for states without any valid grasps
+        """
+        # record states
+        self._trace = PlanningTrace()
+        log_entries = [self._start_record(state) for state in states]
+
+        # plan actions, logging the states even if planning fails
+        actions = [None for state in states]
+        self._profiler.start_request()
+        try:
+            actions = self._action_batch(states, deadline=deadline)
+        finally:
+            profile = self._profiler.finish_request()
+            for i, (log_entry, action) in enumerate(zip(log_entries, actions)):
+                self._finish_record(log_entry, action, self._trace.for_state(i), profile)
+        self._render_trace(log_entries)
+        return actions
+
+    def warmup(self, num_passes=2, im_height=None, im_width=None):
+        """ Runs planning passes on a synthetic scene so that first-use costs
+        (TensorFlow kernel selection and memory allocation, scipy and cv2
+        initialization) are paid before the first request. The passes are not
+        logged, rendered or added to the profiler statistics, and they leave the
+        random stream of the policy unchanged. The GQ-CNN is then run on a dummy
+        input in case no pass found a candidate to score, and the policy is marked
+        ready only if that prediction succeeds.
+
+        Parameters
+        ----------
+        num_passes : int
+            number of planning passes to run
+        im_height : int
+            height of the synthetic image, defaults to warmup_im_height (480)
+        im_width : int
+            width of the synthetic image, defaults to warmup_im_width (640)
+
+        Returns
+        -------
+        :obj:`list` of float
+            duration of each pass in seconds
+        """
+        if im_height is None:
+            im_height = 480
+            if 'warmup_im_height' in self.config.keys():
+                im_height = self.config['warmup_im_height']
+        if im_width is None:
+            im_width = 640
+            if 'warmup_im_width' in self.config.keys():
+                im_width = self.config['warmup_im_width']
+        state = self._warmup_state(im_height, im_width)
+
+        # plan with a throwaway trace and profiler, leaving the random stream as it was
+        trace = self._trace
+        profiler = self._profiler
+        rng_state = self._rng.get_state()
+        self._profiler = PlanningProfiler()
+        self._grasp_sampler.profiler = self._profiler
+        durations = []
+        scored = False
+        try:
+            for i in range(num_passes):
+                self._trace = PlanningTrace()
+                pass_start = time()
+                try:
+                    actions = self._action_batch([state])
+                    scored = scored or actions[0] is not None
+                except NoValidGraspsException:
+                    pass
+                durations.append(time() - pass_start)
+                logging.info('Warmup pass %d took %.3f sec' %(i, durations[-1]))
+        finally:
+            self._trace = trace
+            self._profiler = profiler
+            self._grasp_sampler.profiler = profiler
+            self._rng.set_state(rng_state)
+        if not scored:
+            logging.warning('No warmup pass found a valid grasp to score')
+
+        # run the networks directly in case the passes never reached them
+        try:
+            self._warmup_gqcnn(self.gqcnn)
+            if self._cascade_gqcnn is not None:
+                self._warmup_gqcnn(self._cascade_gqcnn)
+        except Exception as e:
+            logging.error('GQ-CNN prediction failed during warmup: %s' %(str(e)))
+            return durations
+        self._ready = True
+        return durations
+
+    def _warmup_gqcnn(self, gqcnn):
+        """ Predicts a single dummy input with a GQ-CNN, including gradients if refinement is enabled. """
+        image_arr = np.zeros([1, gqcnn.im_height, gqcnn.im_width, gqcnn.num_channels])
+        pose_arr = np.zeros([1, gqcnn.pose_dim])
+        gqcnn.predict(image_arr, pose_arr)
+        if gqcnn is self.gqcnn and self._refine_num_candidates > 0 and self._refine_num_steps > 0:
+            gqcnn.predict_with_gradients(image_arr, pose_arr)
+
+    def _warmup_state(self, im_height, im_width):
+        """ Returns a synthetic state with a box on a flat surface for warmup(). """
+        camera_intr = CameraIntrinsics('gqcnn_warmup', fx=525.0, fy=525.0,
+                                       cx=im_width / 2.0 - 0.5, cy=im_height / 2.0 - 0.5,
+                                       height=im_height, width=im_width)
+        table_depth = 0.7
+        object_depth = 0.62
+
+        # size the box to fit between the jaws
+        box_width = 40
+        if np.isfinite(self._gripper_width):
+            box_width = Grasp2D(Point(np.zeros(2)), 0.0, object_depth,
+                                width=self._gripper_width,
+                                camera_intr=camera_intr).width_px / 2
+        box_half_width = max(int(box_width / 2), 4)
+        box_half_height = max(min(2 * box_half_width, im_height // 4), 4)
+
+        depth = table_depth * np.ones([im_height, im_width])
+        depth[im_height//2-box_half_height:im_height//2+box_half_height,
+              im_width//2-box_half_width:im_width//2+box_half_width] = object_depth
+        depth += 1e-4 * np.random.RandomState(SEED).randn(im_height, im_width)
+        color = np.zeros([im_height, im_width, 3], dtype=np.uint8)
+        rgbd_im = RgbdImage.from_color_and_depth(ColorImage(color, frame=camera_intr.frame),
+                                                 DepthImage(depth, frame=camera_intr.frame))
+        return RgbdImageState(rgbd_im, camera_intr)
+
+    def action_topk(self, state, k, deadline=None):
+        """ Returns up to k diverse grasps for a given state, ranked by
+        predicted probability of success, from a single planning pass.
+        Lower ranked grasps serve as fallbacks when the robot cannot execute
+        the best grasp. Grasps closer than topk_min_dist to a higher ranked
+        grasp (see Grasp2D.image_dist) are suppressed.
+
+        Parameters
+        ----------
+        state : :obj:`RgbdImageState`
+            image to plan grasps on
+        k : int
+            maximum number of grasps to return
+        deadline : float
+            wall-clock time (as returned by time.time()) by which planning should return, None for no limit
+
+        Returns
+        -------
+        :obj:`list` of :obj:`ParallelJawGrasp`
+            ranked grasps, best first
+        """
+        # record state
+        self._trace = PlanningTrace()
+        log_entry = self._start_record(state)
+
+        # plan actions, logging the state and best action even if planning fails
+        actions = []
+        self._profiler.start_request()
+        try:
+            actions = self._action_topk(state, k, deadline=deadline)
+        finally:
+            profile = self._profiler.finish_request()
+            action = None
+            if len(actions) > 0:
+                action = actions[0]
+            self._finish_record(log_entry, action, self._trace, profile)
+        self._render_trace([log_entry])
+        return actions
+
+    def _start_record(self, state):
+        """ Starts the log record for a planning request if logging is enabled.
+        Returns the output path of the request (without extension) and the
+        dictionary of state fields, or None if logging is disabled.
+        """
+        if self._logging_dir is None:
+            return None
+        policy_id = utils.gen_experiment_id()
+        self._policy_dir = os.path.join(self._logging_dir, 'policy_output_%s' %(policy_id))
+        while os.path.exists(self._policy_dir) or os.path.exists(self._policy_dir + '.npz'):
+            policy_id = utils.gen_experiment_id()
+            self._policy_dir = os.path.join(self._logging_dir, 'policy_output_%s' %(policy_id))
+        return self._policy_dir, state.to_record()
+
+    def _finish_record(self, log_entry, action, trace, profile):
+        """ Adds the action, planning trace and stage timing to a log record and hands it to the background writer. """
+        if log_entry is None:
+            return
+        policy_dir, record = log_entry
+        if action is not None:
+            record.update(action.to_record())
+        if len(trace) > 0:
+            record.update(trace.to_record())
+        record['profile'] = np.array(json.dumps(profile))
+        self._log_writer.write(policy_dir + '.npz', record)
+
+    def _render_trace(self, log_entries):
+        """ Draws the figures of the last planning trace according to the render mode.
+        Figures are saved to the output directory of each request when logging,
+        and shown otherwise.
+        """
+        if len(self._trace) == 0 or self._render_mode == RenderMode.NONE:
+            return
+        if self._logging_dir is None:
+            render_trace(self._trace)
+            return
+        for i, (policy_dir, record) in enumerate(log_entries):
+            trace = self._trace.for_state(i)
+            if len(trace) == 0:
+                continue
+            if self._render_mode == RenderMode.ASYNC:
+                self._trace_renderer.render(trace, policy_dir)
+            else:
+                render_trace(trace, output_dir=policy_dir)
         
     @abstractmethod
-    def _action(self, state):
+    def _action(self, state, deadline=None):
         """ Returns an action for a given state.
         """
         pass
+
+    def _action_batch(self, states, deadline=None):
+        """ Returns an action for each state in a batch.
+        Policies that can share computation across states should override.
+        """
+        actions = []
+        trace = self._trace
+        try:
+            for i, state in enumerate(states):
+                self._trace = PlanningTrace()
+                try:
+                    actions.append(self._action(state, deadline=deadline))
+                finally:
+                    trace.extend(self._trace, state_ind=i)
+        finally:
+            self._trace = trace
+        return actions
+
+    def _action_topk(self, state, k, deadline=None):
+        """ Returns up to k diverse grasps ranked by predicted probability of success. """
+        if not isinstance(state, RgbdImageState):
+            raise ValueError('Must provide an RGB-D image state.')
+        pool = self._evaluate_batch([state], deadline=deadline)[0]
+        actions = self._pool_actions(pool, state, k)
+        if len(actions) == 0:
+            logging.warning('No valid grasps could be found')
+            raise NoValidGraspsException()
+        return actions
+
+    def _evaluate_batch(self, states, deadline=None):
+        """ Returns the (grasps, q-values, image tensor, pose tensor) of the
+        candidates evaluated on each state, or None for states without valid grasps.
+        Policies that rank a pool of candidates should override.
+        """
+        raise NotImplementedError('Policy %s does not support ranked planning' %(self.__class__.__name__))
+
+    def _select_actions(self, states, pools):
+        """ Forms the best action for each state from its evaluated candidates, or None if there are none. """
+        actions = []
+        for i, (state, pool) in enumerate(zip(states, pools)):
+            state_actions = self._pool_actions(pool, state, 1, state_ind=i)
+            if len(state_actions) == 0:
+                actions.append(None)
+                continue
+            actions.append(state_actions[0])
+        return actions
+
+    def _pool_actions(self, pool, state, k, state_ind=0):
+        """ Forms up to k ranked actions from the evaluated candidates of a state. """
+        if pool is None:
+            return []
+        pool = self._refine_pool(pool, state)
+        grasps, q_values, image_tensor, pose_tensor = pool
+        with self._profiler.stage('select'):
+            if k == 1:
+                indices = [self.select(grasps, q_values)]
+            else:
+                indices = self.select_topk(grasps, q_values, k)
+
+        actions = []
+        for rank, index in enumerate(indices):
+            image = DepthImage(image_tensor[index,...])
+            if rank == 0 and self.config['vis']['grasp_plan']:
+                self._vis_grasp_plan(image, pose_tensor[index,0], q_values[index],
+                                     state.camera_intr, 'grasp_plan.png', state_ind=state_ind)
+            actions.append(ParallelJawGrasp(grasps[index], q_values[index], image))
+        return actions
+
+    def _refine_pool(self, pool, state):
+        """ Polishes the best candidates of a pool with a few steps of gradient
+        ascent on the predicted q-value and adds the improved grasps to the pool.
+        Each step moves a candidate along the sign of the gradient and is halved
+        for the candidates whose q-value does not improve.
+
+        Parameters
+        ----------
+        pool : :obj:`tuple`
+            (grasps, q-values, image tensor, pose tensor) of the evaluated candidates
+        state : :obj:`RgbdImageState`
+            image the candidates were planned on
+
+        Returns
+        -------
+        :obj:`tuple`
+            the pool extended with the refined candidates
+        """
+        grasps, q_values, image_tensor, pose_tensor = pool
+        num_refine = min(self._refine_num_candidates, len(grasps))
+        if num_refine == 0 or self._refine_num_steps == 0:
+            return pool
+        with self._profiler.stage('refine'):
+            indices = np.argsort(-q_values, kind='mergesort')[:num_refine]
+            cur_grasps = grasps[indices]
+            cur_q_values = q_values[indices]
+            cur_image_tensor = image_tensor[indices]
+            cur_pose_tensor = pose_tensor[indices]
+            _, image_grad, pose_grad = self.gqcnn.predict_with_gradients(cur_image_tensor, cur_pose_tensor)
+            steps = np.tile([[self._refine_depth_step, self._refine_center_step, self._refine_angle_step]],
+                            [num_refine, 1])
+            for i in range(self._refine_num_steps):
+                # step along the gradient
+                depth_grad, center_grad, angle_grad = self._grasp_gradients(cur_grasps, state,
+                                                                            image_grad, pose_grad)
+                center_grad_norm = np.linalg.norm(center_grad, axis=1)
+                center_grad_norm[center_grad_norm == 0] = 1.0
+                cand_grasps = GraspBatch(cur_grasps.centers + (steps[:,1] / center_grad_norm)[:,np.newaxis] * center_grad,
+                                         cur_grasps.angles + steps[:,2] * np.sign(angle_grad),
+                                         cur_grasps.depths + steps[:,0] * np.sign(depth_grad),
+                                         widths=cur_grasps.widths,
+                                         camera_intr=cur_grasps.camera_intr)
+                cand_image_tensor, cand_pose_tensor = self.grasps_to_tensors(cand_grasps, state)
+                cand_output, cand_image_grad, cand_pose_grad = self.gqcnn.predict_with_gradients(cand_image_tensor,
+                                                                                                 cand_pose_tensor)
+                cand_q_values = cand_output[:,-1]
+
+                # accept the improving steps and shrink the others
+                improved = cand_q_values > cur_q_values
+                cur_grasps = GraspBatch(np.where(improved[:,np.newaxis], cand_grasps.centers, cur_grasps.centers),
+                                        np.where(improved, cand_grasps.angles, cur_grasps.angles),
+                                        np.where(improved, cand_grasps.depths, cur_grasps.depths),
+                                        widths=cur_grasps.widths,
+                                        camera_intr=cur_grasps.camera_intr)
+                cur_q_values = np.where(improved, cand_q_values, cur_q_values)
+                cur_image_tensor[improved] = cand_image_tensor[improved]
+                cur_pose_tensor[improved] = cand_pose_tensor[improved]
+                image_grad[improved] = cand_image_grad[improved]
+                pose_grad[improved] = cand_pose_grad[improved]
+                steps[~improved] /= 2
+
+        # add the candidates that improved to the pool
+        refined = cur_q_values > q_values[indices]
+        if not np.any(refined):
+            return pool
+        logging.debug('Refinement improved %d of %d candidates (best q %.3f -> %.3f)' %(np.sum(refined), num_refine,
+                                                                                         np.max(q_values), np.max(cur_q_values)))
+        return (GraspBatch.concatenate([grasps, cur_grasps[refined]], camera_intr=grasps.camera_intr),
+                np.r_[q_values, cur_q_values[refined]],
+                np.concatenate([image_tensor, cur_image_tensor[refined]], axis=0),
+                np.concatenate([pose_tensor, cur_pose_tensor[refined]], axis=0))
+
+    def _grasp_gradients(self, grasps, state, image_grad, pose_grad):
+        """ Chains the gradients of the q-values with respect to the network inputs
+        into gradients with respect to the grasp depths, centers and angles.
+        The derivatives of the image crops with respect to the center and angle
+        are taken by central differences of the crops, and are only computed
+        when the corresponding refinement step is enabled.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            N array of gradients with respect to the depths
+        :obj:`numpy.ndarray`
+            Nx2 array of gradients with respect to the centers
+        :obj:`numpy.ndarray`
+            N array of gradients with respect to the angles
+        """
+        num_grasps = len(grasps)
+        depth_grad = pose_grad[:,0].copy()
+        center_grad = np.zeros([num_grasps, 2])
+        angle_grad = np.zeros(num_grasps)
+        if self._refine_center_step > 0:
+            if self.gqcnn.input_data_mode == InputDataMode.TF_IMAGE_PERSPECTIVE:
+                center_grad += pose_grad[:,1:3]
+            center_eps = 0.5
+            for axis in range(2):
+                offset = np.zeros(2)
+                offset[axis] = center_eps
+                image_tensors = []
+                for sign in [1, -1]:
+                    perturbed_grasps = GraspBatch(grasps.centers + sign * offset, grasps.angles, grasps.depths,
+                                                  widths=grasps.widths, camera_intr=grasps.camera_intr)
+                    image_tensors.append(self.grasps_to_tensors(perturbed_grasps, state)[0])
+                image_deriv = (image_tensors[0] - image_tensors[1]) / (2 * center_eps)
+                center_grad[:,axis] += np.sum(image_grad * image_deriv, axis=(1,2,3))
+        if self._refine_angle_step > 0:
+            angle_eps = 0.01
+            image_tensors = []
+            for sign in [1, -1]:
+                perturbed_grasps = GraspBatch(grasps.centers, grasps.angles + sign * angle_eps, grasps.depths,
+                                              widths=grasps.widths, camera_intr=grasps.camera_intr)
+                image_tensors.append(self.grasps_to_tensors(perturbed_grasps, state)[0])
+            image_deriv = (image_tensors[0] - image_tensors[1]) / (2 * angle_eps)
+            angle_grad += np.sum(image_grad * image_deriv, axis=(1,2,3))
+        return depth_grad, center_grad, angle_grad
+
+    def select_topk(self, grasps, q_values, k):
+        """ Selects up to k grasps in decreasing order of predicted probability
+        of success, suppressing grasps within topk_min_dist of a selected grasp.
+
+        Parameters
+        ----------
+        grasps : :obj:`GraspBatch`
+            candidate grasps
+        q_values : :obj:`numpy.ndarray`
+            predicted probability of success for each grasp
+        k : int
+            maximum number of grasps to select
+
+        Returns
+        -------
+        :obj:`list` of int
+            indices of the selected grasps, best first
+        """
+        num_grasps = len(grasps)
+        q_values = np.asarray(q_values)
+        selected = []
+        num_considered = 0
+        num_candidates = min(num_grasps, max(4 * k, 1))
+        while len(selected) < k and num_considered < num_grasps:
+            # rank the best candidates without sorting the full set
+            if num_candidates < num_grasps:
+                candidates = np.argpartition(-q_values, num_candidates - 1)[:num_candidates]
+            else:
+                candidates = np.arange(num_grasps)
+            candidates = candidates[np.argsort(-q_values[candidates], kind='mergesort')]
+
+            # greedy non-maximum suppression
+            dists = GraspBatch.pairwise_image_dist(grasps[candidates],
+                                                   alpha=self._topk_angle_weight)
+            suppressed = np.zeros(num_candidates, dtype=bool)
+            selected = []
+            for i in range(num_candidates):
+                if suppressed[i]:
+                    continue
+                selected.append(candidates[i])
+                if len(selected) == k:
+                    break
+                suppressed |= dists[i] < self._topk_min_dist
+            num_considered = num_candidates
+            num_candidates = min(num_grasps, 2 * num_candidates)
+        return [int(index) for index in selected]
+
+    def _predict_split(self, image_tensors, pose_tensors, stage='predict', gqcnn=None):
+        """ Predicts the q-values for several sets of grasp tensors in shared GQ-CNN calls.
+
+        Parameters
+        ----------
+        image_tensors : :obj:`list` of :obj:`numpy.ndarray`
+            4D tensors of images to be predicted
+        pose_tensors : :obj:`list` of :obj:`numpy.ndarray`
+            2D tensors of poses to be predicted
+        stage : str
+            name of the profiler stage to record the prediction time under
+        gqcnn : :obj:`GQCNN`
+            network to predict with, defaults to the GQ-CNN of the policy
+
+        Returns
+        -------
+        :obj:`list` of :obj:`numpy.ndarray`
+            q-values for each set of tensors
+        """
+        if gqcnn is None:
+            gqcnn = self.gqcnn
+        if len(image_tensors) == 0:
+            return []
+        sizes = [image_tensor.shape[0] for image_tensor in image_tensors]
+        if sum(sizes) == 0:
+            return [np.zeros(0) for size in sizes]
+        with self._profiler.stage(stage):
+            output_arr = gqcnn.predict(np.concatenate(image_tensors, axis=0),
+                                       np.concatenate(pose_tensors, axis=0))
+        return np.split(output_arr[:,-1], np.cumsum(sizes)[:-1])
+
+    def _predict_grasps(self, grasp_sets, states, stage='predict', gqcnn=None):
+        """ Tensorizes and predicts the q-values of several sets of grasps in shared GQ-CNN calls.
+        When pipeline_chunk_size is set, the grasps are cut into chunks and
+        each chunk is tensorized on a worker thread while the previous chunk is
+        being predicted.
+
+        Parameters
+        ----------
+        grasp_sets : :obj:`list` of :obj:`GraspBatch`
+            grasps to predict for each state
+        states : :obj:`list` of :obj:`RgbdImageState`
+            state each set of grasps was planned on
+        stage : str
+            name of the profiler stage to record the prediction time under
+        gqcnn : :obj:`GQCNN`
+            network to tensorize for and predict with, defaults to the GQ-CNN of the policy
+
+        Returns
+        -------
+        :obj:`list` of :obj:`numpy.ndarray`
+            q-values for each set of grasps
+        :obj:`list` of :obj:`numpy.ndarray`
+            image tensor for each set of grasps
+        :obj:`list` of :obj:`numpy.ndarray`
+            pose tensor for each set of grasps
+        """
+        if gqcnn is None:
+            gqcnn = self.gqcnn
+        sizes = [len(grasps) for grasps in grasp_sets]
+        chunk_size = self._pipeline_chunk_size
+        if not chunk_size or sum(sizes) <= chunk_size:
+            image_tensors = []
+            pose_tensors = []
+            for grasps, state in zip(grasp_sets, states):
+                image_tensor, pose_tensor = self.grasps_to_tensors(grasps, state, gqcnn=gqcnn)
+                image_tensors.append(image_tensor)
+                pose_tensors.append(pose_tensor)
+            q_values = self._predict_split(image_tensors, pose_tensors, stage=stage, gqcnn=gqcnn)
+            return q_values, image_tensors, pose_tensors
+
+        # tensorize chunks ahead of prediction on a worker thread
+        chunks = []
+        for i, size in enumerate(sizes):
+            for start in range(0, size, chunk_size):
+                chunks.append((i, start, min(start + chunk_size, size)))
+        tensor_queue = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        def tensorize_chunks():
+            for i, start, end in chunks:
+                try:
+                    item = self.grasps_to_tensors(grasp_sets[i][start:end], states[i], gqcnn=gqcnn)
+                except Exception as e:
+                    item = e
+                while not stop.is_set():
+                    try:
+                        tensor_queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set() or isinstance(item, Exception):
+                    return
+        worker = threading.Thread(target=tensorize_chunks)
+        worker.daemon = True
+        worker.start()
+
+        # predict chunks as they become available
+        q_value_chunks = [[] for size in sizes]
+        image_tensor_chunks = [[] for size in sizes]
+        pose_tensor_chunks = [[] for size in sizes]
+        try:
+            for i, start, end in chunks:
+                item = tensor_queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                image_tensor, pose_tensor = item
+                with self._profiler.stage(stage):
+                    output_arr = gqcnn.predict(image_tensor, pose_tensor)
+                q_value_chunks[i].append(output_arr[:,-1])
+                image_tensor_chunks[i].append(image_tensor)
+                pose_tensor_chunks[i].append(pose_tensor)
+        finally:
+            stop.set()
+            worker.join()
+
+        # reassemble the sets
+        q_values = []
+        image_tensors = []
+        pose_tensors = []
+        for i, (grasps, state) in enumerate(zip(grasp_sets, states)):
+            if sizes[i] == 0:
+                image_tensor, pose_tensor = self.grasps_to_tensors(grasps, state, gqcnn=gqcnn)
+                q_values.append(np.zeros(0))
+                image_tensors.append(image_tensor)
+                pose_tensors.append(pose_tensor)
+                continue
+            q_values.append(np.concatenate(q_value_chunks[i]))
+            image_tensors.append(np.concatenate(image_tensor_chunks[i], axis=0))
+            pose_tensors.append(np.concatenate(pose_tensor_chunks[i], axis=0))
+        return q_values, image_tensors, pose_tensors
+
+    def _iter_in_background(self, iterable, queue_size=2):
+        """ Iterates over an iterable (e.g. a generator of sampled grasps) on a worker
+        thread, buffering up to queue_size items ahead of the consumer. Exceptions are
+        re-raised in the consumer, and closing the returned generator stops the worker.
+        """
+        item_queue = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        done = object()
+        def put(item):
+            while not stop.is_set():
+                try:
+                    item_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        def produce():
+            try:
+                try:
+                    for item in iterable:
+                        if not put(item):
+                            return
+                    item = done
+                except Exception as e:
+                    item = e
+                put(item)
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        worker = threading.Thread(target=produce)
+        worker.daemon = True
+        worker.start()
+
+        try:
+            while True:
+                item = item_queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            worker.join()
+
+    def _cascade_keep_frac_for(self, iteration):
+        """ Returns the fraction of candidates passed on to the full GQ-CNN on an iteration. """
+        keep_frac = self._cascade_keep_frac
+        if isinstance(keep_frac, (list, tuple)):
+            keep_frac = keep_frac[min(iteration, len(keep_frac) - 1)]
+        return keep_frac
+
+    def _predict_grasps_cascade(self, grasp_sets, states, stage='predict', iteration=0):
+        """ Predicts the q-values of several sets of grasps with the scoring cascade.
+        Every candidate is scored by the cheap GQ-CNN and only the top fraction
+        is tensorized and predicted by the full GQ-CNN. Without a cascade this
+        is the same as _predict_grasps.
+
+        Parameters
+        ----------
+        grasp_sets : :obj:`list` of :obj:`GraspBatch`
+            grasps to predict for each state
+        states : :obj:`list` of :obj:`RgbdImageState`
+            state each set of grasps was planned on
+        stage : str
+            name of the profiler stage to record the full prediction time under,
+            the cheap prediction is recorded under the same name with a _cascade suffix
+        iteration : int
+            index of the optimization iteration, to look up the keep fraction
+
+        Returns
+        -------
+        :obj:`list` of :obj:`GraspBatch`
+            grasps passed on to the full GQ-CNN for each state
+        :obj:`list` of :obj:`numpy.ndarray`
+            full q-values for each set of kept grasps
+        :obj:`list` of :obj:`numpy.ndarray`
+            image tensor for each set of kept grasps
+        :obj:`list` of :obj:`numpy.ndarray`
+            pose tensor for each set of kept grasps
+        """
+        keep_frac = self._cascade_keep_frac_for(iteration)
+        if self._cascade_gqcnn is not None and keep_frac < 1.0:
+            # score every candidate with the cheap network
+            cheap_q_values, _, _ = self._predict_grasps(grasp_sets, states,
+                                                        stage='%s_cascade' %(stage),
+                                                        gqcnn=self._cascade_gqcnn)
+
+            # keep the best candidates, in their original order
+            kept_sets = []
+            for grasps, state_q_values in zip(grasp_sets, cheap_q_values):
+                num_grasps = len(grasps)
+                num_keep = min(max(int(np.ceil(keep_frac * num_grasps)), self._cascade_min_keep), num_grasps)
+                if num_keep < num_grasps:
+                    indices = np.sort(np.argpartition(-state_q_values, num_keep - 1)[:num_keep])
+                    grasps = grasps[indices]
+                kept_sets.append(grasps)
+            logging.debug('Cascade kept %d of %d candidates' %(sum([len(g) for g in kept_sets]),
+                                                               sum([len(g) for g in grasp_sets])))
+            grasp_sets = kept_sets
+        q_values, image_tensors, pose_tensors = self._predict_grasps(grasp_sets, states, stage=stage)
+        return grasp_sets, q_values, image_tensors, pose_tensors
+
+    def _trace_depth_im(self, depth_im, state_ind):
+        """ Stores the depth image of a state in the trace and returns its key. """
+        image_key = 'depth_%d' %(state_ind)
+        self._trace.add_image(image_key, depth_im.data)
+        return image_key
+
+    def _trace_grasps(self, grasps, camera_intr):
+        """ Returns the trace arrays for a batch of grasps. """
+        return {
+            'grasp_centers': grasps.centers,
+            'grasp_angles': grasps.angles,
+            'grasp_depths': grasps.depths,
+            'grasp_widths': grasps.widths,
+            'camera_intr': camera_intr_to_array(camera_intr)
+        }
+
+    def _thumbnail_camera_intr(self, camera_intr):
+        """ Returns the camera intrinsics of the transformed images (to compute gripper width). """
+        scale_factor = float(self.gqcnn.im_width) / float(self._crop_width)
+        return camera_intr.resize(scale_factor)
+
+    def _vis_tf_images(self, image_tensor, pose_tensor, filename, state_ind=0,
+                       grasps=None, depth_im=None, camera_intr=None):
+        """ Captures the first k transformed images, and optionally the matching grasps on the full image. """
+        # read vis params
+        k = self.config['vis']['k']
+        d = utils.sqrt_ceil(k)
+        params = {'grid_size': d}
+        arrays = {
+            'images': image_tensor[:k,...].copy(),
+            'depths': pose_tensor[:k,0].copy()
+        }
+        if grasps is not None:
+            params['image_key'] = self._trace_depth_im(depth_im, state_ind)
+            params['camera_frame'] = camera_intr.frame
+            arrays.update(self._trace_grasps(grasps[np.arange(min(d, len(grasps)))], camera_intr))
+        self._trace.add(TracePlotType.TF_IMAGES, filename, state_ind=state_ind,
+                        params=params, **arrays)
+
+    def _vis_grasp_candidates(self, depth_im, grasps, q_values, camera_intr, title, filename, state_ind=0):
+        """ Captures the grasps on the original image, to be colored by predicted success. """
+        params = {
+            'title': title,
+            'image_key': self._trace_depth_im(depth_im, state_ind),
+            'camera_frame': camera_intr.frame
+        }
+        arrays = self._trace_grasps(grasps, camera_intr)
+        arrays['q_values'] = np.array(q_values)
+        self._trace.add(TracePlotType.GRASP_CANDIDATES, filename, state_ind=state_ind,
+                        params=params, **arrays)
+
+    def _vis_grasp_ranking(self, image_tensor, pose_tensor, q_values, camera_intr, filename, state_ind=0):
+        """ Captures the transformed images of the k grasps with the highest q-values. """
+        # read vis params
+        k = self.config['vis']['k']
+        d = utils.sqrt_ceil(k)
+
+        # sort grasps
+        indices = np.argsort(-q_values, kind='mergesort')[:k]
+        params = {
+            'grid_size': d,
+            'gripper_width': float(self._gripper_width),
+            'camera_frame': camera_intr.frame
+        }
+        self._trace.add(TracePlotType.GRASP_RANKING, filename, state_ind=state_ind,
+                        params=params,
+                        images=image_tensor[indices,...],
+                        depths=pose_tensor[indices,0],
+                        q_values=q_values[indices],
+                        thumbnail_camera_intr=camera_intr_to_array(self._thumbnail_camera_intr(camera_intr)))
+
+    def _vis_grasp_plan(self, image, depth, q_value, camera_intr, filename, state_ind=0):
+        """ Captures the planned grasp on its transformed image. """
+        params = {
+            'depth': float(depth),
+            'q_value': float(q_value),
+            'gripper_width': float(self._gripper_width),
+            'camera_frame': camera_intr.frame
+        }
+        self._trace.add(TracePlotType.GRASP_PLAN, filename, state_ind=state_ind,
+                        params=params,
+                        image=image.data,
+                        thumbnail_camera_intr=camera_intr_to_array(self._thumbnail_camera_intr(camera_intr)))
     
     def show(self, filename=None, dpi=100):
         """ Show a figure. """
         if self._logging_dir is None:
             vis.show()
         else:
+            if not os.path.exists(self._policy_dir):
+                os.mkdir(self._policy_dir)
             filename = os.path.join(self._policy_dir, filename)
             vis.savefig(filename, dpi=dpi)
 
-    def grasps_to_tensors(self, grasps, state):
-        """ Converts a list of grasps to an image and pose tensor.
+    def grasps_to_tensors(self, grasps, state, gqcnn=None):
+        """ Converts a batch of grasps to an image and pose tensor.
 
         Attributes
         ----------
-        grasps : :obj:`list` of :obj:`Grasp2D`
-            list of image grassps to convert
+        grasps : :obj:`GraspBatch` or :obj:`list` of :obj:`Grasp2D`
+            batch of image grasps to convert
         state : :obj:`RgbdImageState`
             RGB-D image to plan grasps on
+        gqcnn : :obj:`GQCNN`
+            network whose input format to convert to, defaults to the GQ-CNN of the policy
 
         Returns
         -------
@@ -274,11 +1284,15 @@ class GraspingPolicy(Policy):
             2D Tensor of depth values
         """
         # parse params
-        gqcnn_im_height = self.gqcnn.im_height
-        gqcnn_im_width = self.gqcnn.im_width
-        gqcnn_num_channels = self.gqcnn.num_channels
-        gqcnn_pose_dim = self.gqcnn.pose_dim
-        input_data_mode = self.gqcnn.input_data_mode
+        if gqcnn is None:
+            gqcnn = self.gqcnn
+        gqcnn_im_height = gqcnn.im_height
+        gqcnn_im_width = gqcnn.im_width
+        gqcnn_num_channels = gqcnn.num_channels
+        gqcnn_pose_dim = gqcnn.pose_dim
+        input_data_mode = gqcnn.input_data_mode
+        if not isinstance(grasps, GraspBatch):
+            grasps = GraspBatch.from_grasps(grasps, camera_intr=state.camera_intr)
         num_grasps = len(grasps)
         depth_im = state.rgbd_im.depth
 
@@ -288,20 +1302,28 @@ class GraspingPolicy(Policy):
         pose_tensor = np.zeros([num_grasps, gqcnn_pose_dim])
         scale = float(gqcnn_im_height) / self._crop_height
         depth_im_scaled = depth_im.resize(scale)
-        for i, grasp in enumerate(grasps):
-            translation = scale * np.array([depth_im.center[0] - grasp.center.data[1],
-                                            depth_im.center[1] - grasp.center.data[0]])
-            im_tf = depth_im_scaled.transform(translation, grasp.angle)
+        translations = scale * np.c_[depth_im.center[0] - grasps.centers[:,1],
+                                     depth_im.center[1] - grasps.centers[:,0]]
+        # consecutive grasps that differ only in depth share a crop
+        same_crop = np.zeros(num_grasps, dtype=bool)
+        if num_grasps > 1:
+            same_crop[1:] = np.all(grasps.centers[1:] == grasps.centers[:-1], axis=1) & \
+                            (grasps.angles[1:] == grasps.angles[:-1])
+        for i in range(num_grasps):
+            if same_crop[i]:
+                image_tensor[i,...] = image_tensor[i-1,...]
+                continue
+            im_tf = depth_im_scaled.transform(translations[i], grasps.angles[i])
             im_tf = im_tf.crop(gqcnn_im_height, gqcnn_im_width)
             image_tensor[i,...] = im_tf.raw_data
-            
-            if input_data_mode == InputDataMode.TF_IMAGE:
-                pose_tensor[i] = grasp.depth
-            elif input_data_mode == InputDataMode.TF_IMAGE_PERSPECTIVE:
-                pose_tensor[i,...] = np.array([grasp.depth, grasp.center.x, grasp.center.y])
-            else:
-                raise ValueError('Input data mode %s not supported' %(input_data_mode))
-        logging.debug('Tensor conversion took %.3f sec' %(time()-tensor_start))
+
+        if input_data_mode == InputDataMode.TF_IMAGE:
+            pose_tensor[...] = grasps.depths[:,np.newaxis]
+        elif input_data_mode == InputDataMode.TF_IMAGE_PERSPECTIVE:
+            pose_tensor[...] = np.c_[grasps.depths, grasps.centers]
+        else:
+            raise ValueError('Input data mode %s not supported' %(input_data_mode))
+        self._profiler.add('tensorize', time() - tensor_start)
         return image_tensor, pose_tensor
 
 class AntipodalGraspingPolicy(GraspingPolicy):
@@ -321,6 +1343,13 @@ class AntipodalGraspingPolicy(GraspingPolicy):
         width of the gripper in meters
     gripper_name : str, optional
         name of the gripper
+    sampling_chunk_size : int, optional
+        number of candidates per chunk when predicting the q-values of the sampled
+        candidates while the next chunk is being sampled, 0 to sample all of the
+        candidates before prediction
+    early_stop_q_value : float, optional
+        stop sampling once a streamed candidate reaches this q-value, None to always
+        sample num_grasp_samples candidates
     """
     def __init__(self, config):
         GraspingPolicy.__init__(self, config)
@@ -333,18 +1362,20 @@ class AntipodalGraspingPolicy(GraspingPolicy):
         self._gripper_width = np.inf
         if 'gripper_width' in self.config.keys():
             self._gripper_width = self.config['gripper_width']
+        self._sampling_chunk_size = 0
+        if 'sampling_chunk_size' in self.config.keys():
+            self._sampling_chunk_size = self.config['sampling_chunk_size']
+        self._early_stop_q_value = None
+        if 'early_stop_q_value' in self.config.keys():
+            self._early_stop_q_value = self.config['early_stop_q_value']
             
     def select(self, grasps, q_value):
         """ Selects the grasp with the highest probability of success.
         Can override for alternate policies (e.g. epsilon greedy).
         """
-        # sort
-        num_grasps = len(grasps)
-        grasps_and_predictions = zip(np.arange(num_grasps), q_value)
-        grasps_and_predictions.sort(key = lambda x : x[1], reverse=True)
-        return grasps_and_predictions[0][0]
+        return int(np.argmax(q_value))
 
-    def _action(self, state):
+    def _action(self, state, deadline=None):
         """ Plans the grasp with the highest probability of success on
         the given RGB-D image.
 
@@ -352,113 +1383,165 @@ class AntipodalGraspingPolicy(GraspingPolicy):
         ----------
         state : :obj:`RgbdImageState`
             image to plan grasps on
+        deadline : float
+            unused, the candidates are always sampled and ranked in a single pass
 
         Returns
         -------
         :obj:`ParallelJawGrasp`
             grasp to execute
         """
-        # check valid input
-        if not isinstance(state, RgbdImageState):
-            raise ValueError('Must provide an RGB-D image state.')
+        action = self._action_batch([state], deadline=deadline)[0]
+        if action is None:
+            logging.warning('No valid grasps could be found')
+            raise NoValidGraspsException()
+        return action
 
-        # parse state
-        rgbd_im = state.rgbd_im
-        camera_intr = state.camera_intr
-        segmask = state.segmask
+    def _action_batch(self, states, deadline=None):
+        """ Plans the grasp with the highest probability of success on
+        each RGB-D image in a batch, ranking the candidates from all images
+        with shared GQ-CNN predictions.
 
-        # sample grasps
-        grasps = self._grasp_sampler.sample(rgbd_im, camera_intr,
-                                            self._num_grasp_samples,
-                                            segmask=segmask,
-                                            visualize=self.config['vis']['grasp_sampling'],
-                                            seed=None)
-        num_grasps = len(grasps)
+        Attributes
+        ----------
+        states : :obj:`list` of :obj:`RgbdImageState`
+            images to plan grasps on
+        deadline : float
+            unused, the candidates are always sampled and ranked in a single pass
 
-        # form tensors
-        image_tensor, pose_tensor = self.grasps_to_tensors(grasps, state)
+        Returns
+        -------
+        :obj:`list` of :obj:`ParallelJawGrasp`
+            grasp to execute for each state, or None if no valid grasps were found
+        """
+        return self._select_actions(states, self._evaluate_batch(states, deadline=deadline))
+
+    def _evaluate_batch(self, states, deadline=None):
+        """ Samples grasp candidates on each RGB-D image in a batch and
+        predicts their q-values with shared GQ-CNN predictions.
+
+        Attributes
+        ----------
+        states : :obj:`list` of :obj:`RgbdImageState`
+            images to plan grasps on
+        deadline : float
+            unused, the candidates are always sampled and ranked in a single pass
+
+        Returns
+        -------
+        :obj:`list` of :obj:`tuple`
+            (grasps, q-values, image tensor, pose tensor) of the evaluated candidates
+            for each state, or None if no valid grasps were found
+        """
+        # check valid input
+        for state in states:
+            if not isinstance(state, RgbdImageState):
+                raise ValueError('Must provide an RGB-D image state.')
+
+        if self._sampling_chunk_size > 0:
+            # predict the candidates of each state while the rest are being sampled
+            grasps = []
+            q_values = []
+            image_tensors = []
+            pose_tensors = []
+            for state in states:
+                state_grasps, state_q_values, image_tensor, pose_tensor = self._evaluate_streamed(state)
+                grasps.append(state_grasps)
+                q_values.append(state_q_values)
+                image_tensors.append(image_tensor)
+                pose_tensors.append(pose_tensor)
+        else:
+            # sample grasps for each state
+            grasps = []
+            for i, state in enumerate(states):
+                state_grasps = self._grasp_sampler.sample(state.rgbd_im, state.camera_intr,
+                                                          self._num_grasp_samples,
+                                                          segmask=state.segmask,
+                                                          visualize=self.config['vis']['grasp_sampling'],
+                                                          seed=None)
+                grasps.append(state_grasps)
+
+            # form tensors and predict grasps for all states at once
+            grasps, q_values, image_tensors, pose_tensors = self._predict_grasps_cascade(grasps, states)
         if self.config['vis']['tf_images']:
-            # read vis params
-            k = self.config['vis']['k']
-            d = utils.sqrt_ceil(k)
-
-            # display grasp transformed images
-            vis.figure(size=(FIGSIZE,FIGSIZE))
-            for i, image_tf in enumerate(image_tensor[:k,...]):
-                depth = pose_tensor[i][0]
-                vis.subplot(d,d,i+1)
-                vis.imshow(DepthImage(image_tf))
-                vis.title('Image %d: d=%.3f' %(i, depth))
-            self.show('tf_images.png')
-
-        # predict grasps
-        predict_start = time()
-        output_arr = self.gqcnn.predict(image_tensor, pose_tensor)
-        q_values = output_arr[:,-1]
-        logging.debug('Prediction took %.3f sec' %(time()-predict_start))
-
-        if self.config['vis']['grasp_candidates']:
-            # display each grasp on the original image, colored by predicted success
-            vis.figure(size=(FIGSIZE,FIGSIZE))
-            vis.imshow(rgbd_im.depth)
-            for grasp, q in zip(grasps, q_values):
-                vis.grasp(grasp, scale=1.5, show_center=False, show_axis=True,
-                          color=plt.cm.RdYlBu(q))
-            vis.title('Sampled grasps')
-            self.show('grasp_candidates.png')
-
-        if self.config['vis']['grasp_ranking']:
-            # read vis params
-            k = self.config['vis']['k']
-            d = utils.sqrt_ceil(k)
-
-            # form camera intr for the thumbnail (to compute gripper width)
-            scale_factor = float(self.gqcnn.im_width) / float(self._crop_width)
-            scaled_camera_intr = camera_intr.resize(scale_factor)
-
-            # sort grasps
-            q_values_and_indices = zip(q_values, np.arange(num_grasps))
-            q_values_and_indices.sort(key = lambda x : x[0], reverse=True)
-
-            vis.figure(size=(FIGSIZE,FIGSIZE))
-            for i, p in enumerate(q_values_and_indices[:k]):
-                # read stats for grasp
-                q_value = p[0]
-                ind = p[1]
-                depth = pose_tensor[ind][0]
-                image = DepthImage(image_tensor[ind,...])
-                grasp = Grasp2D(Point(image.center), 0.0, depth,
-                                width=self._gripper_width,
-                                camera_intr=scaled_camera_intr)
-
-                # plot
-                vis.subplot(d,d,i+1)
-                vis.imshow(image)
-                vis.grasp(grasp, scale=1.5)
-                vis.title('K=%d: d=%.3f, q=%.3f' %(i, depth, q_value))
-            self.show('grasp_ranking.png')
-
-        # select grasp
-        index = self.select(grasps, q_values)
-        grasp = grasps[index]
-        q_value = q_values[index]
-        image = DepthImage(image_tensor[index,...])
-        pose = pose_tensor[index,...]
-        depth = pose[0]
-        if self.config['vis']['grasp_plan']:
-            scale_factor = float(self.gqcnn.im_width) / float(self._crop_width)
-            scaled_camera_intr = camera_intr.resize(scale_factor)
-            grasp = Grasp2D(Point(image.center), 0.0, pose[0],
-                            width=self._gripper_width,
-                            camera_intr=scaled_camera_intr)
-            vis.figure()
-            vis.imshow(image)
-            vis.grasp(grasp, scale=1.5, show_center=False, show_axis=True)
-            vis.title('Best Grasp: d=%.3f, q=%.3f' %(depth, q_value))
-            self.show('grasp_plan.png')
+            for i in range(len(states)):
+                self._vis_tf_images(image_tensors[i], pose_tensors[i], 'tf_images.png', state_ind=i)
 
-        # return action
-        return ParallelJawGrasp(grasp, q_value, image)
+        # collect the evaluated candidates of each state
+        pools = []
+        for i, state in enumerate(states):
+            if len(grasps[i]) == 0:
+                pools.append(None)
+                continue
+
+            if self.config['vis']['grasp_candidates']:
+                self._vis_grasp_candidates(state.rgbd_im.depth, grasps[i], q_values[i],
+                                           state.camera_intr, 'Sampled grasps',
+                                           'grasp_candidates.png', state_ind=i)
+            if self.config['vis']['grasp_ranking']:
+                self._vis_grasp_ranking(image_tensors[i], pose_tensors[i], q_values[i],
+                                        state.camera_intr, 'grasp_ranking.png', state_ind=i)
+            pools.append((grasps[i], q_values[i], image_tensors[i], pose_tensors[i]))
+        return pools
+
+    def _evaluate_streamed(self, state):
+        """ Samples grasp candidates on an RGB-D image in chunks of sampling_chunk_size
+        and predicts the q-values of each chunk while the next chunk is being sampled
+        on a worker thread, stopping early once a candidate reaches early_stop_q_value.
+
+        Attributes
+        ----------
+        state : :obj:`RgbdImageState`
+            image to plan grasps on
+
+        Returns
+        -------
+        :obj:`GraspBatch`
+            evaluated candidates
+        :obj:`numpy.ndarray`
+            q-values of the candidates
+        :obj:`numpy.ndarray`
+            image tensor of the candidates
+        :obj:`numpy.ndarray`
+            pose tensor of the candidates
+        """
+        visualize = self.config['vis']['grasp_sampling']
+        chunks = self._grasp_sampler.sample_iter(state.rgbd_im, state.camera_intr,
+                                                 self._num_grasp_samples,
+                                                 chunk_size=self._sampling_chunk_size,
+                                                 segmask=state.segmask,
+                                                 visualize=visualize,
+                                                 seed=None)
+        if not visualize:
+            # figures must be drawn on the main thread
+            chunks = self._iter_in_background(chunks)
+
+        grasp_chunks = []
+        q_value_chunks = []
+        image_tensor_chunks = []
+        pose_tensor_chunks = []
+        try:
+            for chunk in chunks:
+                [chunk], [q_values], [image_tensor], [pose_tensor] = self._predict_grasps_cascade([chunk], [state])
+                grasp_chunks.append(chunk)
+                q_value_chunks.append(q_values)
+                image_tensor_chunks.append(image_tensor)
+                pose_tensor_chunks.append(pose_tensor)
+                if self._early_stop_q_value is not None and len(q_values) > 0 and \
+                   np.max(q_values) >= self._early_stop_q_value:
+                    logging.debug('Stopping sampling early with q-value %.3f' %(np.max(q_values)))
+                    break
+        finally:
+            chunks.close()
+
+        if len(grasp_chunks) == 0:
+            grasps = GraspBatch.concatenate([], camera_intr=state.camera_intr)
+            image_tensor, pose_tensor = self.grasps_to_tensors(grasps, state)
+            return grasps, np.zeros(0), image_tensor, pose_tensor
+        return (GraspBatch.concatenate(grasp_chunks, camera_intr=state.camera_intr),
+                np.concatenate(q_value_chunks),
+                np.concatenate(image_tensor_chunks, axis=0),
+                np.concatenate(pose_tensor_chunks, axis=0))
 
 class CrossEntropyAntipodalGraspingPolicy(GraspingPolicy):
     """ Optimizes a set of antipodal grasp candidates in image space using the 
@@ -468,7 +1551,11 @@ class CrossEntropyAntipodalGraspingPolicy(GraspingPolicy):
     (3) fit a GMM to the top P%
     (4) re-sample grasps from the distribution
     (5) repeat steps 2-4 for K iters
-    (6) return the best candidate from the final sample set
+    (6) return the best candidate evaluated over all iterations
+
+    Iterations stop early when the mean q-value of the elite set improves by
+    less than convergence_tol or when the next iteration would overrun the
+    deadline passed to action().
 
     Notes
     -----
@@ -488,8 +1575,36 @@ class CrossEntropyAntipodalGraspingPolicy(GraspingPolicy):
         percentage of the elite set size used to determine number of GMM components
     gmm_reg_covar : float
         regularization parameters for GMM covariance matrix, enforces diversity of fitted distributions
+    gmm_max_iter : int, optional
+        ceiling on the number of EM iterations per GMM refit
+    gmm_warm_start : bool, optional
+        whether to initialize each GMM refit from the components of the previous CEM iteration
+    gmm_backend : str, optional
+        'numpy' for the vectorized EM or 'sklearn' for sklearn.mixture.GaussianMixture
+    convergence_tol : float, optional
+        minimum improvement in the mean elite q-value between iterations to keep iterating
+    search_strategy : str, optional
+        optimizer that proposes the candidates of each iteration: 'cem' (default) to refit
+        the GMMs to the elites of each iteration, 'cem_elite_carryover' to also keep the
+        already-evaluated elites of previous iterations in the refit, or 'cmaes' for CMA-ES,
+        see gqcnn/search_strategies.py
+    search_params : dict, optional
+        additional parameters of the search strategy (e.g. sigma_scale for cmaes)
+    candidate_filter : dict, optional
+        parameters of the pre-filter that rejects infeasible and duplicate candidates
+        before GQ-CNN evaluation and resamples the GMMs to replace them, see GraspCandidateFilter
+    incremental_replanning : bool, optional
+        whether to seed the CEM with the candidates of the previous request on the same
+        camera whose crops do not overlap pixels where the depth changed, sampling new
+        candidates only in the changed region
+    replan_depth_thresh : float, optional
+        minimum change in depth, in meters, for a pixel to count as changed
+    replan_max_changed_frac : float, optional
+        maximum fraction of the image affected by changes to replan incrementally
+    replan_max_age : int, optional
+        maximum number of requests a candidate is reused for before it is evaluated again
     deterministic : bool, optional
-        whether to set the random seed to enforce deterministic behavior
+        whether to reseed the random stream of the policy on every request to enforce deterministic behavior
     gripper_width : float, optional
         width of the gripper in meters
     gripper_name : str, optional
@@ -508,6 +1623,53 @@ class CrossEntropyAntipodalGraspingPolicy(GraspingPolicy):
         self._gmm_refit_p = self.config['gmm_refit_p']
         self._gmm_component_frac = self.config['gmm_component_frac']
         self._gmm_reg_covar = self.config['gmm_reg_covar']
+        self._gmm_max_iter = 10
+        if 'gmm_max_iter' in self.config.keys():
+            self._gmm_max_iter = self.config['gmm_max_iter']
+        self._gmm_warm_start = True
+        if 'gmm_warm_start' in self.config.keys():
+            self._gmm_warm_start = self.config['gmm_warm_start']
+        self._gmm_backend = 'numpy'
+        if 'gmm_backend' in self.config.keys():
+            self._gmm_backend = self.config['gmm_backend']
+        self._convergence_tol = None
+        if 'convergence_tol' in self.config.keys():
+            self._convergence_tol = self.config['convergence_tol']
+
+        # search strategy parameters
+        self._search_strategy = 'cem'
+        if 'search_strategy' in self.config.keys():
+            self._search_strategy = self.config['search_strategy']
+        self._search_config = {
+            'refit_p': self._gmm_refit_p,
+            'component_frac': self._gmm_component_frac,
+            'reg_covar': self._gmm_reg_covar,
+            'max_iter': self._gmm_max_iter,
+            'warm_start': self._gmm_warm_start,
+            'backend': self._gmm_backend
+        }
+        if 'search_params' in self.config.keys():
+            self._search_config.update(self.config['search_params'])
+
+        # candidate pre-filter parameters
+        self._candidate_filter_config = None
+        if 'candidate_filter' in self.config.keys():
+            self._candidate_filter_config = self.config['candidate_filter']
+
+        # incremental replanning parameters
+        self._incremental_replanning = False
+        if 'incremental_replanning' in self.config.keys():
+            self._incremental_replanning = self.config['incremental_replanning']
+        self._replan_depth_thresh = 0.005
+        if 'replan_depth_thresh' in self.config.keys():
+            self._replan_depth_thresh = self.config['replan_depth_thresh']
+        self._replan_max_changed_frac = 0.5
+        if 'replan_max_changed_frac' in self.config.keys():
+            self._replan_max_changed_frac = self.config['replan_max_changed_frac']
+        self._replan_max_age = 5
+        if 'replan_max_age' in self.config.keys():
+            self._replan_max_age = self.config['replan_max_age']
+        self._replan_cache = {}
 
         # gripper parameters
         self._seed = None
@@ -521,241 +1683,429 @@ class CrossEntropyAntipodalGraspingPolicy(GraspingPolicy):
         """ Selects the grasp with the highest probability of success.
         Can override for alternate policies (e.g. epsilon greedy).
         """
-        # sort
-        num_grasps = len(grasps)
-        if num_grasps == 0:
+        if len(grasps) == 0:
             raise ValueError('Zero grasps')
-        grasps_and_predictions = zip(np.arange(num_grasps), q_value)
-        grasps_and_predictions.sort(key = lambda x : x[1], reverse=True)
-        return grasps_and_predictions[0][0]
+        return int(np.argmax(q_value))
+
+    def _new_search_strategy(self):
+        """ Returns a search strategy configured with the optimization parameters of the policy. """
+        return SearchStrategyFactory.strategy(self._search_strategy, self._search_config,
+                                              random_state=self._rng)
+
+    def warmup(self, num_passes=2, im_height=None, im_width=None):
+        """ Runs planning passes on a synthetic scene, see GraspingPolicy.warmup.
+        Every pass plans from scratch and leaves the replanning cache untouched.
+        """
+        incremental_replanning = self._incremental_replanning
+        self._incremental_replanning = False
+        try:
+            return GraspingPolicy.warmup(self, num_passes=num_passes,
+                                         im_height=im_height, im_width=im_width)
+        finally:
+            self._incremental_replanning = incremental_replanning
+
+    def _new_candidate_filter(self):
+        """ Returns a candidate pre-filter for one state of a request, or None if filtering is disabled. """
+        if self._candidate_filter_config is None:
+            return None
+        return GraspCandidateFilter(self._candidate_filter_config)
+
+    def _sample_search_grasps(self, strategy, state, candidate_filter):
+        """ Samples num_gmm_samples grasps from a search strategy, resampling to
+        replace the candidates rejected by the pre-filter.
+
+        Parameters
+        ----------
+        strategy : :obj:`SearchStrategy`
+            search strategy that has been told the q-values of the previous candidates
+        state : :obj:`RgbdImageState`
+            image the grasps are planned on
+        candidate_filter : :obj:`GraspCandidateFilter`
+            pre-filter for the state, or None to keep every sample
 
-    def _action(self, state):
+        Returns
+        -------
+        :obj:`GraspBatch`
+            sampled grasps
+        """
+        num_samples = self._num_gmm_samples
+        with self._profiler.stage('search_sample'):
+            grasp_vecs = strategy.ask(num_samples)
+        grasps = GraspBatch.from_feature_vecs(grasp_vecs,
+                                              width=self._gripper_width,
+                                              camera_intr=state.camera_intr)
+        if candidate_filter is None:
+            return grasps
+
+        # filter and refill the quota, oversampling by the observed acceptance rate
+        kept_grasps = []
+        num_kept = 0
+        for r in range(candidate_filter.max_refill_rounds + 1):
+            with self._profiler.stage('candidate_filter'):
+                kept = candidate_filter.apply(grasps, state.rgbd_im.depth,
+                                              max_grasps=num_samples - num_kept)
+            kept_grasps.append(kept)
+            num_kept += len(kept)
+            if num_kept >= num_samples or r == candidate_filter.max_refill_rounds:
+                break
+            accept_rate = max(float(len(kept)) / max(len(grasps), 1), 0.1)
+            num_draws = int(np.ceil((num_samples - num_kept) / accept_rate))
+            with self._profiler.stage('search_sample'):
+                grasp_vecs = strategy.ask(num_draws)
+            grasps = GraspBatch.from_feature_vecs(grasp_vecs,
+                                                  width=self._gripper_width,
+                                                  camera_intr=state.camera_intr)
+        if num_kept < num_samples:
+            logging.debug('Candidate filter kept %d of %d search samples' %(num_kept, num_samples))
+        return GraspBatch.concatenate(kept_grasps, camera_intr=state.camera_intr)
+
+    def clear_replan_cache(self):
+        """ Forgets the candidates of previous requests so that the next request plans from scratch. """
+        self._replan_cache = {}
+
+    def _cached_seeds(self, state):
+        """ Finds the candidates evaluated in previous requests on the same
+        camera that are unaffected by changes in the depth image. Each candidate
+        is compared against the depth image it was evaluated on, so that changes
+        below the threshold cannot accumulate over requests.
+
+        Parameters
+        ----------
+        state : :obj:`RgbdImageState`
+            image to plan grasps on
+
+        Returns
+        -------
+        :obj:`tuple`
+            (grasps, q-values, image tensor, pose tensor, ages) of the reusable candidates,
+            or None if the request must be planned from scratch
+        int
+            number of new candidates to sample
+        :obj:`perception.BinaryImage`
+            segmask to sample the new candidates in
+        """
+        if not self._incremental_replanning:
+            return None, self._num_seed_samples, state.segmask
+        camera_intr = state.camera_intr
+        depth = state.rgbd_im.depth.data
+        segmask = None
+        if state.segmask is not None:
+            segmask = state.segmask.data > 0
+        cache = self._replan_cache.get(camera_intr.frame, None)
+        if cache is None or cache['depths'][0].shape != depth.shape or \
+           not np.allclose(cache['camera_intr'], camera_intr_to_array(camera_intr)) or \
+           (segmask is None) != (cache['segmask'] is None) or \
+           (segmask is not None and not np.array_equal(segmask, cache['segmask'])):
+            return None, self._num_seed_samples, state.segmask
+
+        # drop the candidates that have been reused too often
+        grasps, q_values, image_tensor, pose_tensor = cache['pool']
+        ages = cache['ages']
+        young_indices = np.where(ages < self._replan_max_age)[0]
+        if young_indices.shape[0] == 0:
+            return None, self._num_seed_samples, state.segmask
+
+        with self._profiler.stage('change_detection'):
+            # find the changes since each depth image a candidate was evaluated on,
+            # counting appearing or disappearing holes as changes and growing the changes
+            # by the half-diagonal of a crop to find the grasp centers whose crops overlap them
+            radius = int(np.ceil(np.sqrt(self._crop_height**2 + self._crop_width**2) / 2))
+            changed_regions = {}
+            for age in set([0] + ages[young_indices].tolist()):
+                prev_depth = cache['depths'][age]
+                with np.errstate(invalid='ignore'):
+                    changed = np.abs(depth - prev_depth) > self._replan_depth_thresh
+                changed |= np.isnan(depth) != np.isnan(prev_depth)
+                changed_regions[age] = snf.maximum_filter(changed.astype(np.uint8), size=2*radius+1) > 0
+            changed_region = np.any(list(changed_regions.values()), axis=0)
+            changed_frac = np.mean(changed_region)
+        if changed_frac > self._replan_max_changed_frac:
+            logging.debug('Replanning from scratch, %.3f of the image changed' %(changed_frac))
+            return None, self._num_seed_samples, state.segmask
+
+        # keep the cached candidates whose crops are unchanged since they were evaluated
+        rows = np.clip(np.round(grasps.centers[:,1]).astype(np.int32), 0, depth.shape[0]-1)
+        cols = np.clip(np.round(grasps.centers[:,0]).astype(np.int32), 0, depth.shape[1]-1)
+        valid = np.zeros(len(grasps), dtype=bool)
+        for age, age_changed_region in changed_regions.items():
+            age_indices = young_indices[ages[young_indices] == age]
+            valid[age_indices] = ~age_changed_region[rows[age_indices], cols[age_indices]]
+        valid_indices = np.where(valid)[0]
+        if valid_indices.shape[0] == 0:
+            return None, self._num_seed_samples, state.segmask
+
+        # resample the stale part of the seed set in the changed region
+        num_new = 0
+        if np.any(changed_region) or valid_indices.shape[0] < len(grasps):
+            stale_frac = 1.0 - float(valid_indices.shape[0]) / len(grasps)
+            num_new = int(np.ceil(self._num_seed_samples * max(stale_frac, changed_frac)))
+        num_cached = max(self._num_seed_samples - num_new, 0)
+        valid_indices = valid_indices[np.argsort(-q_values[valid_indices], kind='mergesort')[:num_cached]]
+        sampling_mask = changed_region
+        if young_indices.shape[0] < len(grasps) or not np.any(changed_region):
+            # candidates were retired across the image, so sample their replacements anywhere
+            sampling_mask = np.ones(depth.shape, dtype=bool)
+        if segmask is not None:
+            sampling_mask = sampling_mask & segmask
+        sampling_segmask = BinaryImage(255 * sampling_mask.astype(np.uint8), frame=camera_intr.frame)
+        logging.debug('Reusing %d cached candidates, sampling %d new' %(valid_indices.shape[0], num_new))
+        seeds = (grasps[valid_indices], q_values[valid_indices],
+                 image_tensor[valid_indices,...], pose_tensor[valid_indices,...],
+                 ages[valid_indices])
+        return seeds, num_new, sampling_segmask
+
+    def _update_replan_cache(self, state, pool, ages):
+        """ Stores the depth image and evaluated candidates of a request for incremental replanning.
+        The ages count the requests since each candidate was evaluated, so that the depth
+        image it was evaluated on is kept with it.
+        """
+        if not self._incremental_replanning:
+            return
+        camera_intr = state.camera_intr
+        if pool is None:
+            self._replan_cache.pop(camera_intr.frame, None)
+            return
+        segmask = None
+        if state.segmask is not None:
+            segmask = state.segmask.data > 0
+        depths = [state.rgbd_im.depth.data.copy()]
+        cache = self._replan_cache.get(camera_intr.frame, None)
+        if cache is not None and np.any(ages > 0):
+            depths.extend(cache['depths'][:np.max(ages)])
+        self._replan_cache[camera_intr.frame] = {
+            'depths': depths,
+            'camera_intr': camera_intr_to_array(camera_intr),
+            'segmask': segmask,
+            'pool': pool,
+            'ages': ages
+        }
+
+    def _action(self, state, deadline=None):
         """ Plans the grasp with the highest probability of success on
-        the given RGB-D image.
+        the given RGB-D image. The optimization is anytime: it stops before
+        an iteration that is not expected to finish by the deadline and
+        returns the best grasp evaluated so far.
 
         Attributes
         ----------
         state : :obj:`RgbdImageState`
             image to plan grasps on
+        deadline : float
+            wall-clock time (as returned by time.time()) by which to return a grasp, None for no limit
 
         Returns
         -------
         :obj:`ParallelJawGrasp`
             grasp to execute
         """
-        # check valid input
-        if not isinstance(state, RgbdImageState):
-            raise ValueError('Must provide an RGB-D image state.')
-
-        # parse state
-        rgbd_im = state.rgbd_im
-        camera_intr = state.camera_intr
-        segmask = state.segmask
-
-        # sample grasps
-        seed_set_start = time()
-        grasps = self._grasp_sampler.sample(rgbd_im, camera_intr,
-                                            self._num_seed_samples,
-                                            segmask=segmask,
-                                            visualize=self.config['vis']['grasp_sampling'],
-                                            seed=self._seed)
-        num_grasps = len(grasps)
-        if num_grasps == 0:
+        action = self._action_batch([state], deadline=deadline)[0]
+        if action is None:
             logging.warning('No valid grasps could be found')
             raise NoValidGraspsException()
+        return action
 
-        logging.debug('Computing the seed set took %.3f sec' %(time() - seed_set_start))
+    def _action_batch(self, states, deadline=None):
+        """ Plans the grasp with the highest probability of success on
+        each RGB-D image in a batch. The cross entropy method runs for all
+        images in lockstep so that the candidates of every image are scored
+        in a shared GQ-CNN prediction on each iteration.
 
-        # form tensors
-        image_tensor, pose_tensor = self.grasps_to_tensors(grasps, state)
-        if self.config['vis']['tf_images']:
-            # read vis params
-            k = self.config['vis']['k']
-            d = utils.sqrt_ceil(k)
-
-            # display grasp transformed images
-            vis.figure(size=(FIGSIZE,FIGSIZE))
-            for i, image_tf in enumerate(image_tensor[:k,...]):
-                depth = pose_tensor[i][0]
-                vis.subplot(d,d,i+1)
-                vis.imshow(DepthImage(image_tf))
-                vis.title('Image %d: d=%.3f' %(i, depth))
-
-            # display grasp transformed images
-            vis.figure(size=(FIGSIZE,FIGSIZE))
-            for i in range(d):
-                image_tf = image_tensor[i,...]
-                depth = pose_tensor[i][0]
-                grasp = grasps[i]
-
-                vis.subplot(d,2,2*i+1)
-                vis.imshow(rgbd_im.depth)
-                vis.grasp(grasp, scale=1.5, show_center=False, show_axis=True)
-                vis.title('Grasp %d: d=%.3f' %(i, depth))
-
-                vis.subplot(d,2,2*i+2)
-                vis.imshow(DepthImage(image_tf))
-                vis.title('TF image %d: d=%.3f' %(i, depth))
-            self.show('tf_images.png')
-
-        # iteratively refit and sample
-        for j in range(self._num_iters):
-            logging.debug('CEM iter %d' %(j))
-
-            # predict grasps
-            predict_start = time()
-            output_arr = self.gqcnn.predict(image_tensor, pose_tensor)
-            q_values = output_arr[:,-1]
-            logging.debug('Prediction took %.3f sec' %(time()-predict_start))
-
-            # sort grasps
-            q_values_and_indices = zip(q_values, np.arange(num_grasps))
-            q_values_and_indices.sort(key = lambda x : x[0], reverse=True)
+        Attributes
+        ----------
+        states : :obj:`list` of :obj:`RgbdImageState`
+            images to plan grasps on
+        deadline : float
+            wall-clock time (as returned by time.time()) by which to return the grasps, None for no limit
 
-            if self.config['vis']['grasp_candidates']:
-                # display each grasp on the original image, colored by predicted success
-                vis.figure(size=(FIGSIZE,FIGSIZE))
-                vis.imshow(rgbd_im.depth)
-                for grasp, q in zip(grasps, q_values):
-                    vis.grasp(grasp, scale=1.5, show_center=False, show_axis=True,
-                              color=plt.cm.RdYlBu(q))
-                vis.title('Sampled grasps iter %d' %(j))
-                self.show('grasp_candidates_iter_%d.png' %(j))
+        Returns
+        -------
+        :obj:`list` of :obj:`ParallelJawGrasp`
+            grasp to execute for each state, or None if no valid grasps were found
+        """
+        return self._select_actions(states, self._evaluate_batch(states, deadline=deadline))
 
-            if self.config['vis']['grasp_ranking']:
-                # read vis params
-                k = self.config['vis']['k']
-                d = utils.sqrt_ceil(k)
-
-                # form camera intr for the thumbnail (to compute gripper width)
-                scale_factor = float(self.gqcnn.im_width) / float(self._crop_width)
-                scaled_camera_intr = camera_intr.resize(scale_factor)
-
-                vis.figure(size=(FIGSIZE,FIGSIZE))
-                for i, p in enumerate(q_values_and_indices[:k]):
-                    # read stats for grasp
-                    q_value = p[0]
-                    ind = p[1]
-                    depth = pose_tensor[ind][0]
-                    image = DepthImage(image_tensor[ind,...])
-                    grasp = Grasp2D(Point(image.center), 0.0, depth,
-                                    width=self._gripper_width,
-                                    camera_intr=scaled_camera_intr)
-
-                    # plot
-                    vis.subplot(d,d,i+1)
-                    vis.imshow(image)
-                    vis.grasp(grasp, scale=1.5)
-                    vis.title('K=%d: d=%.3f, q=%.3f' %(i, depth, q_value))
-                self.show('grasp_ranking_iter_%d.png' %(j))
-
-            # fit elite set
-            num_refit = max(int(np.ceil(self._gmm_refit_p * num_grasps)), 1)
-            elite_q_values = [i[0] for i in q_values_and_indices[:num_refit]]
-            elite_grasp_indices = [i[1] for i in q_values_and_indices[:num_refit]]
-            elite_grasps = [grasps[i] for i in elite_grasp_indices]
-            elite_grasp_arr = np.array([g.feature_vec for g in elite_grasps])
-
-
-            if self.config['vis']['elite_grasps']:
-                # display each grasp on the original image, colored by predicted success
-                vis.figure(size=(FIGSIZE,FIGSIZE))
-                vis.imshow(rgbd_im.depth)
-                for grasp, q in zip(elite_grasps, elite_q_values):
-                    vis.grasp(grasp, scale=1.5, show_center=False, show_axis=True,
-                              color=plt.cm.RdYlBu(q))
-                vis.title('Elite grasps iter %d' %(j))
-                self.show('elite_grasps_iter_%d.png' %(j))
-
-            # normalize elite set
-            elite_grasp_mean = np.mean(elite_grasp_arr, axis=0)
-            elite_grasp_std = np.std(elite_grasp_arr, axis=0)
-            elite_grasp_std[elite_grasp_std == 0] = 1.0
-            elite_grasp_arr = (elite_grasp_arr - elite_grasp_mean) / elite_grasp_std
-
-            # fit a GMM to the top samples
-            num_components = max(int(np.ceil(self._gmm_component_frac * num_refit)), 1)
-            uniform_weights = (1.0 / num_components) * np.ones(num_components)
-            gmm = GaussianMixture(n_components=num_components,
-                                  weights_init=uniform_weights,
-                                  reg_covar=self._gmm_reg_covar)
-            train_start = time()
-
-            gmm.fit(elite_grasp_arr)
-            train_duration = time() - train_start
-            logging.debug('GMM fitting with %d components took %.3f sec' %(num_components, train_duration))
-
-            # sample the next grasps
-            sample_start = time()
-            grasp_vecs, _ = gmm.sample(n_samples=self._num_gmm_samples)
-            grasp_vecs = elite_grasp_std * grasp_vecs + elite_grasp_mean
-            sample_duration = time() - sample_start
-            logging.debug('GMM sampling took %.3f sec' %(sample_duration))
-
-            # convert features to grasps
-            grasps = []
-            for grasp_vec in grasp_vecs:
-                grasps.append(Grasp2D.from_feature_vec(grasp_vec,
-                                                       width=self._gripper_width,
-                                                       camera_intr=camera_intr))
-            num_grasps = len(grasps)
-            if num_grasps == 0:
-                logging.warning('No valid grasps could be found')
-                raise NoValidGraspsException()
-
-            # form tensors
-            image_tensor, pose_tensor = self.grasps_to_tensors(grasps, state)
-            if self.config['vis']['tf_images']:
-                # read vis params
-                k = self.config['vis']['k']
-                d = utils.sqrt_ceil(k)
-
-                # display grasp transformed images
-                vis.figure(size=(FIGSIZE,FIGSIZE))
-                for i, image_tf in enumerate(image_tensor[:k,...]):
-                    depth = pose_tensor[i][0]
-                    vis.subplot(d,d,i+1)
-                    vis.imshow(DepthImage(image_tf))
-                    vis.title('Image %d: d=%.3f' %(i, depth))
-                self.show('tf_images_iter_%d.png' %(j))
-          
-        # predict final set of grasps
-        predict_start = time()
-        output_arr = self.gqcnn.predict(image_tensor, pose_tensor)
-        q_values = output_arr[:,-1]
-        logging.debug('Final prediction took %.3f sec' %(time()-predict_start))
-
-        if self.config['vis']['grasp_candidates']:
-            # display each grasp on the original image, colored by predicted success
-            vis.figure(size=(FIGSIZE,FIGSIZE))
-            vis.imshow(rgbd_im.depth)
-            for grasp, q in zip(grasps, q_values):
-                vis.grasp(grasp, scale=1.5, show_center=False, show_axis=True,
-                          color=plt.cm.RdYlBu(q))
-            vis.title('Final sampled grasps')
-            self.show('grasp_candidates_final.png')
-
-        # select grasp
-        index = self.select(grasps, q_values)
-        grasp = grasps[index]
-        q_value = q_values[index]
-        image = DepthImage(image_tensor[index,...])
-        pose = pose_tensor[index,...]
-        depth = pose[0]
-        if self.config['vis']['grasp_plan']:
-            scale_factor = float(self.gqcnn.im_width) / float(self._crop_width)
-            scaled_camera_intr = camera_intr.resize(scale_factor)
-            grasp_vis = Grasp2D(Point(image.center), 0.0, pose[0],
-                                width=self._gripper_width,
-                                camera_intr=scaled_camera_intr)
-            vis.figure()
-            vis.imshow(image)
-            vis.grasp(grasp_vis, scale=1.5, show_center=False, show_axis=True)
-            vis.title('Best Grasp: d=%.3f, q=%.3f' %(depth, q_value))
-            self.show('grasp_plan.png')
+    def _evaluate_batch(self, states, deadline=None):
+        """ Runs the cross entropy method on each RGB-D image in a batch
+        and returns every candidate evaluated over all iterations.
 
-        # return action
-        return ParallelJawGrasp(grasp, q_value, image)
+        Attributes
+        ----------
+        states : :obj:`list` of :obj:`RgbdImageState`
+            images to plan grasps on
+        deadline : float
+            wall-clock time (as returned by time.time()) by which to return the grasps, None for no limit
+
+        Returns
+        -------
+        :obj:`list` of :obj:`tuple`
+            (grasps, q-values, image tensor, pose tensor) of the evaluated candidates
+            for each state, or None if no valid grasps were found
+        """
+        # check valid input
+        for state in states:
+            if not isinstance(state, RgbdImageState):
+                raise ValueError('Must provide an RGB-D image state.')
+        num_states = len(states)
+
+        # sample seed sets for each state, reusing unchanged candidates of the previous request
+        grasps = []
+        image_tensors = [None for state in states]
+        pose_tensors = [None for state in states]
+        cached_seeds = []
+        candidate_filters = [self._new_candidate_filter() for state in states]
+        for i, state in enumerate(states):
+            seeds, num_samples, segmask = self._cached_seeds(state)
+            cached_seeds.append(seeds)
+            state_grasps = GraspBatch.concatenate([], camera_intr=state.camera_intr)
+            if num_samples > 0:
+                state_grasps = self._grasp_sampler.sample(state.rgbd_im, state.camera_intr,
+                                                          num_samples,
+                                                          segmask=segmask,
+                                                          visualize=self.config['vis']['grasp_sampling'],
+                                                          seed=self._seed)
+            if candidate_filters[i] is not None:
+                with self._profiler.stage('candidate_filter'):
+                    state_grasps = candidate_filters[i].apply(state_grasps, state.rgbd_im.depth)
+                    if seeds is not None:
+                        candidate_filters[i].register(seeds[0])
+            grasps.append(state_grasps)
+
+        # iteratively predict, refit and sample, keeping every evaluated candidate
+        strategies = [self._new_search_strategy() for state in states]
+        evaluated_grasps = [[] for state in states]
+        evaluated_q_values = [[] for state in states]
+        evaluated_image_tensors = [[] for state in states]
+        evaluated_pose_tensors = [[] for state in states]
+        evaluated_ages = [[] for state in states]
+        prev_elite_q_values = [None for state in states]
+        active = [i for i in range(num_states) if len(grasps[i]) > 0 or cached_seeds[i] is not None]
+        iter_start = time()
+        for j in range(self._num_iters + 1):
+            final_iter = (j == self._num_iters)
+            if final_iter:
+                logging.debug('CEM final prediction')
+            else:
+                logging.debug('CEM iter %d' %(j))
+
+            # form tensors and predict grasps for all active states at once
+            stage = 'predict_iter_%d' %(j)
+            if final_iter:
+                stage = 'predict_final'
+            active_grasps, q_values, active_image_tensors, active_pose_tensors = self._predict_grasps_cascade([grasps[i] for i in active],
+                                                                                                             [states[i] for i in active],
+                                                                                                             stage=stage,
+                                                                                                             iteration=j)
+            for k, i in enumerate(active):
+                grasps[i] = active_grasps[k]
+                image_tensors[i] = active_image_tensors[k]
+                pose_tensors[i] = active_pose_tensors[k]
+                if self.config['vis']['tf_images'] and len(grasps[i]) > 0:
+                    if j == 0:
+                        self._vis_tf_images(image_tensors[i], pose_tensors[i], 'tf_images.png', state_ind=i,
+                                            grasps=grasps[i], depth_im=states[i].rgbd_im.depth,
+                                            camera_intr=states[i].camera_intr)
+                    else:
+                        self._vis_tf_images(image_tensors[i], pose_tensors[i],
+                                            'tf_images_iter_%d.png' %(j-1), state_ind=i)
+
+                # add the reused candidates to the seed set, aging them by one request
+                ages = np.zeros(len(grasps[i]), dtype=np.int32)
+                if cached_seeds[i] is not None:
+                    cached_grasps, cached_q_values, cached_image_tensor, cached_pose_tensor, cached_ages = cached_seeds[i]
+                    ages = np.r_[ages, cached_ages + 1]
+                    grasps[i] = GraspBatch.concatenate([grasps[i], cached_grasps],
+                                                       camera_intr=states[i].camera_intr)
+                    q_values[k] = np.r_[q_values[k], cached_q_values]
+                    image_tensors[i] = np.concatenate([image_tensors[i], cached_image_tensor], axis=0)
+                    pose_tensors[i] = np.concatenate([pose_tensors[i], cached_pose_tensor], axis=0)
+                    cached_seeds[i] = None
+                state_q_values = q_values[k]
+
+                evaluated_grasps[i].append(grasps[i])
+                evaluated_q_values[i].append(state_q_values)
+                evaluated_image_tensors[i].append(image_tensors[i])
+                evaluated_pose_tensors[i].append(pose_tensors[i])
+                evaluated_ages[i].append(ages)
+
+                if self.config['vis']['grasp_candidates']:
+                    if final_iter:
+                        title = 'Final sampled grasps'
+                        filename = 'grasp_candidates_final.png'
+                    else:
+                        title = 'Sampled grasps iter %d' %(j)
+                        filename = 'grasp_candidates_iter_%d.png' %(j)
+                    self._vis_grasp_candidates(states[i].rgbd_im.depth, grasps[i], state_q_values,
+                                               states[i].camera_intr, title, filename, state_ind=i)
+            if final_iter:
+                break
+
+            # stop if the next iteration is not expected to finish before the deadline
+            cur_time = time()
+            iter_duration = cur_time - iter_start
+            iter_start = cur_time
+            if deadline is not None and cur_time + iter_duration > deadline:
+                logging.debug('CEM stopped after %d iters to meet the deadline' %(j))
+                break
+
+            # refit and resample each active state
+            next_active = []
+            for i, state_q_values in zip(active, q_values):
+                state = states[i]
+                if len(grasps[i]) == 0:
+                    continue
+
+                # update the search distribution from the evaluated candidates
+                with self._profiler.stage('search_update'):
+                    strategies[i].tell(grasps[i].feature_vecs, state_q_values)
+
+                # stop once the elite set stops improving
+                elite_q_values = strategies[i].elite_q_values
+                elite_q_value = np.mean(elite_q_values)
+                prev_elite_q_value = prev_elite_q_values[i]
+                if self._convergence_tol is not None and prev_elite_q_value is not None and \
+                   elite_q_value - prev_elite_q_value < self._convergence_tol:
+                    logging.debug('CEM converged after %d iters (elite q %.3f -> %.3f)' %(j, prev_elite_q_value, elite_q_value))
+                    continue
+                prev_elite_q_values[i] = elite_q_value
+
+                if self.config['vis']['grasp_ranking']:
+                    self._vis_grasp_ranking(image_tensors[i], pose_tensors[i], state_q_values,
+                                            state.camera_intr, 'grasp_ranking_iter_%d.png' %(j),
+                                            state_ind=i)
+                if self.config['vis']['elite_grasps']:
+                    elite_grasps = GraspBatch.from_feature_vecs(strategies[i].elite_vecs,
+                                                                width=self._gripper_width,
+                                                                camera_intr=state.camera_intr)
+                    self._vis_grasp_candidates(state.rgbd_im.depth, elite_grasps, elite_q_values,
+                                               state.camera_intr, 'Elite grasps iter %d' %(j),
+                                               'elite_grasps_iter_%d.png' %(j), state_ind=i)
+
+                # sample the next grasps
+                grasps[i] = self._sample_search_grasps(strategies[i], state, candidate_filters[i])
+                if len(grasps[i]) == 0:
+                    logging.debug('CEM stopped after %d iters with no valid samples' %(j))
+                    continue
+                next_active.append(i)
+            active = next_active
+            if len(active) == 0:
+                break
+
+        # collect the candidates evaluated over all iterations for each state
+        pools = []
+        for i, state in enumerate(states):
+            if len(evaluated_grasps[i]) == 0:
+                pools.append(None)
+                continue
+            pools.append((GraspBatch.concatenate(evaluated_grasps[i]),
+                          np.concatenate(evaluated_q_values[i]),
+                          np.concatenate(evaluated_image_tensors[i], axis=0),
+                          np.concatenate(evaluated_pose_tensors[i], axis=0)))
+        for i, state in enumerate(states):
+            if pools[i] is not None:
+                self._update_replan_cache(state, pools[i], np.concatenate(evaluated_ages[i]))
+            else:
+                self._update_replan_cache(state, None, None)
+        return pools
         
 class QFunctionAntipodalGraspingPolicy(CrossEntropyAntipodalGraspingPolicy):
     """ Optimizes a set of antipodal grasp candidates in image space using the 
@@ -789,7 +2139,7 @@ class QFunctionAntipodalGraspingPolicy(CrossEntropyAntipodalGraspingPolicy):
     gmm_reg_covar : float
         regularization parameters for GMM covariance matrix, enforces diversity of fitted distributions
     deterministic : bool, optional
-        whether to set the random seed to enforce deterministic behavior
+        whether to reseed the random stream of the policy on every request to enforce deterministic behavior
     gripper_width : float, optional
         width of the gripper in meters
     gripper_name : str, optional
@@ -870,9 +2220,20 @@ class EpsilonGreedyQFunctionAntipodalGraspingPolicy(QFunctionAntipodalGraspingPo
         :obj:`ParallelJawGrasp`
             grasp to execute
         """
-        return CrossEntropyAntipodalGraspingPolicy.action(self, state)
+        return self._greedy_action(state)
+
+    def _greedy_action(self, state, deadline=None):
+        """ Plans the greedy grasp with the cross entropy method. The CEM batch
+        planner is called explicitly because the batch planner of this policy
+        rolls epsilon again for every state.
+        """
+        action = CrossEntropyAntipodalGraspingPolicy._action_batch(self, [state], deadline=deadline)[0]
+        if action is None:
+            logging.warning('No valid grasps could be found')
+            raise NoValidGraspsException()
+        return action
     
-    def _action(self, state):
+    def _action(self, state, deadline=None):
         """ Plans the grasp with the highest probability of success on
         the given RGB-D image.
 
@@ -880,6 +2241,8 @@ class EpsilonGreedyQFunctionAntipodalGraspingPolicy(QFunctionAntipodalGraspingPo
         ----------
         state : :obj:`RgbdImageState`
             image to plan grasps on
+        deadline : float
+            wall-clock time (as returned by time.time()) by which to return a grasp, None for no limit
 
         Returns
         -------
@@ -887,9 +2250,9 @@ class EpsilonGreedyQFunctionAntipodalGraspingPolicy(QFunctionAntipodalGraspingPo
             grasp to execute
         """
         # take the greedy action with prob 1 - epsilon
-        if np.random.rand() > self.epsilon:
+        if self._rng.rand() > self.epsilon:
             logging.debug('Taking greedy action')
-            return CrossEntropyAntipodalGraspingPolicy.action(self, state)
+            return self._greedy_action(state, deadline=deadline)
 
         # otherwise take a random action
         logging.debug('Taking random action')
@@ -916,31 +2279,27 @@ class EpsilonGreedyQFunctionAntipodalGraspingPolicy(QFunctionAntipodalGraspingPo
             raise NoValidGraspsException()
 
         # choose a grasp uniformly at random
-        grasp_ind = np.random.choice(num_grasps, size=1)[0]
+        grasp_ind = self._rng.choice(num_grasps, size=1)[0]
         grasp = grasps[grasp_ind]
         depth = grasp.depth
 
         # create transformed image
-        image_tensor, pose_tensor = self.grasps_to_tensors([grasp], state)
+        image_tensor, pose_tensor = self.grasps_to_tensors(grasps[[grasp_ind]], state)
         image = DepthImage(image_tensor[0,...])
 
         # predict prob success
-        output_arr = self.gqcnn.predict(image_tensor, pose_tensor)
-        q_value = output_arr[0,-1]
+        q_value = self._predict_split([image_tensor], [pose_tensor])[0][0]
         
         # visualize planned grasp
         if self.config['vis']['grasp_plan']:
-            scale_factor = float(self.gqcnn.im_width) / float(self._crop_width)
-            scaled_camera_intr = camera_intr.resize(scale_factor)
-            vis_grasp = Grasp2D(Point(image.center), 0.0, depth,
-                                width=self._gripper_width,
-                                camera_intr=scaled_camera_intr)
-            vis.figure()
-            vis.imshow(image)
-            vis.grasp(vis_grasp, scale=1.5, show_center=False, show_axis=True)
-            vis.title('Best Grasp: d=%.3f, q=%.3f' %(depth, q_value))
-            vis.show()
+            self._vis_grasp_plan(image, depth, q_value, camera_intr, 'grasp_plan.png')
 
         # return action
         return ParallelJawGrasp(grasp, q_value, image)
 
+    def _action_batch(self, states, deadline=None):
+        """ Plans a grasp for each state independently, taking a random
+        action with probability epsilon per state.
+        """
+        return GraspingPolicy._action_batch(self, states, deadline=deadline)
+
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Background writer for policy logs. Each planning request is stored as a single
+.npz record containing the state and the planned action.
+Author: Jeff Mahler
+"""
+import cPickle as pkl
+import logging
+import multiprocessing as mp
+import numpy as np
+import os
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+class BackpressurePolicy:
+    """ What to do when the log queue is full. """
+    DROP = 'drop'
+    BLOCK = 'block'
+
+def _write_records(record_queue):
+    """ Writes records from the queue until a None sentinel is received. """
+    while True:
+        item = record_queue.get()
+        if item is None:
+            break
+        filename, record = pkl.loads(item)
+        try:
+            tmp_filename = '%s.tmp.npz' %(filename[:-len('.npz')])
+            np.savez(tmp_filename, **record)
+            os.rename(tmp_filename, filename)
+        except Exception as e:
+            logging.error('Failed to write policy record %s: %s' %(filename, str(e)))
+
+def load_record(filename):
+    """ Loads a policy record written by a PolicyLogWriter.
+
+    Parameters
+    ----------
+    filename : str
+        path to the .npz record
+
+    Returns
+    -------
+    :obj:`dict`
+        mapping from field names to numpy arrays
+    """
+    with np.load(filename) as data:
+        return dict([(key, data[key]) for key in data.files])
+
+class PolicyLogWriter(object):
+    """ Writes policy records in a background process fed by a bounded queue,
+    so that disk IO stays off the planning path.
+
+    Attributes
+    ----------
+    queue_size : int
+        maximum number of records waiting to be written
+    backpressure : str
+        'block' to wait for space when the queue is full, 'drop' to discard the record
+    """
+    def __init__(self, queue_size=16, backpressure=BackpressurePolicy.BLOCK):
+        if backpressure not in [BackpressurePolicy.DROP, BackpressurePolicy.BLOCK]:
+            raise ValueError('Backpressure policy %s not supported!' %(backpressure))
+        self._backpressure = backpressure
+        self._num_dropped = 0
+        self._queue = mp.Queue(maxsize=queue_size)
+        self._process = mp.Process(target=_write_records, args=(self._queue,))
+        self._process.daemon = True
+        self._process.start()
+
+    @property
+    def num_dropped(self):
+        """ Number of records discarded because the queue was full. """
+        return self._num_dropped
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def write(self, filename, record):
+        """ Queues a record to be written.
+
+        Parameters
+        ----------
+        filename : str
+            path of the .npz file to write
+        record : :obj:`dict`
+            mapping from field names to numpy arrays
+
+        Returns
+        -------
+        bool
+            whether the record was queued
+        """
+        if self._process is None:
+            raise ValueError('Cannot write to a closed log writer')
+        if not filename.endswith('.npz'):
+            filename = filename + '.npz'
+
+        # serialize now, since the queue pickles in a background thread after the caller may have reused its buffers
+        item = pkl.dumps((filename, record), pkl.HIGHEST_PROTOCOL)
+        if self._backpressure == BackpressurePolicy.BLOCK:
+            self._queue.put(item)
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._num_dropped += 1
+            logging.warning('Policy log queue full, dropped record %s (%d dropped)' %(filename, self._num_dropped))
+            return False
+        return True
+
+    def close(self, timeout=None):
+        """ Flushes the queued records and stops the writer process. """
+        if self._process is None:
+            return
+        self._queue.put(None)
+        self._process.join(timeout)
+        self._process = None
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Content-addressed LRU cache of per-image grasp sampling preprocessing.
+Author: Jeff Mahler
+"""
+from collections import OrderedDict
+import hashlib
+import logging
+import numpy as np
+import threading
+
+class PreprocessingCache(object):
+    """ Least-recently-used cache of the per-image preprocessing of a grasp
+    sampler (e.g. the depth edges, surface normals and candidate pairs),
+    keyed by a hash of the image contents so that the same image sampled
+    repeatedly is only preprocessed once.
+
+    Entries are dictionaries of numpy arrays and images, and the cache evicts
+    the least recently used entries once the total size of the arrays exceeds
+    the memory budget. The cached arrays are shared between hits and must not
+    be modified.
+
+    Attributes
+    ----------
+    max_bytes : int
+        memory budget of the cache in bytes, 0 to disable caching
+    """
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.clear()
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def enabled(self):
+        return self._max_bytes > 0
+
+    @property
+    def num_bytes(self):
+        return self._num_bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """ Removes all entries and resets the statistics. """
+        with self._lock:
+            self._entries = OrderedDict()
+            self._num_bytes = 0
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    @staticmethod
+    def key(*arrays):
+        """ Hashes the contents, shapes and types of a set of arrays (None entries are allowed).
+
+        Returns
+        -------
+        str
+            hex digest identifying the arrays
+        """
+        h = hashlib.sha1()
+        for arr in arrays:
+            if arr is None:
+                h.update(b'none')
+                continue
+            arr = np.ascontiguousarray(arr)
+            h.update(str(arr.dtype).encode('utf-8'))
+            h.update(str(arr.shape).encode('utf-8'))
+            h.update(arr.tobytes())
+        return h.hexdigest()
+
+    @staticmethod
+    def entry_size(entry):
+        """ Returns the number of bytes used by the arrays and images of an entry. """
+        num_bytes = 0
+        for value in entry.values():
+            if hasattr(value, 'data') and isinstance(value.data, np.ndarray):
+                value = value.data
+            if isinstance(value, np.ndarray):
+                num_bytes += value.nbytes
+        return num_bytes
+
+    def get(self, key):
+        """ Returns the entry for a key, or None on a miss. """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries[key] = entry
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, entry):
+        """ Adds an entry, evicting the least recently used entries to stay within the budget.
+        Entries larger than the whole budget are not cached.
+        """
+        num_bytes = PreprocessingCache.entry_size(entry)
+        if num_bytes > self._max_bytes:
+            logging.debug('Not caching %d byte preprocessing entry' %(num_bytes))
+            return
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self._num_bytes -= old_entry[1]
+            while len(self._entries) > 0 and self._num_bytes + num_bytes > self._max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._num_bytes -= evicted_bytes
+                self._evictions += 1
+            self._entries[key] = (entry, num_bytes)
+            self._num_bytes += num_bytes
+
+    def stats(self):
+        """ Returns the hit and miss counts and memory use of the cache.
+
+        Returns
+        -------
+        :obj:`dict`
+            hits, misses, hit_rate, evictions, num_entries, num_bytes and max_bytes
+        """
+        with self._lock:
+            num_lookups = self._hits + self._misses
+            hit_rate = 0.0
+            if num_lookups > 0:
+                hit_rate = float(self._hits) / num_lookups
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': hit_rate,
+                'evictions': self._evictions,
+                'num_entries': len(self._entries),
+                'num_bytes': self._num_bytes,
+                'max_bytes': self._max_bytes
+            }
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Search strategies that propose grasp candidates for iterative GQ-CNN-based grasp optimization
+Author: Jeff Mahler
+"""
+from abc import ABCMeta, abstractmethod
+
+import numpy as np
+
+from . import WarmStartGaussianMixture
+
+class SearchStrategy(object):
+    """ Ask-and-tell optimizer over grasp feature vectors (see GraspBatch.feature_vecs).
+    The policy tells the strategy the q-values of each evaluated set of
+    candidates and asks it for the next set to evaluate. A new strategy is
+    created for each image of each planning request.
+
+    Attributes
+    ----------
+    config : dict
+        dictionary of parameters for the strategy
+
+    Other Parameters
+    ----------------
+    refit_p : float
+        fraction of the told candidates with the highest q-values used as the elite set
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self, config, random_state=None):
+        self._config = config
+        self._refit_p = config['refit_p']
+        self._rng = random_state
+        if self._rng is None:
+            self._rng = np.random
+        self._elite_vecs = None
+        self._elite_q_values = None
+
+    @property
+    def config(self):
+        return self._config
+
+    @property
+    def elite_vecs(self):
+        """ Returns the feature vectors of the current elite set, sorted by decreasing q-value. """
+        return self._elite_vecs
+
+    @property
+    def elite_q_values(self):
+        """ Returns the q-values of the current elite set. """
+        return self._elite_q_values
+
+    def _select_elites(self, vecs, q_values, num_elites):
+        """ Stores the num_elites candidates with the highest q-values, ties broken by order. """
+        indices = np.argsort(-q_values, kind='mergesort')[:num_elites]
+        self._elite_vecs = vecs[indices]
+        self._elite_q_values = q_values[indices]
+
+    def _num_elites(self, num_candidates):
+        """ Returns the size of the elite set for a number of told candidates. """
+        return max(int(np.ceil(self._refit_p * num_candidates)), 1)
+
+    @abstractmethod
+    def tell(self, vecs, q_values):
+        """ Updates the search distribution from a set of evaluated candidates.
+        An empty set of candidates leaves the distribution unchanged.
+
+        Parameters
+        ----------
+        vecs : :obj:`numpy.ndarray`
+            Nx5 array of feature vectors of the evaluated candidates
+        q_values : :obj:`numpy.ndarray`
+            predicted q-values of the candidates
+        """
+        pass
+
+    @abstractmethod
+    def ask(self, num_samples):
+        """ Proposes candidates to evaluate next.
+
+        Parameters
+        ----------
+        num_samples : int
+            number of candidates to propose
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            num_samplesx5 array of feature vectors
+        """
+        pass
+
+class CrossEntropySearchStrategy(SearchStrategy):
+    """ Cross entropy method: fits a Gaussian mixture to the elite set of
+    each told set of candidates and samples the next candidates from it.
+
+    Other Parameters
+    ----------------
+    component_frac : float
+        number of GMM components as a fraction of the elite set size
+    reg_covar : float
+        regularization of the GMM covariance matrices
+    max_iter : int, optional
+        ceiling on the number of EM iterations per refit
+    warm_start : bool, optional
+        whether to initialize each refit from the components of the previous one
+    backend : str, optional
+        GMM implementation, see WarmStartGaussianMixture
+    """
+    def __init__(self, config, random_state=None):
+        SearchStrategy.__init__(self, config, random_state=random_state)
+        self._component_frac = config['component_frac']
+        max_iter = 10
+        if 'max_iter' in config.keys():
+            max_iter = config['max_iter']
+        warm_start = True
+        if 'warm_start' in config.keys():
+            warm_start = config['warm_start']
+        backend = 'numpy'
+        if 'backend' in config.keys():
+            backend = config['backend']
+        self._gmm = WarmStartGaussianMixture(reg_covar=config['reg_covar'],
+                                             max_iter=max_iter,
+                                             warm_start=warm_start,
+                                             backend=backend,
+                                             random_state=random_state)
+
+    @property
+    def gmm(self):
+        return self._gmm
+
+    def _fit(self):
+        """ Fits the mixture to the current elite set. """
+        num_elites = self._elite_vecs.shape[0]
+        num_components = max(int(np.ceil(self._component_frac * num_elites)), 1)
+        self._gmm.fit(self._elite_vecs, num_components)
+
+    def tell(self, vecs, q_values):
+        if vecs.shape[0] == 0:
+            return
+        self._select_elites(vecs, q_values, self._num_elites(vecs.shape[0]))
+        self._fit()
+
+    def ask(self, num_samples):
+        return self._gmm.sample(num_samples)
+
+class EliteCarryoverSearchStrategy(CrossEntropySearchStrategy):
+    """ Cross entropy method that keeps the evaluated elite set across refits.
+    The elites of each refit are chosen from the told candidates together with
+    the previous elites and their q-values, so good candidates are never lost
+    to an unlucky round of samples and are never re-evaluated. This lets the
+    policy draw fewer GMM samples per iteration for the same final q-value.
+    """
+    def tell(self, vecs, q_values):
+        if vecs.shape[0] == 0:
+            return
+        num_elites = self._num_elites(vecs.shape[0])
+        if self._elite_vecs is not None:
+            vecs = np.r_[vecs, self._elite_vecs]
+            q_values = np.r_[q_values, self._elite_q_values]
+        self._select_elites(vecs, q_values, num_elites)
+        self._fit()
+
+class CMAESSearchStrategy(SearchStrategy):
+    """ Covariance matrix adaptation evolution strategy with a single Gaussian
+    search distribution, using rank-mu and rank-one covariance updates and
+    cumulative step-size adaptation. The first told set (the seed samples)
+    initializes the mean and covariance from its weighted elite set. Like
+    WarmStartGaussianMixture, the search runs on features standardized by the
+    statistics of the seed samples, so that pixel coordinates, angles and depths
+    in meters are on comparable scales.
+
+    Other Parameters
+    ----------------
+    reg_covar : float
+        floor on the eigenvalues of the covariance matrix of the standardized features
+    sigma_scale : float, optional
+        initial step size relative to the covariance of the seed elites
+    """
+    def __init__(self, config, random_state=None):
+        SearchStrategy.__init__(self, config, random_state=random_state)
+        self._reg_covar = config['reg_covar']
+        self._sigma_scale = 1.0
+        if 'sigma_scale' in config.keys():
+            self._sigma_scale = config['sigma_scale']
+        self._mean = None
+        self._data_mean = None
+        self._data_std = None
+
+    @property
+    def mean(self):
+        if self._mean is None:
+            return None
+        return self._mean * self._data_std + self._data_mean
+
+    @property
+    def covariance(self):
+        """ Returns the covariance of the search distribution, including the step size. """
+        if self._mean is None:
+            return None
+        return self._sigma**2 * self._C * np.outer(self._data_std, self._data_std)
+
+    def _standardize(self, vecs):
+        """ Maps feature vectors to the standardized space of the search. """
+        return (vecs - self._data_mean) / self._data_std
+
+    def _recombination_weights(self, num_elites):
+        """ Returns the log-rank weights of the elite set and their variance effective selection mass. """
+        weights = np.log(num_elites + 0.5) - np.log(np.arange(1, num_elites + 1))
+        weights = weights / np.sum(weights)
+        mu_eff = 1.0 / np.sum(weights**2)
+        return weights, mu_eff
+
+    def _decompose(self):
+        """ Updates the eigendecomposition of the covariance matrix. """
+        self._C = (self._C + self._C.T) / 2
+        eigvals, self._B = np.linalg.eigh(self._C)
+        eigvals = np.maximum(eigvals, self._reg_covar)
+        self._D = np.sqrt(eigvals)
+        self._C = self._B.dot(np.diag(eigvals)).dot(self._B.T)
+
+    def _initialize(self, vecs, q_values):
+        """ Sets the search distribution from the elites of the seed samples. """
+        dim = vecs.shape[1]
+        self._data_mean = np.mean(vecs, axis=0)
+        self._data_std = np.std(vecs, axis=0)
+        self._data_std[self._data_std == 0] = 1.0
+        num_elites = self._num_elites(vecs.shape[0])
+        self._select_elites(vecs, q_values, num_elites)
+        elite_vecs = self._standardize(self._elite_vecs)
+        weights, mu_eff = self._recombination_weights(num_elites)
+        self._mean = weights.dot(elite_vecs)
+        diffs = elite_vecs - self._mean
+        self._C = (weights[:,np.newaxis] * diffs).T.dot(diffs) + self._reg_covar * np.eye(dim)
+        self._sigma = self._sigma_scale
+        self._p_sigma = np.zeros(dim)
+        self._p_c = np.zeros(dim)
+        self._generation = 0
+        self._chi_n = np.sqrt(dim) * (1.0 - 1.0 / (4 * dim) + 1.0 / (21 * dim**2))
+        self._decompose()
+
+    def tell(self, vecs, q_values):
+        if vecs.shape[0] == 0:
+            return
+        if self._mean is None:
+            self._initialize(vecs, q_values)
+            return
+
+        # select the weighted elite set
+        dim = vecs.shape[1]
+        num_elites = self._num_elites(vecs.shape[0])
+        self._select_elites(vecs, q_values, num_elites)
+        elite_vecs = self._standardize(self._elite_vecs)
+        weights, mu_eff = self._recombination_weights(num_elites)
+
+        # learning rates
+        c_sigma = (mu_eff + 2) / (dim + mu_eff + 5)
+        d_sigma = 1 + 2 * max(0.0, np.sqrt((mu_eff - 1) / (dim + 1)) - 1) + c_sigma
+        c_c = (4 + mu_eff / dim) / (dim + 4 + 2 * mu_eff / dim)
+        c_1 = 2 / ((dim + 1.3)**2 + mu_eff)
+        c_mu = min(1 - c_1, 2 * (mu_eff - 2 + 1.0 / mu_eff) / ((dim + 2)**2 + mu_eff))
+
+        # move the mean
+        prev_mean = self._mean
+        self._mean = weights.dot(elite_vecs)
+        y_w = (self._mean - prev_mean) / self._sigma
+
+        # update the evolution paths
+        C_inv_sqrt = self._B.dot(np.diag(1.0 / self._D)).dot(self._B.T)
+        self._p_sigma = (1 - c_sigma) * self._p_sigma + \
+                        np.sqrt(c_sigma * (2 - c_sigma) * mu_eff) * C_inv_sqrt.dot(y_w)
+        self._generation += 1
+        p_sigma_norm = np.linalg.norm(self._p_sigma)
+        h_sigma = float(p_sigma_norm / np.sqrt(1 - (1 - c_sigma)**(2 * self._generation)) / self._chi_n < \
+                        1.4 + 2.0 / (dim + 1))
+        self._p_c = (1 - c_c) * self._p_c + \
+                    h_sigma * np.sqrt(c_c * (2 - c_c) * mu_eff) * y_w
+
+        # rank-one and rank-mu covariance updates
+        y = (elite_vecs - prev_mean) / self._sigma
+        rank_mu = (weights[:,np.newaxis] * y).T.dot(y)
+        rank_one = np.outer(self._p_c, self._p_c) + (1 - h_sigma) * c_c * (2 - c_c) * self._C
+        self._C = (1 - c_1 - c_mu) * self._C + c_1 * rank_one + c_mu * rank_mu
+
+        # adapt the step size
+        self._sigma = self._sigma * np.exp((c_sigma / d_sigma) * (p_sigma_norm / self._chi_n - 1))
+        self._decompose()
+
+    def ask(self, num_samples):
+        if self._mean is None:
+            raise ValueError('CMA-ES must be told the seed samples before sampling')
+        z = self._rng.randn(num_samples, self._mean.shape[0])
+        vecs = self._mean + self._sigma * (z * self._D).dot(self._B.T)
+        return vecs * self._data_std + self._data_mean
+
+class SearchStrategyFactory(object):
+    """ Factory for grasp search strategies. """
+    @staticmethod
+    def strategy(strategy_type, config, random_state=None):
+        if strategy_type == 'cem':
+            return CrossEntropySearchStrategy(config, random_state=random_state)
+        elif strategy_type == 'cem_elite_carryover':
+            return EliteCarryoverSearchStrategy(config, random_state=random_state)
+        elif strategy_type == 'cmaes':
+            return CMAESSearchStrategy(config, random_state=random_state)
+        else:
+            raise ValueError('Search strategy type %s not supported!' %(strategy_type))
@@ -168,19 +168,23 @@ class GraspPlanner(object):
         pose_frame: :obj:`str`
             frame of reference to publish pose alone in
         """
-        # execute the policy's action
+        # execute the policy's action, returning the best grasp found within the planning budget
         rospy.loginfo('Planning Grasp')
         grasp_planning_start_time = time.time()
-        grasp = grasping_policy(rgbd_image_state)
+        deadline = None
+        if 'planning_time_budget' in self.cfg.keys() and self.cfg['planning_time_budget'] > 0:
+            deadline = grasp_planning_start_time + self.cfg['planning_time_budget']
+        grasp = grasping_policy.action(rgbd_image_state, deadline=deadline)
   
         # create GQCNNGrasp return msg and populate it
+        pose_msg = grasp.grasp.pose().pose_msg
         gqcnn_grasp = GQCNNGrasp()
         gqcnn_grasp.grasp_success_prob = grasp.q_value
-        gqcnn_grasp.pose = grasp.grasp.pose().pose_msg
+        gqcnn_grasp.pose = pose_msg
 
         # create and publish the pose alone for visualization ease of grasp pose in rviz
         pose_stamped = PoseStamped()
-        pose_stamped.pose = grasp.grasp.pose().pose_msg
+        pose_stamped.pose = pose_msg
         header = Header()
         header.stamp = rospy.Time.now()
         header.frame_id = pose_frame
@@ -211,6 +215,14 @@ if __name__ == '__main__':
     rospy.loginfo('Creating Grasp Policy')
     grasping_policy = CrossEntropyAntipodalGraspingPolicy(policy_cfg)
 
+    # pay the first-use costs of planning before accepting requests
+    rospy.loginfo('Warming up Grasp Policy')
+    warmup_durations = grasping_policy.warmup()
+    if not grasping_policy.ready:
+        rospy.logerr('Grasp Policy failed to warm up')
+        raise rospy.ROSException('Grasp Policy failed to warm up')
+    rospy.loginfo('Grasp Policy warm-up passes took ' + ', '.join(['%.3f' %(d) for d in warmup_durations]) + ' secs.')
+
     # create a grasp planner object
     grasp_planner = GraspPlanner(cfg, cv_bridge, grasping_policy, grasp_pose_publisher)
 
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Script to draw the visualizations stored in a policy log record
+Author: Jeff Mahler
+"""
+import argparse
+import logging
+import os
+
+from gqcnn import PlanningTrace, load_record, render_trace
+
+if __name__ == '__main__':
+    # set up logger
+    logging.getLogger().setLevel(logging.INFO)
+
+    # parse args
+    parser = argparse.ArgumentParser(description='Draw the planning trace of a policy_output_*.npz record')
+    parser.add_argument('record_filename', type=str, help='path to the policy log record')
+    parser.add_argument('--output_dir', type=str, default=None, help='directory to save the figures to, shown interactively if not specified')
+    args = parser.parse_args()
+
+    # load trace
+    record = load_record(args.record_filename)
+    trace = PlanningTrace.from_record(record)
+    if trace is None:
+        logging.info('Record %s does not contain a planning trace' %(args.record_filename))
+    else:
+        logging.info('Rendering %d figures' %(len(trace)))
+        render_trace(trace, output_dir=args.output_dir)
@@ -33,7 +33,7 @@ import time
 
 from autolab_core import RigidTransform, YamlConfig
 
-from gqcnn import RgbdImageState, ParallelJawGrasp
+from gqcnn import RgbdImageState, ParallelJawGrasp, load_record
 from gqcnn import CrossEntropyAntipodalGraspingPolicy
 from gqcnn import Visualizer as vis
 
@@ -59,11 +59,18 @@ if __name__ == '__main__':
     config = YamlConfig(config_filename)
     policy_config = config['policy']
         
-    # load test case
-    state_path = os.path.join(test_case_path, 'state')
-    action_path = os.path.join(test_case_path, 'action')
-    state = RgbdImageState.load(state_path)
-    action = ParallelJawGrasp.load(action_path)
+    # load test case, either a policy_output_*.npz record or a legacy state/action directory
+    if test_case_path.endswith('.npz'):
+        record = load_record(test_case_path)
+        state = RgbdImageState.from_record(record)
+        action = None
+        if 'grasp' in record.keys():
+            action = ParallelJawGrasp.from_record(record, state.camera_intr)
+    else:
+        state_path = os.path.join(test_case_path, 'state')
+        action_path = os.path.join(test_case_path, 'action')
+        state = RgbdImageState.load(state_path)
+        action = ParallelJawGrasp.load(action_path)
 
     if policy_config['vis']['input']:
         vis.figure()